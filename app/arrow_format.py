@@ -0,0 +1,123 @@
+"""
+Apache Arrow encoding of query results (optional pyarrow).
+/api/execute answers Accept: application/vnd.apache.arrow.stream with an Arrow IPC stream: typed
+numeric columns (int32 / float64), text and dates as UTF-8, record batches of STREAM_CHUNK_ROWS rows.
+Column values go from the driver's row tuples to Arrow arrays column-wise, with no DataFrame and no
+per-cell JSON encoding. Downsampling stats travel in the schema metadata ("downsample", JSON).
+Also provides the Arrow type mapping used by the Parquet export.
+"""
+import json
+from datetime import date, datetime, time as dtime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+INT32_MIN, INT32_MAX = -(2 ** 31), 2 ** 31 - 1
+
+
+def available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def wants_arrow(accept: Optional[str]) -> bool:
+    """True if the Accept header lists the Arrow stream type (and pyarrow is installed)."""
+    return bool(accept) and ARROW_STREAM_TYPE in accept and available()
+
+
+def arrow_type(pa, values: Sequence[Any], wire: bool = False):
+    """
+    Arrow type for a column of driver values; all-NULL or unrecognised columns are strings.
+    wire=True (browser payloads): ints are int32 when they fit (else float64), dates/times are ISO strings.
+    """
+    sample = next((v for v in values if v is not None), None)
+    if sample is None:
+        return pa.string()
+    if isinstance(sample, bool):
+        return pa.bool_()
+    if isinstance(sample, int):
+        if not wire:
+            return pa.int64()
+        ints = [v for v in values if v is not None]
+        if all(isinstance(v, int) for v in ints) and INT32_MIN <= min(ints) and max(ints) <= INT32_MAX:
+            return pa.int32()
+        return pa.float64()
+    if isinstance(sample, (float, Decimal)):
+        return pa.float64()
+    if isinstance(sample, (datetime, date, dtime)) and wire:
+        return pa.string()
+    if isinstance(sample, datetime):
+        return pa.timestamp("us")
+    if isinstance(sample, date):
+        return pa.date32()
+    if isinstance(sample, (bytes, bytearray)):
+        return pa.binary()
+    return pa.string()
+
+
+def arrow_array(pa, values: Sequence[Any], typ):
+    """pa.array(values, typ), coercing Decimal -> float and anything -> str as the type requires."""
+    if pa.types.is_string(typ):
+        values = [None if v is None or isinstance(v, str) else _text(v) for v in values]
+    elif pa.types.is_floating(typ):
+        values = [None if v is None else float(v) for v in values]
+    try:
+        return pa.array(values, type=typ)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        # Values disagree with the inferred type (e.g. 1.5 in an int column of a later batch)
+        return pa.array([None if v is None else _text(v) for v in values], type=pa.string()).cast(typ, safe=False)
+
+
+def _text(v: Any) -> str:
+    if isinstance(v, (bytes, bytearray)):
+        return v.decode("utf-8", errors="replace")
+    if isinstance(v, (datetime, date, dtime)):
+        return v.isoformat()
+    return str(v)
+
+
+def encode_columns(
+    columns: List[str],
+    values: List[Sequence[Any]],
+    sort_by: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    batch_rows: int = 1000,
+) -> bytes:
+    """
+    Arrow IPC stream for column-wise values (values[i] holds column i). sort_by sorts the rows by that
+    column in Arrow (nulls last). metadata entries are stored JSON-encoded in the schema metadata.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    fields, arrays = [], []
+    for name, col in zip(columns, values):
+        typ = arrow_type(pa, col, wire=True)
+        fields.append(pa.field(str(name), typ))
+        arrays.append(arrow_array(pa, col, typ))
+    meta = {k: json.dumps(v, default=str) for k, v in (metadata or {}).items() if v is not None}
+    schema = pa.schema(fields, metadata=meta or None)
+    table = pa.Table.from_arrays(arrays, schema=schema) if arrays else schema.empty_table()
+    if sort_by is not None and table.num_rows:
+        table = table.take(pc.sort_indices(table, sort_keys=[(str(sort_by), "ascending")]))
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_rows(
+    columns: List[str],
+    rows: Sequence[Sequence[Any]],
+    sort_by: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    batch_rows: int = 1000,
+) -> bytes:
+    """encode_columns for driver row tuples (transposed once, column-wise)."""
+    values = list(zip(*rows)) if rows else [[] for _ in columns]
+    return encode_columns(columns, values, sort_by, metadata, batch_rows)
@@ -0,0 +1,245 @@
+"""
+Async versions of the hot service functions, for the opt-in async engine (DB_ASYNC_ENABLED=true).
+Queries run on an AsyncSession; result shaping is shared with app.services so both paths return
+identical payloads.
+"""
+import inspect
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app import query_registry, singleflight
+from app.cache import catalog_version, result_cache, trend_cache
+from app.models import SQLTemplate, TrendPlot, TrendParameter
+from app.services import (
+    _apply_plot_config,
+    _build_trend_dict,
+    _cached_body,
+    _coalesced,
+    _error_payload,
+    _param_trend_ids,
+    _pick_params,
+    _plot_columns_from_config,
+    _plot_list,
+    _plot_to_dict,
+    _result_cache_key,
+    _result_to_payload,
+    _timed_sql,
+    incremental_body,
+    incremental_sql,
+    CATALOG_QUERY,
+    current_trend_catalog,
+    store_trend_catalog,
+    build_statement,
+    invalidate_trend,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def list_trends(db: AsyncSession) -> List[Dict[str, Any]]:
+    """List all SQL templates (trends) with basic info, from the shared in-memory catalog."""
+    return (await get_trend_catalog(db))["trends"]
+
+
+async def get_trend_catalog(db: AsyncSession) -> Dict[str, Any]:
+    """Async counterpart of app.services.get_trend_catalog (same catalog)."""
+    catalog = current_trend_catalog()
+    if catalog is not None:
+        return catalog
+    version = catalog_version.value
+    return store_trend_catalog(version, (await db.execute(CATALOG_QUERY)).all())
+
+
+async def _get_template(db: AsyncSession, template_id: str) -> Optional[SQLTemplate]:
+    return (await db.execute(select(SQLTemplate).where(SQLTemplate.template_id == template_id).limit(1))).scalars().first()
+
+
+async def get_trend_by_id(db: AsyncSession, template_id: str) -> Optional[Dict[str, Any]]:
+    """Get single trend template by ID (shares trend_cache with the sync path)."""
+    key = f"id:{template_id}"
+    cached = trend_cache.get(key)
+    if cached is not None:
+        return cached
+    t = await _get_template(db, template_id)
+    if not t:
+        return None
+    plots = (await db.execute(select(TrendPlot).where(TrendPlot.trend_id == t.trend_id))).scalars().all()
+    params = (await db.execute(
+        select(TrendParameter).where(TrendParameter.trendid.in_(_param_trend_ids(t.trend_id)))
+    )).scalars().all()
+    trend = _build_trend_dict(t, list(plots), _pick_params(list(params), t.trend_id))
+    trend_cache.put(key, trend)
+    return trend
+
+
+async def execute_query(
+    db: AsyncSession,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    fmt: str = "rows",
+    max_points: Optional[int] = None,
+    downsample: str = "lttb",
+    plot_columns: Optional[Dict[str, Any]] = None,
+    parameterized: bool = False,
+    timeout_ms: Optional[int] = None,
+    query_handle: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Async counterpart of app.services.execute_query."""
+    params = params or {}
+    try:
+        stmt, bind = build_statement(_timed_sql(db, sql, timeout_ms), params, parameterized)
+        async with query_registry.atrack(query_handle, db, sql):
+            result = await db.execute(stmt, bind)
+        rows = result.fetchall()
+        columns = list(result.keys())
+    except Exception as e:
+        logger.exception("Query execution failed")
+        return _error_payload(e, fmt, timeout_ms)
+    # Downsampling and serialization are CPU-bound: keep them off the event loop
+    return await run_in_threadpool(_result_to_payload, columns, rows, fmt, max_points, downsample, plot_columns)
+
+
+async def execute_query_cached(
+    db: AsyncSession,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    fmt: str = "rows",
+    template_id: Optional[str] = None,
+    use_cache: bool = True,
+    max_points: Optional[int] = None,
+    downsample: str = "lttb",
+    parameterized: bool = False,
+    timeout_ms: Optional[int] = None,
+    query_handle: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Async counterpart of app.services.execute_query_cached (same cache, same payload, shared flights)."""
+    params = params or {}
+    key = _result_cache_key(sql, params, fmt, template_id, max_points, downsample) if use_cache else None
+    if not use_cache or not result_cache.enabled:
+        result_cache.record_bypass()
+        cache_state = "bypass"
+    else:
+        body = result_cache.get(key)
+        if body is not None:
+            return {"body": body, "cache": "hit", "error": None}
+        cache_state = "miss"
+
+    async def run() -> Dict[str, Any]:
+        plot_columns = None
+        if max_points and template_id:
+            plots = await list_plots_for_trend(db, template_id)
+            plot_columns = _plot_columns_from_config(plots[0]) if plots else {}
+        result = await execute_query(
+            db,
+            sql,
+            params,
+            fmt=fmt,
+            max_points=max_points,
+            downsample=downsample,
+            plot_columns=plot_columns,
+            parameterized=parameterized,
+            timeout_ms=timeout_ms,
+            query_handle=query_handle,
+        )
+        return await run_in_threadpool(_cached_body, result, key, cache_state, template_id)
+
+    if key is None:
+        return await run()
+    flight, shared = await singleflight.ado(key, run, query_handle)
+    result = _coalesced(flight, shared, run, query_handle)
+    return await result if inspect.isawaitable(result) else result
+
+
+async def execute_incremental(
+    db: AsyncSession,
+    sql: str,
+    params: Optional[Dict[str, Any]],
+    since: Dict[str, Any],
+    series_col: Optional[str] = None,
+    fmt: str = "rows",
+    template_id: Optional[str] = None,
+    parameterized: bool = False,
+    timeout_ms: Optional[int] = None,
+    query_handle: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Async counterpart of app.services.execute_incremental."""
+    wrapped, extra = incremental_sql(sql, since)
+    if not series_col and template_id:
+        plots = await list_plots_for_trend(db, template_id)
+        series_col = _plot_columns_from_config(plots[0]).get("series_col") if plots else None
+    result_cache.record_bypass()
+    result = await execute_query(
+        db, wrapped, {**(params or {}), **extra}, fmt=fmt, parameterized=parameterized,
+        timeout_ms=timeout_ms, query_handle=query_handle,
+    )
+    return await run_in_threadpool(incremental_body, result, since, series_col)
+
+
+# --- Plot CRUD (bts_cfg_trend_plots) ---
+
+async def list_plots_for_trend(db: AsyncSession, template_id: str) -> List[Dict[str, Any]]:
+    """List saved plots for a trend. Uses trend_id from template."""
+    t = await _get_template(db, template_id)
+    if not t:
+        return []
+    plots = (await db.execute(
+        select(TrendPlot).where(TrendPlot.trend_id == t.trend_id).order_by(TrendPlot.plot_order, TrendPlot.id)
+    )).scalars().all()
+    return _plot_list(plots)
+
+
+async def _get_plot(db: AsyncSession, trend_id: str, plot_id: int) -> Optional[TrendPlot]:
+    return (await db.execute(
+        select(TrendPlot).where(TrendPlot.id == plot_id, TrendPlot.trend_id == trend_id)
+    )).scalars().first()
+
+
+async def create_plot(db: AsyncSession, template_id: str, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Save a new plot config for a trend."""
+    t = await _get_template(db, template_id)
+    if not t:
+        return None
+    max_row = (await db.execute(
+        select(TrendPlot).where(TrendPlot.trend_id == t.trend_id).order_by(TrendPlot.plot_order.desc()).limit(1)
+    )).scalars().first()
+    next_order = (max_row.plot_order + 1) if max_row and max_row.plot_order is not None else 0
+    p = TrendPlot(trend_id=t.trend_id, plot_order=next_order)
+    _apply_plot_config(p, config)
+    db.add(p)
+    await db.commit()
+    await run_in_threadpool(invalidate_trend, template_id)  # cache backend I/O (sqlite / redis)
+    await db.refresh(p)
+    return _plot_to_dict(p)
+
+
+async def update_plot(db: AsyncSession, template_id: str, plot_id: int, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Update an existing saved plot."""
+    t = await _get_template(db, template_id)
+    if not t:
+        return None
+    p = await _get_plot(db, t.trend_id, plot_id)
+    if not p:
+        return None
+    _apply_plot_config(p, config)
+    await db.commit()
+    await run_in_threadpool(invalidate_trend, template_id)
+    await db.refresh(p)
+    return _plot_to_dict(p)
+
+
+async def delete_plot(db: AsyncSession, template_id: str, plot_id: int) -> bool:
+    """Delete a saved plot."""
+    t = await _get_template(db, template_id)
+    if not t:
+        return False
+    p = await _get_plot(db, t.trend_id, plot_id)
+    if not p:
+        return False
+    await db.delete(p)
+    await db.commit()
+    await run_in_threadpool(invalidate_trend, template_id)
+    return True
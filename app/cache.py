@@ -0,0 +1,203 @@
+"""
+Caches for the workbench (query results, schema and other metadata).
+Storage is pluggable (CACHE_BACKEND): per-process memory, or sqlite / redis shared by all workers.
+"""
+import hashlib
+import json
+import logging
+import pickle
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from app.cache_backends import make_backend
+from config.cache import (
+    get_cache_backend_config,
+    get_catalog_ttl,
+    get_dropdown_cache_ttl,
+    get_result_cache_config,
+    get_schema_cache_ttl,
+    get_trend_cache_ttl,
+)
+
+logger = logging.getLogger(__name__)
+
+# Quoted strings / identifiers are kept verbatim when normalizing SQL
+_QUOTED_RE = re.compile(r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)")
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace outside quotes and drop a trailing semicolon, so formatting-only edits share a key."""
+    parts = _QUOTED_RE.split(sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = _WS_RE.sub(" ", parts[i])
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+class ResultCache:
+    """
+    Serialized query results (JSON bytes) in a cache backend, under the "result:" prefix.
+    The memory backend is an LRU bounded by max_bytes; shared backends are bounded as a whole.
+    Entries expire after a TTL (per template_id override or default) and can be dropped per template.
+    """
+
+    prefix = "result:"
+
+    def __init__(self, backend, max_bytes: int, default_ttl: int, template_ttls: Optional[Dict[str, int]] = None):
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.template_ttls = template_ttls or {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "bypassed": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.default_ttl > 0
+
+    @staticmethod
+    def make_key(sql: str, params: Optional[Dict[str, Any]] = None, *extra: Any) -> str:
+        """Key on normalized rendered SQL + parameters + any output options (format, etc.)."""
+        raw = json.dumps([normalize_sql(sql), params or {}, list(extra)], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, template_id: Optional[str]) -> int:
+        if template_id and template_id in self.template_ttls:
+            return self.template_ttls[template_id]
+        return self.default_ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            body = self.backend.get(self.prefix + key)
+        except Exception:
+            logger.warning("Result cache read failed", exc_info=True)
+            body = None
+            self._count("errors")
+        self._count("hits" if body is not None else "misses")
+        return body
+
+    def put(self, key: str, body: bytes, template_id: Optional[str] = None) -> None:
+        ttl = self.ttl_for(template_id)
+        if not self.enabled or ttl <= 0 or len(body) > self.max_bytes:
+            return
+        try:
+            self.backend.set(self.prefix + key, body, ttl, self._tag(template_id))
+        except Exception:
+            logger.warning("Result cache write failed", exc_info=True)
+            self._count("errors")
+
+    def record_bypass(self) -> None:
+        self._count("bypassed")
+
+    def invalidate_template(self, template_id: str) -> int:
+        """Drop every cached result produced for template_id. Returns number of entries removed."""
+        removed = self.backend.delete_tag(self._tag(template_id))
+        self._count("invalidations", removed)
+        return removed
+
+    def clear(self) -> None:
+        self.backend.delete_prefix(self.prefix)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            local = dict(self._stats)
+        return {**local, **self.backend.stats(self.prefix), "max_bytes": self.max_bytes, "backend": _backend_name(self.backend)}
+
+    def _tag(self, template_id: Optional[str]) -> Optional[str]:
+        return f"{self.prefix}{template_id}" if template_id else None
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+
+def etag_for(body: bytes) -> str:
+    """Strong ETag (quoted) for a serialized response body."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class TTLCache:
+    """
+    Small keyed cache of values that expire after ttl seconds (metadata such as the schema).
+    Values are pickled into the backend under "<name>:" so shared backends can hold them.
+    """
+
+    def __init__(self, backend, name: str, ttl: int):
+        self.backend = backend
+        self.prefix = f"{name}:"
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "errors": 0}
+
+    def get(self, key: str) -> Any:
+        try:
+            raw = self.backend.get(self.prefix + key)
+        except Exception:
+            logger.warning("%s cache read failed", self.prefix.rstrip(":"), exc_info=True)
+            raw = None
+            self._count("errors")
+        self._count("hits" if raw is not None else "misses")
+        return pickle.loads(raw) if raw is not None else None
+
+    def put(self, key: str, value: Any) -> None:
+        if self.ttl <= 0:
+            return
+        try:
+            self.backend.set(self.prefix + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), self.ttl)
+        except Exception:
+            logger.warning("%s cache write failed", self.prefix.rstrip(":"), exc_info=True)
+            self._count("errors")
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop one key, or everything when key is None."""
+        if key is None:
+            self.backend.delete_prefix(self.prefix)
+        else:
+            self.backend.delete(self.prefix + key)
+        self._count("invalidations")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            local = dict(self._stats)
+        backend = self.backend.stats(self.prefix)
+        return {**local, "entries": backend["entries"], "ttl": self.ttl, "backend": _backend_name(self.backend)}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+
+class VersionCounter:
+    """
+    Monotonic change counter: write paths bump it, readers rebuild when it moved past their copy.
+    With ttl, readers also rebuild copies older than ttl seconds (a memory backend never sees other
+    workers' bumps).
+    """
+
+    def __init__(self, backend, name: str, ttl: int = 0):
+        self.backend = backend
+        self.name = name
+        self.ttl = ttl
+
+    @property
+    def value(self) -> int:
+        return self.backend.counter(self.name)
+
+    def bump(self) -> int:
+        return self.backend.incr(self.name)
+
+
+def _backend_name(backend) -> str:
+    return type(backend).__name__.replace("Backend", "").lower()
+
+
+_backend_config = get_cache_backend_config()
+_result_config = get_result_cache_config()
+
+result_cache = ResultCache(make_backend(_backend_config, _result_config["max_bytes"]), **_result_config)
+schema_cache = TTLCache(make_backend(_backend_config), "schema", get_schema_cache_ttl())
+trend_cache = TTLCache(make_backend(_backend_config), "trend", get_trend_cache_ttl())
+dropdown_cache = TTLCache(make_backend(_backend_config), "dropdown", get_dropdown_cache_ttl())
+catalog_version = VersionCounter(make_backend(_backend_config), "catalog_version", get_catalog_ttl())
@@ -0,0 +1,284 @@
+"""
+Storage backends for app.cache.
+memory keeps entries in this process (one copy per uvicorn worker); sqlite and redis are shared by
+every worker on the host, so a miss is loaded once and an invalidation is seen everywhere.
+All backends store bytes under string keys with a TTL, an optional tag (template_id) and integer counters.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """In-process LRU bounded by total value size (max_bytes=None: unbounded)."""
+
+    shared = False
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, tag, value)
+        self._counters: Dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"evictions": 0, "expired": 0}
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._drop(key)
+                self._stats["expired"] += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, value: bytes, ttl: int, tag: Optional[str] = None) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.time() + ttl, tag, value)
+            self._size += len(value)
+            while self.max_bytes is not None and self._size > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def delete_tag(self, tag: str) -> int:
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if e[1] == tag]
+            for k in keys:
+                self._drop(k)
+            return len(keys)
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [k for k in self._entries if k.startswith(prefix)]
+            for k in keys:
+                self._drop(k)
+            return len(keys)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    def stats(self, prefix: str = "") -> Dict[str, Any]:
+        with self._lock:
+            keys = [k for k in self._entries if k.startswith(prefix)]
+            return {
+                **self._stats,
+                "entries": len(keys),
+                "bytes": sum(len(self._entries[k][2]) for k in keys),
+            }
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._size -= len(entry[2])
+
+
+class SQLiteBackend:
+    """
+    Cache in a local SQLite file (WAL mode) shared by all worker processes on the host.
+    LRU by last access, bounded by max_bytes across all keys.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._stats = {"evictions": 0, "expired": 0}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, tag TEXT, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_tag ON cache_entries (tag)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed ON cache_entries (accessed_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; autocommit is off only inside `with conn:` blocks."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] <= now:
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            self._stats["expired"] += 1
+            return None
+        conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return bytes(row[0])
+
+    def set(self, key: str, value: bytes, ttl: int, tag: Optional[str] = None) -> None:
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, tag, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), tag, len(value), now + ttl, now),
+            )
+            conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+            if self.max_bytes is not None:
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        while total > self.max_bytes:
+            oldest = conn.execute("SELECT key, size FROM cache_entries ORDER BY accessed_at LIMIT 64").fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                self._stats["evictions"] += 1
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def delete_tag(self, tag: str) -> int:
+        return self._conn().execute("DELETE FROM cache_entries WHERE tag = ?", (tag,)).rowcount
+
+    def delete_prefix(self, prefix: str) -> int:
+        return self._conn().execute("DELETE FROM cache_entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)).rowcount
+
+    def incr(self, key: str) -> int:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO cache_counters (key, value) VALUES (?, 1) ON CONFLICT(key) DO UPDATE SET value = value + 1",
+                (key,),
+            )
+            return conn.execute("SELECT value FROM cache_counters WHERE key = ?", (key,)).fetchone()[0]
+
+    def counter(self, key: str) -> int:
+        row = self._conn().execute("SELECT value FROM cache_counters WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def stats(self, prefix: str = "") -> Dict[str, Any]:
+        entries, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE substr(key, 1, ?) = ?",
+            (len(prefix), prefix),
+        ).fetchone()
+        return {**self._stats, "entries": entries, "bytes": size}
+
+
+class RedisBackend:
+    """
+    Cache on a Redis-protocol server (Redis, Valkey, KeyDB...). Size limits and eviction are the
+    server's (maxmemory / maxmemory-policy); tags are kept as sets next to the entries, expiring with
+    their longest-lived member.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, namespace: str = "blendtwin:"):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._ns = namespace
+        self._stats = {"evictions": 0, "expired": 0}
+        # Tag sets live as long as their longest-lived member: only ever extend their expiry
+        self._extend_expiry = self._redis.register_script(
+            "if redis.call('TTL', KEYS[1]) < tonumber(ARGV[1]) then redis.call('EXPIRE', KEYS[1], ARGV[1]) end"
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._redis.get(self._ns + key)
+
+    def set(self, key: str, value: bytes, ttl: int, tag: Optional[str] = None) -> None:
+        ttl = max(int(ttl), 1)
+        pipe = self._redis.pipeline()
+        pipe.set(self._ns + key, value, ex=ttl)
+        if tag:
+            tag_key = f"{self._ns}tag:{tag}"
+            pipe.sadd(tag_key, self._ns + key)
+            self._extend_expiry(keys=[tag_key], args=[ttl], client=pipe)
+        pipe.execute()
+
+    def delete(self, key: str) -> None:
+        self._redis.delete(self._ns + key)
+
+    def delete_tag(self, tag: str) -> int:
+        tag_key = f"{self._ns}tag:{tag}"
+        keys = list(self._redis.smembers(tag_key))
+        removed = self._redis.delete(*keys) if keys else 0
+        self._redis.delete(tag_key)
+        return removed
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = list(self._redis.scan_iter(match=self._ns + prefix + "*", count=500))
+        return self._redis.delete(*keys) if keys else 0
+
+    def incr(self, key: str) -> int:
+        return int(self._redis.incr(f"{self._ns}counter:{key}"))
+
+    def counter(self, key: str) -> int:
+        return int(self._redis.get(f"{self._ns}counter:{key}") or 0)
+
+    def stats(self, prefix: str = "") -> Dict[str, Any]:
+        entries = sum(1 for _ in self._redis.scan_iter(match=self._ns + prefix + "*", count=500))
+        return {**self._stats, "entries": entries, "bytes": None}
+
+
+_shared_backend = None
+_shared_lock = threading.Lock()
+
+
+def make_backend(config: Dict[str, Any], max_bytes: Optional[int] = None):
+    """
+    Backend for one cache. memory: a private MemoryBackend(max_bytes) per cache.
+    sqlite / redis: one backend per process shared by every cache (keys are prefixed per cache).
+    Falls back to memory if the shared backend cannot be opened.
+    """
+    global _shared_backend
+    kind = config["backend"]
+    if kind == "memory":
+        return MemoryBackend(max_bytes)
+    with _shared_lock:
+        if _shared_backend is None:
+            try:
+                if kind == "sqlite":
+                    _shared_backend = SQLiteBackend(config["sqlite_path"], config["max_bytes"])
+                elif kind == "redis":
+                    _shared_backend = RedisBackend(config["redis_url"])
+                else:
+                    raise ValueError(f"Unknown CACHE_BACKEND {kind!r}")
+                logger.info("Using shared %s cache backend", kind)
+            except Exception:
+                logger.warning("Could not open %s cache backend, using in-process memory", kind, exc_info=True)
+                return MemoryBackend(max_bytes)
+        return _shared_backend
@@ -1,16 +1,83 @@
 """Database session and engine setup."""
-from sqlalchemy import create_engine
+import logging
+import itertools
+import threading
+
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from contextlib import contextmanager
 
 import sys
 sys.path.insert(0, ".")
-from config.database import get_db_url
+from config.database import get_db_url, get_async_db_url, get_pool_config, get_tunnel_ports, is_async_db_enabled
 from app.models import Base
 
-engine = create_engine(get_db_url(), pool_pre_ping=True)
+logger = logging.getLogger(__name__)
+
+engine = create_engine(get_db_url(), **get_pool_config())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Unpooled side channel for KILL QUERY, so cancelling works even when the pool is exhausted
+kill_engine = create_engine(get_db_url(), poolclass=NullPool)
+
+
+def _spread_over_tunnel_channels(target_engine, ports) -> None:
+    """New DBAPI connections go round-robin over the tunnel channel ports, skipping channels that refuse."""
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    @event.listens_for(target_engine, "do_connect")
+    def _connect(dialect, conn_rec, cargs, cparams):
+        with lock:
+            start = next(counter) % len(ports)
+        last_error = None
+        for port in ports[start:] + ports[:start]:
+            try:
+                return dialect.connect(*cargs, **{**cparams, "port": port})
+            except Exception as e:
+                last_error = e
+                logger.warning("Tunnel channel on port %s unavailable: %s", port, e)
+        raise last_error
+
+
+_tunnel_ports = get_tunnel_ports()
+if len(_tunnel_ports) > 1:
+    _spread_over_tunnel_channels(engine, _tunnel_ports)
+    _spread_over_tunnel_channels(kill_engine, _tunnel_ports)
+
+# Optional async engine (DB_ASYNC_ENABLED=true); the sync engine above stays the default path
+async_engine = None
+AsyncSessionLocal = None
+if is_async_db_enabled():
+    try:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        async_engine = create_async_engine(get_async_db_url(), **get_pool_config())
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    except ImportError as e:
+        logger.warning("Async DB disabled - driver not installed (pip install aiomysql): %s", e)
+
+
+def warm_pool(connections: int) -> int:
+    """Open up to `connections` pooled connections at once (SELECT 1 on each) so first requests skip the handshake."""
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
+def dispose_engines() -> None:
+    """Close every pooled connection (sync, kill and async engines are disposed by the caller for async)."""
+    engine.dispose()
+    kill_engine.dispose()
+
 
 @contextmanager
 def get_db():
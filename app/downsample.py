@@ -0,0 +1,88 @@
+"""
+Server-side downsampling of plot-bound query results.
+Each series is reduced to at most max_points rows with LTTB (Largest-Triangle-Three-Buckets)
+or min/max bucketing, so Chart.js gets a visually equivalent line for a fraction of the rows.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+ALGORITHMS = ("lttb", "minmax")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the n_out points picked by LTTB. x must be sorted ascending."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # n_out - 2 buckets between the fixed first and last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        xa, ya = x[a], y[a]
+        nxt = y[end:next_end]
+        nxt = nxt[~np.isnan(nxt)]
+        avg_x = x[end:next_end].mean()
+        avg_y = nxt.mean() if nxt.size else ya
+        area = np.abs((xa - avg_x) * (y[start:end] - ya) - (xa - x[start:end]) * (avg_y - ya))
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        idx[i + 1] = a
+    return idx
+
+
+def minmax_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the min and max y in each of n_out // 2 buckets, plus first and last point."""
+    n = len(x)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(np.int64)
+    lo = np.where(np.isnan(y), np.inf, y)
+    hi = np.where(np.isnan(y), -np.inf, y)
+    picked = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            picked.append(start + int(np.argmin(lo[start:end])))
+            picked.append(start + int(np.argmax(hi[start:end])))
+    return np.unique(picked)
+
+
+def _numeric(col: pd.Series) -> np.ndarray:
+    return pd.to_numeric(col, errors="coerce").to_numpy(dtype=np.float64)
+
+
+def downsample_frame(
+    df: pd.DataFrame,
+    x_col: Optional[str],
+    y_cols: List[str],
+    series_col: Optional[str] = None,
+    max_points: int = 2000,
+    algorithm: str = "lttb",
+) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Reduce each series (grouped by series_col) to about max_points rows.
+    Rows picked for any of y_cols are kept, so multi-line plots stay aligned on x.
+    Returns (reduced frame in original row order, {"original_points", "returned_points", "series"}).
+    """
+    pick = lttb_indices if algorithm == "lttb" else minmax_indices
+    groups = df.groupby(series_col, sort=False, dropna=False).indices if series_col else {None: np.arange(len(df))}
+    keep = []
+    for positions in groups.values():
+        positions = np.asarray(positions)
+        if len(positions) <= max_points:
+            keep.append(positions)
+            continue
+        x = _numeric(df[x_col].iloc[positions]) if x_col else np.arange(len(positions), dtype=np.float64)
+        if np.isnan(x).any():
+            x = np.arange(len(positions), dtype=np.float64)  # non-numeric x: bucket by position
+        order = np.argsort(x, kind="stable")
+        positions, x = positions[order], x[order]
+        selected = [pick(x, _numeric(df[c].iloc[positions]), max_points) for c in y_cols] or [pick(x, x, max_points)]
+        keep.append(positions[np.unique(np.concatenate(selected))])
+    rows = np.sort(np.concatenate(keep)) if keep else np.arange(0)
+    stats = {"original_points": len(df), "returned_points": len(rows), "series": len(groups)}
+    return df.iloc[rows], stats
@@ -0,0 +1,156 @@
+"""
+Streaming export of query results to CSV, Parquet and XLSX.
+Every writer consumes app.services.stream_query (server-side cursor, batches of rows) and keeps at most
+one batch in memory: CSV is encoded per batch, Parquet writes one row group per batch, and XLSX uses
+openpyxl's write-only mode spooled to a temp file (the zip container can only be sent once it is closed).
+pyarrow (parquet) and openpyxl (xlsx) are optional; a missing one raises ExportUnavailable.
+"""
+import csv
+import io
+import logging
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterator, List, Sequence
+
+from app.arrow_format import arrow_array, arrow_type
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+XLSX_MAX_ROWS = 1_048_576  # per sheet, including the header row
+SPOOL_BYTES = 8 * 1024 * 1024  # xlsx output kept in memory up to this size, then on disk
+READ_CHUNK = 64 * 1024
+
+
+class ExportUnavailable(RuntimeError):
+    """The optional library for the requested format is not installed."""
+
+
+def check_format(fmt: str) -> None:
+    """Raise ValueError for unknown formats and ExportUnavailable if the writer's library is missing."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r} (use {', '.join(EXPORT_FORMATS)})")
+    module = {"parquet": "pyarrow.parquet", "xlsx": "openpyxl"}.get(fmt)
+    if module:
+        try:
+            __import__(module)
+        except ImportError:
+            raise ExportUnavailable(f"{fmt} export needs the {module.split('.')[0]} package")
+
+
+def write_export(fmt: str, columns: List[str], batches: Iterator[Sequence[Sequence[Any]]]) -> Iterator[bytes]:
+    """Encode column names + row batches in fmt, yielding bytes as they are produced."""
+    writer = {"csv": _write_csv, "parquet": _write_parquet, "xlsx": _write_xlsx}[fmt]
+    return writer(columns, batches)
+
+
+def _write_csv(columns, batches) -> Iterator[bytes]:
+    buf = io.StringIO()
+    out = csv.writer(buf)
+    buf.write("\ufeff")  # BOM so Excel opens UTF-8 correctly
+    out.writerow(columns)
+    for batch in batches:
+        out.writerows([_csv_value(v) for v in row] for row in batch)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _csv_value(v: Any) -> Any:
+    if isinstance(v, (bytes, bytearray)):
+        return v.decode("utf-8", errors="replace")
+    if isinstance(v, datetime):
+        return v.isoformat(sep=" ")
+    return v
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose contents are taken (and cleared) after each row group."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _write_parquet(columns, batches) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _Drain()
+    writer = None
+    schema = None
+    try:
+        for batch in batches:
+            if not batch:
+                continue
+            cols = list(zip(*batch))
+            if schema is None:
+                schema = pa.schema([pa.field(name, arrow_type(pa, values)) for name, values in zip(columns, cols)])
+                writer = pq.ParquetWriter(sink, schema, compression="snappy")
+            arrays = [arrow_array(pa, values, field.type) for values, field in zip(cols, schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.take()
+        if writer is None:  # empty result: schema from names only
+            schema = pa.schema([pa.field(name, pa.string()) for name in columns])
+            writer = pq.ParquetWriter(sink, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.take()
+
+
+def _write_xlsx(columns, batches) -> Iterator[bytes]:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    sheet = wb.create_sheet("Data")
+    sheet.append(columns)
+    rows_in_sheet, sheets = 1, 1
+    for batch in batches:
+        for row in batch:
+            if rows_in_sheet >= XLSX_MAX_ROWS:
+                sheets += 1
+                sheet = wb.create_sheet(f"Data{sheets}")
+                sheet.append(columns)
+                rows_in_sheet = 1
+            sheet.append([_xlsx_value(v) for v in row])
+            rows_in_sheet += 1
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as f:
+        wb.save(f)
+        f.seek(0)
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _xlsx_value(v: Any) -> Any:
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (bytes, bytearray)):
+        return v.decode("utf-8", errors="replace")
+    return v
@@ -0,0 +1,246 @@
+"""
+Live trend updates pushed over Server-Sent Events (GET /api/trends/{id}/live).
+Viewers subscribe to a (template, params, series column) pair; every distinct pair has ONE poller task
+per process that fans its deltas out to all of that pair's subscribers, so database load grows with
+the number of distinct trends on screen, not with the number of viewers.
+Each poll first runs a cheap change probe (highest cycleno of the blend in the model tables the template
+reads) and only runs the incremental query (app.services.incremental_sql) when that moved. Templates
+without a blendid parameter or a known model table run the incremental query on every poll.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from app import metrics
+from app.plotdata import MAT_TABLE
+from app.services import execute_query, incremental_sql, result_body, slice_incremental
+from app.sql_analysis import analyze_template
+from config.database import get_query_timeout_ms
+
+logger = logging.getLogger(__name__)
+
+# Tables whose new cycles mean a trend has new rows (probed by blendid)
+SOURCE_TABLES = (
+    "bts_TQTSCSTRModel",
+    "bts_TQTSLaggedModel",
+    "bts_TQTSHybridModel",
+    "bts_SimulatedStreamQuality",
+    MAT_TABLE,
+)
+RESYNC = b""  # queued instead of a delta when a subscriber fell too far behind
+_UNSET = object()
+
+
+def subscription_key(template_id: str, params: Dict[str, Any], series_col: Optional[str]) -> str:
+    return json.dumps([template_id, sorted(params.items()), series_col], default=str)
+
+
+def probe_statement(sql: str, params: Dict[str, Any]):
+    """
+    SELECT of the blend's highest cycleno across the model tables the template reads, or None when it
+    reads none of them or has no :blendid parameter.
+    """
+    if "blendid" not in params:
+        return None
+    known = {t.lower(): t for t in SOURCE_TABLES}
+    tables = {known[t.split(".")[-1].lower()] for t in analyze_template(sql).tables if t.split(".")[-1].lower() in known}
+    if not tables:
+        return None
+    parts = " UNION ALL ".join(f"SELECT MAX(cycleno) AS c FROM {t} WHERE blendid = :blendid" for t in sorted(tables))
+    return text(f"SELECT MAX(c) FROM ({parts}) AS _probe")
+
+
+def query_delta(db, sql: str, params: Dict[str, Any], since: Dict[str, Any], series_col: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Rows past since (see app.services.slice_incremental) as a payload dict; None if there are none. Raises on query errors."""
+    wrapped, extra = incremental_sql(sql, since)
+    result = execute_query(db, wrapped, {**params, **extra}, parameterized=True, timeout_ms=get_query_timeout_ms())
+    if result.get("error"):
+        raise RuntimeError(f"Live query failed: {result['error']}")
+    payload = slice_incremental(result, since, series_col)
+    return payload if payload["incremental"]["rows"] else None
+
+
+def trim_delta(payload: Dict[str, Any], upto: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Keep the rows at or below upto[series] (series missing from upto: its lowest value). Used for a
+    catch-up against the subscription's watermark, so it never overlaps the deltas broadcast after it.
+    """
+    info = payload["incremental"]
+    series_col = info["series_col"]
+    cycle_col = next(c for c in payload["columns"] if str(c).lower() == "cycleno")
+    floor = min(upto.values())
+
+    def key(row):
+        return str(row[series_col]) if series_col else ""
+
+    rows = [r for r in payload["rows"] if r[cycle_col] <= upto.get(key(r), floor)]
+    if not rows:
+        return None
+    last: Dict[str, Any] = {}
+    for r in rows:
+        last[key(r)] = max(last.get(key(r), r[cycle_col]), r[cycle_col])
+    return {**payload, "rows": rows, "incremental": {**info, "rows": len(rows), "last_cycle": last}}
+
+
+class Subscription:
+    """One distinct live query: its watermark per series, its subscribers' queues and its poller task."""
+
+    def __init__(self, key: str, template_id: str, sql: str, params: Dict[str, Any], since: Dict[str, Any], series_col: Optional[str]):
+        self.key = key
+        self.template_id = template_id
+        self.sql = sql
+        self.params = params
+        self.since = dict(since)
+        self.series_col = series_col
+        self.probe = probe_statement(sql, params)
+        self.probe_value: Any = _UNSET
+        self.queues: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+
+
+class LiveHub:
+    """Subscriptions of this process, keyed by subscription_key."""
+
+    def __init__(self, session_factory: Callable, poll_seconds: float = 5, heartbeat_seconds: float = 15, queue_size: int = 32):
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.queue_size = queue_size
+        self._subs: Dict[str, Subscription] = {}
+
+    async def subscribe(
+        self, template_id: str, sql: str, params: Dict[str, Any], since: Dict[str, Any], series_col: Optional[str]
+    ) -> Tuple[Subscription, asyncio.Queue, Optional[asyncio.Task]]:
+        """
+        Join (or start) the subscription for this trend + params. Returns (subscription, queue, catch-up):
+        a viewer joining a running subscription with an older watermark gets one catch-up delta of its own,
+        up to the subscription's watermark at the time it joined; everything after that is broadcast to
+        its queue, which is registered before the catch-up query runs.
+        """
+        incremental_sql(sql, since)  # ValueError if the template cannot be fetched incrementally
+        key = subscription_key(template_id, params, series_col)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        catchup = None
+        sub = self._subs.get(key)
+        if sub is None:
+            sub = self._subs[key] = Subscription(key, template_id, sql, params, since, series_col)
+            sub.task = asyncio.create_task(self._poll(sub), name=f"live-{template_id}")
+            metrics.incr("live_subscriptions_started")
+        elif any(since.get(k, float("-inf")) < v for k, v in sub.since.items()):
+            catchup = asyncio.create_task(self._catch_up(sub, since, dict(sub.since)))
+        # No await since the lookup: the subscription cannot have been retired in between
+        sub.queues.add(queue)
+        metrics.incr("live_subscribers")
+        return sub, queue, catchup
+
+    async def _catch_up(self, sub: Subscription, since: Dict[str, Any], upto: Dict[str, Any]) -> Optional[bytes]:
+        """Rows between a joining viewer's watermark and the subscription's (RESYNC if the query fails)."""
+        try:
+            delta = await run_in_threadpool(self._run, query_delta, sub.sql, sub.params, since, sub.series_col)
+        except Exception:
+            logger.exception("Live catch-up failed for %s", sub.template_id)
+            return RESYNC
+        delta = trim_delta(delta, upto) if delta is not None else None
+        return result_body(delta) if delta is not None else None
+
+    async def unsubscribe(self, sub: Subscription, queue: asyncio.Queue) -> None:
+        sub.queues.discard(queue)
+        if not sub.queues and self._subs.get(sub.key) is sub:
+            del self._subs[sub.key]
+            if sub.task is not None:
+                sub.task.cancel()
+
+    async def _poll(self, sub: Subscription) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                body = await run_in_threadpool(self._poll_once, sub)
+            except Exception:
+                logger.exception("Live poll failed for %s", sub.template_id)
+                continue
+            if body is not None:
+                self._broadcast(sub, body)
+
+    def _poll_once(self, sub: Subscription) -> Optional[bytes]:
+        """Probe, and if the source moved run the incremental query and advance the watermark."""
+        db = self.session_factory()
+        try:
+            metrics.incr("live_polls")
+            value = sub.probe_value
+            if sub.probe is not None:
+                value = db.execute(sub.probe, {"blendid": sub.params["blendid"]}).scalar()
+                if value == sub.probe_value:
+                    return None
+            delta = query_delta(db, sub.sql, sub.params, sub.since, sub.series_col)
+        finally:
+            db.close()
+        # Only once the delta was fetched: a failed query is retried on the next poll
+        sub.probe_value = value
+        if delta is None:
+            return None
+        sub.since.update(delta["incremental"]["last_cycle"])
+        metrics.incr("live_deltas")
+        return result_body(delta)
+
+    def _run(self, func, *args):
+        db = self.session_factory()
+        try:
+            return func(db, *args)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _broadcast(sub: Subscription, body: bytes) -> None:
+        for queue in list(sub.queues):
+            try:
+                queue.put_nowait(body)
+            except asyncio.QueueFull:
+                # Slow viewer: drop its backlog and have it catch up with one incremental fetch
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    async def events(self, sub: Subscription, queue: asyncio.Queue, catchup: Optional[asyncio.Task] = None):
+        """
+        SSE byte stream for one subscriber: its catch-up first, then "delta" events, "resync" when it fell
+        behind, keep-alive comments.
+        """
+        try:
+            yield b"retry: 5000\n\n"
+            if catchup is not None:
+                body = await catchup
+                if body is not None:
+                    yield self._event(body)
+            while True:
+                try:
+                    body = await asyncio.wait_for(queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                yield self._event(body)
+        finally:
+            if catchup is not None:
+                catchup.cancel()
+            await self.unsubscribe(sub, queue)
+
+    @staticmethod
+    def _event(body: bytes) -> bytes:
+        if body == RESYNC:
+            return b"event: resync\ndata: {}\n\n"
+        return b"event: delta\ndata: " + body + b"\n\n"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscriptions": len(self._subs),
+            "subscribers": sum(len(s.queues) for s in self._subs.values()),
+        }
+
+    async def close(self) -> None:
+        for sub in list(self._subs.values()):
+            if sub.task is not None:
+                sub.task.cancel()
+        self._subs.clear()
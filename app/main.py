@@ -1,32 +1,56 @@
 """
 BlendTwin Trend Query Workbench - FastAPI application.
 """
+import asyncio
+import json
 import logging
+import re
+import uuid
 from contextlib import asynccontextmanager
+from typing import Literal
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from pathlib import Path
 
-from app.database import SessionLocal
+from app.database import SessionLocal, AsyncSessionLocal, async_engine, dispose_engines, engine, kill_engine, warm_pool
+from app import metrics, query_registry
+from config.database import get_pool_config, get_query_timeout_ms
+from config.server import get_live_config, get_server_config
+from app import async_services
+from app.tunnel import read_tunnel_status
+from app.live import LiveHub
+from app.arrow_format import ARROW_STREAM_TYPE, wants_arrow
+from app.export import EXPORT_FORMATS, ExportUnavailable
+from app.cache import dropdown_cache, result_cache, schema_cache, trend_cache
 from app.services import (
-    list_trends,
+    get_trend_catalog,
     get_trend_by_id,
+    get_trend_analysis,
     get_trend_by_code,
     create_template,
     update_template,
-    execute_query,
-    get_schema,
+    execute_query_cached,
+    execute_incremental,
+    execute_batch,
+    stream_query_ndjson,
+    export_query,
+    get_schema_cached,
     get_trend_params_list,
+    get_dropdown_options,
+    warm_caches,
+    resolve_plot_columns,
     delete_template,
     list_plots_for_trend,
     create_plot,
     update_plot,
     delete_plot,
+    save_plot_layout,
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -36,13 +60,40 @@ logger = logging.getLogger(__name__)
 ROOT = Path(__file__).resolve().parent.parent
 
 
+def _warm_up() -> bool:
+    """Open the DB pool and fill the metadata caches. Returns True if the database answered."""
+    try:
+        opened = warm_pool(get_pool_config()["pool_size"])
+    except Exception as e:
+        logger.warning("Database not reachable during warm-up: %s", e)
+        return False
+    db = SessionLocal()
+    try:
+        timings = warm_caches(db)
+    finally:
+        db.close()
+    logger.info("Warm-up done: %d pooled connections, caches %s", opened, timings)
+    return True
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # uvicorn only starts accepting connections once startup returns, so warm-up gates traffic
+    app.state.ready = await run_in_threadpool(_warm_up) if get_server_config()["warmup"] else False
     yield
-    # cleanup if needed
+    # In-flight requests have finished (uvicorn graceful shutdown); release DB connections
+    app.state.ready = False
+    await live_hub.close()
+    dispose_engines()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 
 app = FastAPI(title="BlendTwin Trend Query Workbench", version="1.0.0", lifespan=lifespan)
+# Leave one pooled connection free for other requests while a batch fans out
+_pool = get_pool_config()
+BATCH_MAX_WORKERS = max(1, _pool["pool_size"] + _pool["max_overflow"] - 1)
+live_hub = LiveHub(SessionLocal, **get_live_config())
 
 app.add_middleware(
     CORSMiddleware,
@@ -57,6 +108,33 @@ app.add_middleware(
 class ExecuteRequest(BaseModel):
     sql: str
     params: dict | None = None
+    format: Literal["rows", "columnar"] = "rows"  # columnar: {"columns": [...], "data": {col: [...]}}
+    template_id: str | None = None  # Saved trend this SQL came from (per-template cache TTL/invalidation)
+    no_cache: bool = False  # Bypass the result cache and always hit MySQL
+    max_points: int | None = Field(default=None, ge=10)  # Downsample each plotted series to ~max_points rows
+    downsample: Literal["lttb", "minmax"] = "lttb"
+    parameterized: bool = False  # Bind params via the driver on a cached compiled statement instead of inlining values
+    timeout_ms: int | None = Field(default=None, ge=1)  # MySQL MAX_EXECUTION_TIME hint; default QUERY_TIMEOUT_MS
+    query_handle: str | None = Field(default=None, max_length=64)  # Client-chosen id for DELETE /api/execute/{handle}
+    since_cycle: dict[str, int] | int | None = None  # Only rows with cycleno above this (per series value); JSON, uncached
+    series_col: str | None = None  # Series column for since_cycle (default: the trend's first plot, then "series")
+
+
+class BatchItem(BaseModel):
+    key: str | None = None  # Label for this set in the response (default: "blendid=...&tankno=...")
+    params: dict = {}
+
+
+class BatchExecuteRequest(BaseModel):
+    sql: str | None = None
+    template_id: str | None = None  # Run the saved template's SQL when sql is omitted
+    items: list[BatchItem] = Field(min_length=1, max_length=200)
+    format: Literal["rows", "columnar"] = "rows"
+    parameterized: bool = True
+    mode: Literal["parallel", "union"] = "parallel"  # union: one UNION ALL statement for all sets
+    max_workers: int = Field(default=4, ge=1, le=16)
+    timeout_ms: int | None = Field(default=None, ge=1)  # Per statement; default QUERY_TIMEOUT_MS
+    query_handle: str | None = Field(default=None, max_length=64)
 
 
 class TrendParameterCreate(BaseModel):
@@ -79,12 +157,18 @@ class CreateTrendRequest(BaseModel):
 class UpdateTrendRequest(BaseModel):
     sql_template: str
     trend_name: str | None = None
+    prune_parameters: bool = False  # Delete stored parameters the SQL no longer uses (blendid is kept)
 
 
 class PlotConfigBody(BaseModel):
     config: dict  # Full plot config: title, type, x_col, y_cols, colors, etc.
 
 
+class PlotLayoutBody(BaseModel):
+    plots: list[dict]  # Plot configs in canvas order; include "id" to update a saved plot
+    replace: bool = True  # Delete saved plots that are not in the list
+
+
 # --- API Routes ---
 
 def get_db():
@@ -95,12 +179,21 @@ def get_db():
         db.close()
 
 
+def _etag_response(request: Request, body: bytes, etag: str, headers: dict | None = None) -> Response:
+    """200 with body and ETag, or 304 when the client's If-None-Match already matches."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **(headers or {})}
+    inm = request.headers.get("if-none-match", "")
+    if etag in (t.strip().removeprefix("W/") for t in inm.split(",")) or inm.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/api/trends")
-def api_list_trends(db: Session = Depends(get_db)):
-    """List all trend templates."""
+def api_list_trends(request: Request, db: Session = Depends(get_db)):
+    """List all trend templates (in-memory catalog; If-None-Match on an unchanged catalog returns 304)."""
     try:
-        trends = list_trends(db)
-        return {"trends": trends}
+        catalog = get_trend_catalog(db)
+        return _etag_response(request, catalog["body"], catalog["etag"])
     except Exception as e:
         logger.exception("List trends failed")
         raise HTTPException(status_code=500, detail=str(e))
@@ -136,6 +229,21 @@ def api_get_trend_by_code(trend_code: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/trends/{template_id}/analysis")
+def api_trend_analysis(template_id: str, db: Session = Depends(get_db)):
+    """Placeholders, referenced tables and output columns of a trend's SQL (cached per template text)."""
+    try:
+        analysis = get_trend_analysis(db, template_id)
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Trend not found")
+        return analysis
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Trend analysis failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/trends")
 def api_create_trend(req: CreateTrendRequest, db: Session = Depends(get_db)):
     """Create new SQL template with optional refid and parameters."""
@@ -160,7 +268,7 @@ def api_create_trend(req: CreateTrendRequest, db: Session = Depends(get_db)):
 def api_update_trend(template_id: str, req: UpdateTrendRequest, db: Session = Depends(get_db)):
     """Update existing SQL template."""
     try:
-        trend = update_template(db, template_id, req.sql_template, req.trend_name)
+        trend = update_template(db, template_id, req.sql_template, req.trend_name, req.prune_parameters)
         if not trend:
             raise HTTPException(status_code=404, detail="Trend not found")
         return trend
@@ -187,26 +295,310 @@ def api_delete_trend(template_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _result_format(req: ExecuteRequest, request: Request) -> str:
+    """Arrow when the client accepts application/vnd.apache.arrow.stream (and pyarrow is installed), else req.format."""
+    if req.since_cycle is None and wants_arrow(request.headers.get("accept")):
+        return "arrow"
+    return req.format
+
+
+def _since_cycle(req: ExecuteRequest) -> dict:
+    """since_cycle as {series value: last cycleno}; a plain number applies to the whole result (key "")."""
+    if isinstance(req.since_cycle, dict):
+        if not req.since_cycle:
+            raise HTTPException(status_code=400, detail="since_cycle needs at least one series")
+        return req.since_cycle
+    return {"": req.since_cycle}
+
+
+def _execute_call(req: ExecuteRequest, fmt: str, handle: str, incremental, cached) -> tuple:
+    """(function, kwargs) for an execute request: the incremental tail when since_cycle is set, else the cached result."""
+    common = dict(fmt=fmt, template_id=req.template_id, parameterized=req.parameterized,
+                  timeout_ms=req.timeout_ms or get_query_timeout_ms(), query_handle=handle)
+    if req.since_cycle is not None:
+        return incremental, dict(common, since=_since_cycle(req), series_col=req.series_col)
+    return cached, dict(common, use_cache=not req.no_cache, max_points=req.max_points, downsample=req.downsample)
+
+
+def _result_media_type(fmt: str) -> str:
+    return ARROW_STREAM_TYPE if fmt == "arrow" else "application/json"
+
+
+def _execute_error_status(result: dict) -> int:
+    if result.get("timeout"):
+        return 504
+    if result.get("cancelled"):
+        return 409
+    return 400
+
+
+async def _run_cancellable(request: Request, handle: str, func, *args, **kwargs):
+    """Run a blocking query in the threadpool; KILL QUERY it if the client disconnects first."""
+    work = asyncio.ensure_future(run_in_threadpool(func, *args, **kwargs))
+    while True:
+        done, _ = await asyncio.wait({work}, timeout=0.5)
+        if done:
+            return work.result()
+        if await request.is_disconnected():
+            logger.info("Client disconnected, cancelling query %s", handle)
+            await run_in_threadpool(query_registry.cancel, handle, kill_engine)
+            return await work
+
+
 @app.post("/api/execute")
-def api_execute(req: ExecuteRequest, db: Session = Depends(get_db)):
-    """Execute SQL with optional parameters."""
+async def api_execute(req: ExecuteRequest, request: Request, db: Session = Depends(get_db)):
+    """
+    Execute SQL with optional parameters. Served from the result cache unless no_cache is set.
+    The query is registered under query_handle (or a generated one, returned in X-Query-Handle)
+    and is killed if the client disconnects.
+    With Accept: application/vnd.apache.arrow.stream the result is an Arrow IPC stream instead of JSON.
+    """
+    handle = req.query_handle or uuid.uuid4().hex
+    fmt = _result_format(req, request)
     try:
-        result = execute_query(db, req.sql, req.params)
+        func, kwargs = _execute_call(req, fmt, handle, execute_incremental, execute_query_cached)
+        result = await _run_cancellable(request, handle, func, db, req.sql, req.params, **kwargs)
         if result.get("error"):
-            raise HTTPException(status_code=400, detail=result["error"])
-        return result
+            raise HTTPException(status_code=_execute_error_status(result), detail=result["error"])
+        return Response(
+            content=result["body"],
+            media_type=_result_media_type(fmt),
+            headers={"X-Cache": result["cache"], "X-Query-Handle": handle, "Vary": "Accept"},
+        )
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.exception("Execute failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/execute/batch")
+def api_execute_batch(req: BatchExecuteRequest):
+    """
+    Execute one template for many parameter sets (e.g. a trend across 30 blends) in one request.
+    The template lookup's connection is returned before the items fan out, and max_workers is capped
+    below the pool's capacity so a batch never waits on a connection it holds itself.
+    """
+    sql = req.sql
+    if not sql and req.template_id:
+        with SessionLocal() as db:
+            trend = get_trend_by_id(db, req.template_id)
+        if not trend:
+            raise HTTPException(status_code=404, detail="Trend not found")
+        sql = trend["sql_template"]
+    if not sql:
+        raise HTTPException(status_code=400, detail="Provide sql or template_id")
+    try:
+        return execute_batch(
+            SessionLocal,
+            sql,
+            [item.model_dump() for item in req.items],
+            fmt=req.format,
+            parameterized=req.parameterized,
+            mode=req.mode,
+            max_workers=min(req.max_workers, BATCH_MAX_WORKERS),
+            timeout_ms=req.timeout_ms or get_query_timeout_ms(),
+            query_handle=req.query_handle or uuid.uuid4().hex,
+        )
+    except Exception as e:
+        logger.exception("Batch execute failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/execute/stream")
+def api_execute_stream(req: ExecuteRequest):
+    """
+    Execute SQL and stream rows as NDJSON from a server-side cursor.
+    Owns its session: a Depends(get_db) session would be closed before the body is sent.
+    """
+    db = SessionLocal()
+    handle = req.query_handle or uuid.uuid4().hex
+    lines = stream_query_ndjson(db, req.sql, req.params, parameterized=req.parameterized, query_handle=handle)
+    try:
+        head = next(lines)  # surface SQL errors as 400 before the response starts
+    except Exception as e:
+        lines.close()
+        db.close()
+        logger.exception("Execute stream failed")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def body():
+        try:
+            yield head
+            yield from lines
+        finally:
+            lines.close()
+            db.close()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers={"X-Query-Handle": handle})
+
+
+@app.get("/api/trends/{template_id}/export")
+def api_export_trend(template_id: str, request: Request, format: str = "csv", parameterized: bool = False):
+    """
+    Run a saved trend and download the result as CSV, Parquet or XLSX, streamed from a server-side cursor.
+    Every other query-string argument is a template parameter (?format=xlsx&blendid=20200617-005).
+    Owns its session for the same reason as /api/execute/stream.
+    """
+    params = {k: v for k, v in request.query_params.items() if k not in ("format", "parameterized")}
+    db = SessionLocal()
+    handle = uuid.uuid4().hex
+    try:
+        trend = get_trend_by_id(db, template_id)
+        if not trend:
+            raise HTTPException(status_code=404, detail="Trend not found")
+        chunks = export_query(db, trend["sql_template"], params, format, parameterized, handle)
+    except HTTPException:
+        db.close()
+        raise
+    except ExportUnavailable as e:
+        db.close()
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        db.close()
+        logger.exception("Export failed")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def body():
+        try:
+            yield from chunks
+        finally:
+            chunks.close()
+            db.close()
+
+    media_type, ext = EXPORT_FORMATS[format]
+    filename = re.sub(r"[^A-Za-z0-9_.-]+", "_", template_id) + "." + ext
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Query-Handle": handle},
+    )
+
+
+def _live_trend(template_id: str, series_col: str | None):
+    """(template SQL, series column) for a live subscription, or None if the trend does not exist."""
+    db = SessionLocal()
+    try:
+        trend = get_trend_by_id(db, template_id)
+        if not trend:
+            return None
+        return trend["sql_template"], series_col or resolve_plot_columns(db, template_id).get("series_col")
+    finally:
+        db.close()
+
+
+@app.get("/api/trends/{template_id}/live")
+async def api_live_trend(template_id: str, request: Request, since: str, series_col: str | None = None):
+    """
+    Server-Sent Events stream of new rows for a saved trend. since is the JSON the client would send as
+    since_cycle ({"series": last cycleno} or a number); every other query-string argument is a template
+    parameter. Each "delta" event carries an incremental /api/execute payload; all viewers of the same
+    trend + parameters share one poller. "resync" asks the client to catch up with since_cycle itself.
+    """
+    params = {k: v for k, v in request.query_params.items() if k not in ("since", "series_col")}
+    try:
+        since_cycle = json.loads(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since must be JSON: a cycleno or {series: cycleno}")
+    if not isinstance(since_cycle, dict):
+        since_cycle = {"": since_cycle}
+    if not since_cycle or not all(isinstance(v, (int, float)) for v in since_cycle.values()):
+        raise HTTPException(status_code=400, detail="since must be JSON: a cycleno or {series: cycleno}")
+    found = await run_in_threadpool(_live_trend, template_id, series_col)
+    if not found:
+        raise HTTPException(status_code=404, detail="Trend not found")
+    sql, series_col = found
+    try:
+        sub, queue, catchup = await live_hub.subscribe(template_id, sql, params, since_cycle, series_col)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        live_hub.events(sub, queue, catchup),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/execute/active")
+def api_active_queries():
+    """In-flight queries with their MySQL connection id and elapsed time."""
+    return {"queries": query_registry.list_active()}
+
+
+@app.delete("/api/execute/{handle}")
+def api_cancel_query(handle: str):
+    """Cancel an in-flight query (KILL QUERY on a side connection)."""
+    killed = query_registry.cancel(handle, kill_engine)
+    if not killed:
+        raise HTTPException(status_code=404, detail="No running query with this handle")
+    return {"message": "Query cancelled", "cancelled": killed}
+
+
+@app.get("/api/health/live")
+def api_health_live():
+    """Liveness: the process is serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/api/health/ready")
+def api_health_ready():
+    """Readiness: warm-up done and the database answers. 503 until then."""
+    if not getattr(app.state, "ready", False):
+        try:
+            warm_pool(1)
+            app.state.ready = True
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Database not reachable: {e}")
+    return {"status": "ready"}
+
+
+@app.get("/api/metrics")
+def api_metrics():
+    """Counters (timed-out queries, tunnel reconnects, ...), pool status, cache stats and tunnel channel health."""
+    return {
+        "counters": metrics.snapshot(),
+        "pool": {
+            "status": engine.pool.status(),
+            "checked_out": engine.pool.checkedout() if hasattr(engine.pool, "checkedout") else None,
+        },
+        "result_cache": result_cache.stats(),
+        "schema_cache": schema_cache.stats(),
+        "trend_cache": trend_cache.stats(),
+        "dropdown_cache": dropdown_cache.stats(),
+        "tunnel": read_tunnel_status(),
+        "live": live_hub.stats(),
+    }
+
+
+@app.get("/api/cache/stats")
+def api_cache_stats():
+    """Result, schema, trend detail and dropdown cache hit/miss/eviction counters."""
+    return {
+        "result_cache": result_cache.stats(),
+        "schema_cache": schema_cache.stats(),
+        "trend_cache": trend_cache.stats(),
+        "dropdown_cache": dropdown_cache.stats(),
+    }
+
+
+@app.delete("/api/cache")
+def api_cache_clear():
+    """Drop all cached query results."""
+    result_cache.clear()
+    return {"message": "Cache cleared"}
+
+
 @app.get("/api/schema")
-def api_schema(db: Session = Depends(get_db)):
-    """Get database schema for query builder autocomplete."""
+def api_schema(request: Request, refresh: bool = False, db: Session = Depends(get_db)):
+    """
+    Get database schema for query builder autocomplete (cached, ETag / If-None-Match aware).
+    Pass refresh=true to reload from information_schema.
+    """
     try:
-        return get_schema(db)
+        result = get_schema_cached(db, refresh=refresh)
+        return _etag_response(request, result["body"], result["etag"], {"X-Cache": result["cache"]})
     except Exception as e:
         logger.exception("Schema fetch failed")
         raise HTTPException(status_code=500, detail=str(e))
@@ -252,6 +644,25 @@ def api_create_plot(template_id: str, req: PlotConfigBody, db: Session = Depends
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.put("/api/trends/{template_id}/plots")
+def api_save_plot_layout(template_id: str, req: PlotLayoutBody, db: Session = Depends(get_db)):
+    """Save the whole plot layout (insert, update, reorder, delete) in one transaction."""
+    try:
+        plots = save_plot_layout(db, template_id, req.plots, replace=req.replace)
+        if plots is None:
+            raise HTTPException(status_code=404, detail="Trend not found")
+        return {"plots": plots}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Save plot layout failed")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.put("/api/trends/{template_id}/plots/{plot_id}")
 def api_update_plot(template_id: str, plot_id: int, req: PlotConfigBody, db: Session = Depends(get_db)):
     """Update an existing saved plot."""
@@ -285,25 +696,137 @@ def api_delete_plot(template_id: str, plot_id: int, db: Session = Depends(get_db
 
 
 @app.get("/api/dropdown-options")
-def api_dropdown_options(db: Session = Depends(get_db)):
-    """Get dropdown options from bts_DropDownList for Quality, Model, Stream, Tank No."""
-    from sqlalchemy import text
-    result = {}
-    mappings = [
-        ("quality", "quality"),
-        ("streams", "streams"),
-        ("tank_no", "tank_no"),
-        ("ai_mixing_model", "ai_mixing_model"),
-    ]
-    for col, key in mappings:
-        try:
-            rows = db.execute(
-                text(f"SELECT DISTINCT `{col}` FROM bts_DropDownList WHERE `{col}` IS NOT NULL AND `{col}` != '' ORDER BY `{col}`")
-            ).fetchall()
-            result[key] = [str(r[0]).strip() for r in rows if r[0]]
-        except Exception:
-            result[key] = []
-    return result
+def api_dropdown_options(request: Request, db: Session = Depends(get_db)):
+    """Get dropdown options from bts_DropDownList for Quality, Model, Stream, Tank No (and trend_parms)."""
+    try:
+        options = get_dropdown_options(db)
+        return _etag_response(request, options["body"], options["etag"], {"Cache-Control": "private, max-age=60"})
+    except Exception as e:
+        logger.exception("Dropdown options fetch failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/dropdown-options/refresh")
+def api_dropdown_options_refresh(db: Session = Depends(get_db)):
+    """Reload the dropdown domains from bts_DropDownList now."""
+    try:
+        return get_dropdown_options(db, refresh=True)["domains"]
+    except Exception as e:
+        logger.exception("Dropdown options refresh failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --- Async routes (opt-in: DB_ASYNC_ENABLED=true) ---
+# Same contracts as the sync routes above, served from the async engine under /api/async.
+
+async_router = APIRouter(prefix="/api/async")
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+@async_router.get("/trends")
+async def api_async_list_trends(request: Request, db=Depends(get_async_db)):
+    """List all trend templates."""
+    try:
+        catalog = await async_services.get_trend_catalog(db)
+        return _etag_response(request, catalog["body"], catalog["etag"])
+    except Exception as e:
+        logger.exception("List trends failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@async_router.get("/trends/by-id/{template_id}")
+async def api_async_get_trend_by_id(template_id: str, db=Depends(get_async_db)):
+    """Get trend by template_id."""
+    try:
+        trend = await async_services.get_trend_by_id(db, template_id)
+    except Exception as e:
+        logger.exception("Get trend failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not trend:
+        raise HTTPException(status_code=404, detail="Trend not found")
+    return trend
+
+
+@async_router.post("/execute")
+async def api_async_execute(req: ExecuteRequest, request: Request, db=Depends(get_async_db)):
+    """Execute SQL with optional parameters on the async engine (Arrow IPC on request, as /api/execute)."""
+    fmt = _result_format(req, request)
+    func, kwargs = _execute_call(
+        req, fmt, req.query_handle or uuid.uuid4().hex,
+        async_services.execute_incremental, async_services.execute_query_cached,
+    )
+    try:
+        result = await func(db, req.sql, req.params, **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Execute failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    if result.get("error"):
+        raise HTTPException(status_code=_execute_error_status(result), detail=result["error"])
+    return Response(
+        content=result["body"], media_type=_result_media_type(fmt), headers={"X-Cache": result["cache"], "Vary": "Accept"}
+    )
+
+
+@async_router.get("/trends/{template_id}/plots")
+async def api_async_list_plots(template_id: str, db=Depends(get_async_db)):
+    """List saved plots for a trend."""
+    try:
+        return {"plots": await async_services.list_plots_for_trend(db, template_id)}
+    except Exception as e:
+        logger.exception("List plots failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@async_router.post("/trends/{template_id}/plots")
+async def api_async_create_plot(template_id: str, req: PlotConfigBody, db=Depends(get_async_db)):
+    """Save a new plot config to bts_cfg_trend_plots."""
+    try:
+        plot = await async_services.create_plot(db, template_id, req.config)
+    except Exception as e:
+        logger.exception("Create plot failed")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    if not plot:
+        raise HTTPException(status_code=404, detail="Trend not found")
+    return plot
+
+
+@async_router.put("/trends/{template_id}/plots/{plot_id}")
+async def api_async_update_plot(template_id: str, plot_id: int, req: PlotConfigBody, db=Depends(get_async_db)):
+    """Update an existing saved plot."""
+    try:
+        plot = await async_services.update_plot(db, template_id, plot_id, req.config)
+    except Exception as e:
+        logger.exception("Update plot failed")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    if not plot:
+        raise HTTPException(status_code=404, detail="Plot or trend not found")
+    return plot
+
+
+@async_router.delete("/trends/{template_id}/plots/{plot_id}")
+async def api_async_delete_plot(template_id: str, plot_id: int, db=Depends(get_async_db)):
+    """Delete a saved plot."""
+    try:
+        success = await async_services.delete_plot(db, template_id, plot_id)
+    except Exception as e:
+        logger.exception("Delete plot failed")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    if not success:
+        raise HTTPException(status_code=404, detail="Plot or trend not found")
+    return {"message": "Plot deleted successfully"}
+
+
+if AsyncSessionLocal is not None:
+    app.include_router(async_router)
 
 
 # --- Static files & SPA ---
@@ -0,0 +1,17 @@
+"""Process-wide counters exposed at /api/metrics."""
+import threading
+from collections import Counter
+from typing import Dict
+
+_counters: Counter = Counter()
+_lock = threading.Lock()
+
+
+def incr(name: str, amount: int = 1) -> None:
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot() -> Dict[str, int]:
+    with _lock:
+        return dict(_counters)
@@ -3,7 +3,7 @@ SQLAlchemy models for BlendTwin configuration tables.
 Column names match typical schema from SOW; may need adjustment for actual DB.
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -49,6 +49,8 @@ class TrendPlot(Base):
 class TrendParameter(Base):
     """bts_Trend_Parameters (Note Case)"""
     __tablename__ = "bts_Trend_Parameters"
+    # Added by scripts/migrate_trend_parameters_unique.py on existing databases
+    __table_args__ = (UniqueConstraint("trendid", "parameter", name="uq_trend_parameter"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     refid = Column(String(50), nullable=True)
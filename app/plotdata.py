@@ -0,0 +1,205 @@
+"""
+Materialized multi-model plot data (see PLOTDATA_QUERY.md).
+bts_mat_PlotData holds the four-way join of bts_TQTSCSTRModel with bts_SimulatedStreamQuality,
+bts_TQTSLaggedModel and bts_TQTSHybridModel, already cast, one narrow row per
+(blendid, tankno, stream, cycleno). The refresh job (scripts/refresh_plotdata.py) loads the cycles past
+each (blendid, tankno, stream)'s watermark, the highest cycleno stored for it, and re-upserts the last
+REFRESH_WINDOW cycles below it so lagged / hybrid / stream-quality rows that arrive late are filled in.
+Incremental runs only look at blends with CSTR rows from the last LOOKBACK_DAYS days.
+Trends opt in by reading from the table: MATERIALIZED_QUERY is saved as a trend of its own, next to the
+live query it mirrors (the refresh never touches templates).
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from app.cache import result_cache
+from app.models import SQLTemplate
+from app.sql_analysis import analyze_template
+
+logger = logging.getLogger(__name__)
+
+MAT_TABLE = "bts_mat_PlotData"
+REFRESH_WINDOW = 10  # cycles below the watermark re-upserted on every refresh, for late model rows
+LOOKBACK_DAYS = 7  # an incremental run only looks for pending rows in blends with CSTR rows this recent
+
+CREATE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {MAT_TABLE} (
+    blendid VARCHAR(50) NOT NULL,
+    tankno VARCHAR(50) NOT NULL,
+    stream VARCHAR(100) NOT NULL,
+    cycleno INT NOT NULL,
+    refid VARCHAR(50) NULL,
+    ts DATETIME NULL,
+    stream_quality DOUBLE NULL,
+    cstr_ron DOUBLE NULL,
+    lagged_ron DOUBLE NULL,
+    hybrid_ron DOUBLE NULL,
+    tankvol DOUBLE NULL,
+    inflow DECIMAL(15,2) NULL,
+    outflow DECIMAL(15,2) NULL,
+    refreshed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (blendid, tankno, stream, cycleno)
+)
+"""
+
+# (blendid, tankno, stream) whose CSTR rows go past the watermark (watermark NULL: not loaded yet).
+# {scope} limits both sides to the blends being looked at (see pending_blends), so finding the
+# backlog does not scan the whole history of either table.
+PENDING_SQL = f"""
+SELECT src.blendid, src.tankno, src.stream, src.max_cycle, mat.max_cycle AS watermark
+FROM (
+    SELECT blendid, tankno, stream, MAX(cycleno) AS max_cycle
+    FROM bts_TQTSCSTRModel WHERE blendid IN ({{scope}}) GROUP BY blendid, tankno, stream
+) src
+LEFT JOIN (
+    SELECT blendid, tankno, stream, MAX(cycleno) AS max_cycle
+    FROM {MAT_TABLE} WHERE blendid IN ({{scope}}) GROUP BY blendid, tankno, stream
+) mat ON mat.blendid = src.blendid AND mat.tankno = src.tankno AND mat.stream = src.stream
+WHERE mat.max_cycle IS NULL OR src.max_cycle > mat.max_cycle
+ORDER BY src.blendid, src.tankno, src.stream
+"""
+SCOPE_BLENDIDS = ":ids"
+SCOPE_RECENT = "SELECT DISTINCT blendid FROM bts_TQTSCSTRModel WHERE timestamp >= :since"
+SCOPE_ALL = "SELECT DISTINCT blendid FROM bts_TQTSCSTRModel"
+
+# One blend: every (tankno, stream) from REFRESH_WINDOW cycles below its own watermark onwards (all cycles
+# when not loaded yet). Existing rows are updated, so late model values replace NULLs.
+REFRESH_SQL = f"""
+INSERT INTO {MAT_TABLE}
+    (blendid, tankno, stream, cycleno, refid, ts, stream_quality, cstr_ron, lagged_ron, hybrid_ron,
+     tankvol, inflow, outflow, refreshed_at)
+SELECT
+    cstr.blendid, cstr.tankno, cstr.stream, cstr.cycleno, cstr.refid, cstr.timestamp,
+    ssq.ron, cstr.ron, lagged.ron, hyb.ron, cstr.tankvol,
+    CAST(NULLIF(TRIM(cstr.streamin), '') AS DECIMAL(15,2)),
+    CAST(NULLIF(TRIM(cstr.blendout), '') AS DECIMAL(15,2)),
+    NOW()
+FROM bts_TQTSCSTRModel cstr
+LEFT JOIN (
+    SELECT tankno, stream, MAX(cycleno) AS max_cycle
+    FROM {MAT_TABLE} WHERE blendid = :blendid GROUP BY tankno, stream
+) wm ON wm.tankno = cstr.tankno AND wm.stream = cstr.stream
+LEFT JOIN bts_SimulatedStreamQuality ssq
+    ON cstr.blendid = ssq.blendid AND cstr.cycleno = ssq.cycleno AND cstr.stream = ssq.stream
+LEFT JOIN bts_TQTSLaggedModel lagged
+    ON cstr.blendid = lagged.blendid AND cstr.cycleno = lagged.cycleno
+    AND cstr.tankno = lagged.tankno AND cstr.stream = lagged.stream
+LEFT JOIN bts_TQTSHybridModel hyb
+    ON cstr.blendid = hyb.blendid AND cstr.cycleno = hyb.cycleno
+    AND cstr.tankno = hyb.tankno AND cstr.stream = hyb.stream
+WHERE cstr.blendid = :blendid
+  AND (wm.max_cycle IS NULL OR cstr.cycleno > wm.max_cycle - :window)
+ON DUPLICATE KEY UPDATE
+    refid = VALUES(refid), ts = VALUES(ts), stream_quality = VALUES(stream_quality),
+    cstr_ron = VALUES(cstr_ron), lagged_ron = VALUES(lagged_ron), hybrid_ron = VALUES(hybrid_ron),
+    tankvol = VALUES(tankvol), inflow = VALUES(inflow), outflow = VALUES(outflow),
+    refreshed_at = VALUES(refreshed_at)
+"""
+
+# Same output columns and parameters as the "Main Query" in PLOTDATA_QUERY.md (which also reports ron only)
+MATERIALIZED_QUERY = f"""SELECT
+    ROW_NUMBER() OVER (ORDER BY cycleno) AS id,
+    refid AS RefID,
+    blendid,
+    cycleno,
+    ts AS TimeStamp,
+    tankno AS TankNo,
+    stream AS Stream,
+    'ron' AS Quality,
+    stream_quality AS `Stream Quality`,
+    cstr_ron AS CSTRModel,
+    lagged_ron AS LaggedModel,
+    hybrid_ron AS HybridModel,
+    tankvol AS `Tank Volume`,
+    inflow AS Inflow,
+    outflow AS Outflow
+FROM {MAT_TABLE}
+WHERE blendid = :blendid
+  AND tankno = :tankno
+  AND stream = :stream
+ORDER BY cycleno"""
+
+
+def ensure_table(db: Session) -> None:
+    db.execute(text(CREATE_TABLE))
+    db.commit()
+
+
+def pending_blends(
+    db: Session, blendids: Optional[List[str]] = None, lookback_days: int = LOOKBACK_DAYS
+) -> List[Dict[str, Any]]:
+    """
+    (blendid, tankno, stream) with source cycles past their watermark: [{blendid, tankno, stream, max_cycle, watermark}].
+    Only blendids when given, else blends with CSTR rows in the last lookback_days (0: every blend).
+    """
+    if blendids:
+        stmt = text(PENDING_SQL.format(scope=SCOPE_BLENDIDS)).bindparams(bindparam("ids", expanding=True))
+        params: Dict[str, Any] = {"ids": list(blendids)}
+    elif lookback_days > 0:
+        stmt = text(PENDING_SQL.format(scope=SCOPE_RECENT))
+        params = {"since": datetime.now() - timedelta(days=lookback_days)}
+    else:
+        stmt, params = text(PENDING_SQL.format(scope=SCOPE_ALL)), {}
+    return [dict(r._mapping) for r in db.execute(stmt, params)]
+
+
+def refresh(
+    db: Session,
+    blendids: Optional[List[str]] = None,
+    full: bool = False,
+    window: int = REFRESH_WINDOW,
+    lookback_days: int = LOOKBACK_DAYS,
+) -> Dict[str, Any]:
+    """
+    Load new cycles into the materialized table, one transaction per blend with a pending (tankno, stream).
+    Each refreshed blend also re-upserts the last window cycles of every (tankno, stream).
+    blendids refreshes exactly those blends, pending or not (late model rows of a finished blend);
+    otherwise only blends with CSTR rows in the last lookback_days are checked (0, or full: every blend).
+    full reloads them (all blends if none given) from cycle 0. Returns {blends, rows, seconds}.
+    """
+    t0 = time.perf_counter()
+    ensure_table(db)
+    if full:
+        if blendids:
+            stmt = text(f"DELETE FROM {MAT_TABLE} WHERE blendid IN :ids").bindparams(bindparam("ids", expanding=True))
+            db.execute(stmt, {"ids": list(blendids)})
+        else:
+            db.execute(text(f"TRUNCATE TABLE {MAT_TABLE}"))
+        db.commit()
+    pending: Dict[str, List[Dict[str, Any]]] = {b: [] for b in blendids or []}
+    for p in pending_blends(db, blendids, 0 if full else lookback_days):
+        pending.setdefault(p["blendid"], []).append(p)
+    rows = 0
+    for blendid, keys in pending.items():
+        result = db.execute(text(REFRESH_SQL), {"blendid": blendid, "window": max(window, 0)})
+        db.commit()
+        rows += max(result.rowcount, 0)
+        logger.info("Refreshed %s: %d tank/stream(s) behind (%d rows)", blendid, len(keys), result.rowcount)
+    if pending:
+        invalidate_materialized_trends(db)
+    return {"blends": len(pending), "rows": rows, "seconds": round(time.perf_counter() - t0, 2)}
+
+
+def reads_materialized(sql: str) -> bool:
+    """True if the template SQL reads from the materialized table."""
+    return any(t.split(".")[-1].lower() == MAT_TABLE.lower() for t in analyze_template(sql).tables)
+
+
+def invalidate_materialized_trends(db: Session) -> List[str]:
+    """
+    Drop cached results of trends that read the materialized table (effective across workers with a
+    shared cache backend). Returns their template_ids.
+    """
+    ids = [
+        tid
+        for tid, sql in db.query(SQLTemplate.template_id, SQLTemplate.sql_template).all()
+        if sql and reads_materialized(sql)
+    ]
+    for tid in ids:
+        result_cache.invalidate_template(tid)
+    return ids
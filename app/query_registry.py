@@ -0,0 +1,175 @@
+"""
+Registry of in-flight workbench queries, so they can be listed and cancelled.
+Each query is registered under a handle together with its MySQL connection id; cancelling
+issues KILL QUERY <id> from a separate, unpooled connection (works even when the pool is exhausted).
+Requests coalesced onto another request's execution (app.singleflight) follow its handle: their own
+handles stay cancellable, and the shared query is only killed once no request waits for it any more.
+"""
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+MYSQL_QUERY_INTERRUPTED_ERRNO = 1317  # ER_QUERY_INTERRUPTED: raised in the session hit by KILL QUERY
+
+_active: Dict[str, Dict[str, Any]] = {}
+_followers: Dict[str, str] = {}  # follower handle -> handle of the execution it waits for
+_shares: Dict[str, Set[str]] = {}  # leader handle -> handles still waiting for its execution (leader included)
+_detached: Set[str] = set()  # handles cancelled while their shared execution kept running for others
+_lock = threading.Lock()
+
+
+def connection_id(db: Session) -> Optional[int]:
+    """MySQL CONNECTION_ID() of the session's connection, cached on the pooled DBAPI connection."""
+    if db.get_bind().dialect.name != "mysql":
+        return None
+    conn = db.connection()
+    cid = conn.info.get("mysql_connection_id")
+    if cid is None:
+        cid = conn.execute(text("SELECT CONNECTION_ID()")).scalar()
+        conn.info["mysql_connection_id"] = cid
+    return cid
+
+
+async def async_connection_id(db) -> Optional[int]:
+    """connection_id() for an AsyncSession."""
+    if db.get_bind().dialect.name != "mysql":
+        return None
+    conn = await db.connection()
+    cid = conn.info.get("mysql_connection_id")
+    if cid is None:
+        cid = (await conn.execute(text("SELECT CONNECTION_ID()"))).scalar()
+        conn.info["mysql_connection_id"] = cid
+    return cid
+
+
+def register(handle: str, conn_id: Optional[int], sql: str) -> None:
+    with _lock:
+        _active[handle] = {
+            "handle": handle,
+            "connection_id": conn_id,
+            "sql": sql[:500],
+            "started_at": datetime.utcnow().isoformat(),
+            "_t0": time.monotonic(),
+        }
+
+
+def unregister(handle: str) -> None:
+    with _lock:
+        _active.pop(handle, None)
+
+
+@contextmanager
+def track(handle: Optional[str], db: Session, sql: str):
+    """Register the session's connection under handle for the duration of the block."""
+    if not handle:
+        yield
+        return
+    register(handle, connection_id(db), sql)
+    try:
+        yield
+    finally:
+        unregister(handle)
+
+
+@asynccontextmanager
+async def atrack(handle: Optional[str], db, sql: str):
+    """track() for an AsyncSession."""
+    if not handle:
+        yield
+        return
+    register(handle, await async_connection_id(db), sql)
+    try:
+        yield
+    finally:
+        unregister(handle)
+
+
+@contextmanager
+def follow(handle: Optional[str], leader: Optional[str]):
+    """Alias handle to the leader's execution while the block waits for its result (ref-counted)."""
+    if not handle or not leader or handle == leader:
+        yield
+        return
+    with _lock:
+        _followers[handle] = leader
+        _shares.setdefault(leader, {leader}).add(handle)
+    try:
+        yield
+    finally:
+        with _lock:
+            _followers.pop(handle, None)
+            waiting = _shares.get(leader)
+            if waiting is not None:
+                waiting.discard(handle)
+                if waiting <= {leader}:
+                    del _shares[leader]
+
+
+def detached(handle: Optional[str]) -> bool:
+    """True (once) if handle was cancelled while its shared execution kept running for other requests."""
+    if not handle:
+        return False
+    with _lock:
+        if handle in _detached:
+            _detached.discard(handle)
+            return True
+        return False
+
+
+def list_active() -> List[Dict[str, Any]]:
+    """Active queries, longest-running first."""
+    now = time.monotonic()
+    with _lock:
+        entries = [
+            {**{k: v for k, v in e.items() if not k.startswith("_")}, "elapsed_ms": round((now - e["_t0"]) * 1000)}
+            for e in _active.values()
+        ]
+    return sorted(entries, key=lambda e: -e["elapsed_ms"])
+
+
+def cancel(handle: str, kill_engine) -> int:
+    """
+    KILL QUERY for handle and any sub-queries registered as "<handle>.<n>" (batch items).
+    A handle sharing an execution with other requests (see follow) is detached from it instead; the
+    query is killed when the last handle waiting for it is cancelled.
+    Returns the number of queries signalled or detached.
+    """
+    with _lock:
+        leader = _followers.get(handle, handle)
+        waiting = _shares.get(leader)
+        if waiting is not None and handle in waiting:
+            waiting.discard(handle)
+            _detached.add(handle)
+            if waiting:
+                logger.info("Detached %s from shared query %s", handle, leader)
+                return 1
+            del _shares[leader]
+        targets = [e for h, e in _active.items() if h == leader or h.startswith(leader + ".")]
+    killed = 0
+    for entry in targets:
+        if entry["connection_id"] is None:
+            continue
+        try:
+            with kill_engine.connect() as conn:
+                conn.execute(text(f"KILL QUERY {int(entry['connection_id'])}"))
+            killed += 1
+            metrics.incr("queries_cancelled")
+            logger.info("Cancelled query %s (connection %s)", entry["handle"], entry["connection_id"])
+        except Exception:
+            logger.warning("KILL QUERY failed for %s", entry["handle"], exc_info=True)
+    return killed
+
+
+def is_cancel_error(e: Exception) -> bool:
+    orig = getattr(e, "orig", None)
+    return bool(orig is not None and getattr(orig, "args", None) and orig.args[0] == MYSQL_QUERY_INTERRUPTED_ERRNO)
@@ -1,21 +1,106 @@
 import json
 import logging
 import re
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 import pandas as pd
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import func, insert, select, text
 
 from app.models import SQLTemplate, TrendPlot, TrendParameter
+from app.cache import catalog_version, dropdown_cache, etag_for, result_cache, schema_cache, trend_cache
+from app import arrow_format, metrics, query_registry, singleflight
+from app.downsample import downsample_frame
+from app.export import check_format, write_export
+from app.sql_analysis import (
+    analyze_template,
+    compile_template,
+    is_single_select,
+    rename_placeholders,
+    strip_statement,
+    with_execution_time_hint,
+)
 
 logger = logging.getLogger(__name__)
 
 REQUIRED_COLUMNS = {"cycleno", "value", "series"}
+STREAM_CHUNK_ROWS = 1000  # rows fetched from the server-side cursor per batch
+BATCH_INDEX_COL = "__batch_idx"  # tag column added when a batch is folded into one UNION ALL
+MYSQL_QUERY_TIMEOUT_ERRNO = 3024  # ER_QUERY_TIMEOUT: maximum statement execution time exceeded
+# MySQL rejecting the folded UNION ALL itself (parse error, construct not allowed in a derived table /
+# union, duplicate or mismatched columns): worth retrying the items one by one
+UNION_REJECTED_ERRNOS = {1060, 1064, 1221, 1222, 1235, 1248, 1250}
+
+
+# List columns only (no sql_template TEXT), one whole row per template_id (its most recently updated)
+_catalog_rows = select(
+    SQLTemplate.template_id,
+    SQLTemplate.trend_id,
+    SQLTemplate.trend_name,
+    SQLTemplate.last_updated_on,
+    func.row_number()
+    .over(
+        partition_by=SQLTemplate.template_id,
+        order_by=(SQLTemplate.last_updated_on.desc(), SQLTemplate.trend_id),
+    )
+    .label("rn"),
+).subquery()
+CATALOG_QUERY = (
+    select(_catalog_rows.c.template_id, _catalog_rows.c.trend_id, _catalog_rows.c.trend_name, _catalog_rows.c.last_updated_on)
+    .where(_catalog_rows.c.rn == 1)
+    .order_by(_catalog_rows.c.template_id)
+)
+
+_catalog: Optional[Dict[str, Any]] = None  # {"version", "trends", "body", "etag", "loaded_at"}
+_catalog_lock = threading.Lock()
 
 
 def list_trends(db: Session) -> List[Dict[str, Any]]:
-    """List all SQL templates (trends) with basic info. Deduplicates by template_id (keeps first)."""
-    rows = db.query(SQLTemplate).order_by(SQLTemplate.template_id).all()
+    """List all SQL templates (trends) with basic info, from the in-memory catalog."""
+    return get_trend_catalog(db)["trends"]
+
+
+def get_trend_catalog(db: Session) -> Dict[str, Any]:
+    """
+    Trend list kept in memory until a write bumps catalog_version or CATALOG_TTL passes.
+    Returns {"version", "trends", "body" (serialized {"trends": ...}), "etag"}.
+    """
+    catalog = current_trend_catalog()
+    if catalog is not None:
+        return catalog
+    with _catalog_lock:
+        catalog = current_trend_catalog()
+        if catalog is None:
+            version = catalog_version.value
+            catalog = store_trend_catalog(version, db.execute(CATALOG_QUERY).all())
+    return catalog
+
+
+def current_trend_catalog() -> Optional[Dict[str, Any]]:
+    """The loaded catalog if no write happened since it was built (and it is within CATALOG_TTL), else None."""
+    catalog = _catalog
+    if catalog is None or catalog["version"] != catalog_version.value:
+        return None
+    if catalog_version.ttl and time.monotonic() - catalog["loaded_at"] >= catalog_version.ttl:
+        return None
+    return catalog
+
+
+def store_trend_catalog(version: int, rows) -> Dict[str, Any]:
+    """Build the catalog from CATALOG_QUERY rows loaded at version and make it current."""
+    global _catalog
+    trends = _trend_summaries(rows)
+    body = json.dumps({"trends": trends}).encode("utf-8")
+    _catalog = {"version": version, "trends": trends, "body": body, "etag": etag_for(body), "loaded_at": time.monotonic()}
+    return _catalog
+
+
+def _trend_summaries(rows) -> List[Dict[str, Any]]:
+    """Trend list entries from rows (template_id, trend_id, trend_name, last_updated_on) ordered by template_id, keeping the first per template_id."""
     seen = set()
     result = []
     for r in rows:
@@ -34,34 +119,89 @@ def list_trends(db: Session) -> List[Dict[str, Any]]:
 
 
 def get_trend_by_id(db: Session, template_id: str) -> Optional[Dict[str, Any]]:
-    """Get single trend template by ID."""
+    """Get single trend template by ID (served from trend_cache when warm)."""
+    key = f"id:{template_id}"
+    cached = trend_cache.get(key)
+    if cached is not None:
+        return cached
     t = db.query(SQLTemplate).filter(SQLTemplate.template_id == template_id).first()
     if not t:
         return None
-    return _template_to_dict(t, db)
+    trend = _template_to_dict(t, db)
+    trend_cache.put(key, trend)
+    return trend
 
 
 def get_trend_by_code(db: Session, trend_code: str) -> Optional[Dict[str, Any]]:
-    """Get trend template by trend_code."""
+    """Get trend template by trend_code (served from trend_cache when warm)."""
+    key = f"code:{trend_code}"
+    cached = trend_cache.get(key)
+    if cached is not None:
+        return cached
     t = db.query(SQLTemplate).filter(SQLTemplate.trend_id == trend_code).first()
     if not t:
         return None
-    return _template_to_dict(t, db)
+    trend = _template_to_dict(t, db)
+    trend_cache.put(key, trend)
+    return trend
+
+
+def get_trend_analysis(db: Session, template_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Analysis of a trend's SQL (placeholders, tables, output columns, statement shape), plus the
+    placeholders that have no stored parameter row. Served from the cached trend and analysis.
+    """
+    trend = get_trend_by_id(db, template_id)
+    if not trend:
+        return None
+    analysis = analyze_template(trend["sql_template"]).as_dict()
+    declared = {p["param_name"].lower() for p in trend["parameters"]}
+    analysis["template_id"] = template_id
+    analysis["undeclared_placeholders"] = [n for n in analysis["placeholders"] if n.lower() not in declared]
+    return analysis
+
+
+def invalidate_trend(template_id: Optional[str] = None) -> None:
+    """
+    Drop cached results for template_id and all cached trend details, and bump the catalog version.
+    Call after every template/plot/parameter write.
+    """
+    if template_id:
+        result_cache.invalidate_template(template_id)
+    trend_cache.invalidate()
+    catalog_version.bump()
+
+
+def _short_trend_id(trend_id: Optional[str]) -> Optional[str]:
+    """Normalized trend id used by older parameter rows (T001 -> T1), or None if not of that form."""
+    if trend_id and trend_id.startswith('T') and trend_id[1:].isdigit():
+        return f"T{int(trend_id[1:])}"
+    return None
 
 
 def _template_to_dict(t: SQLTemplate, db: Session) -> Dict[str, Any]:
     """Convert template + plot config + params to full dict."""
     # Fetch all plot configs (for dual axis)
     plots = db.query(TrendPlot).filter(TrendPlot.trend_id == t.trend_id).all()
-    
-    # Try fetching parameters with exact trend_id
-    params = db.query(TrendParameter).filter(TrendParameter.trendid == t.trend_id).all()
-    
-    # Fallback: if no params, try normalized ID (T001 -> T1)
-    if not params and t.trend_id and t.trend_id.startswith('T') and t.trend_id[1:].isdigit():
-        short_id = f"T{int(t.trend_id[1:])}"
-        params = db.query(TrendParameter).filter(TrendParameter.trendid == short_id).all()
+    # Exact trend_id and the normalized fallback (T001 -> T1) in one query
+    params = db.query(TrendParameter).filter(TrendParameter.trendid.in_(_param_trend_ids(t.trend_id))).all()
+    return _build_trend_dict(t, plots, _pick_params(params, t.trend_id))
+
+
+def _param_trend_ids(trend_id: str) -> List[str]:
+    """trendid values parameter rows may be stored under: the trend_id and its short form."""
+    short_id = _short_trend_id(trend_id)
+    return [trend_id, short_id] if short_id and short_id != trend_id else [trend_id]
+
 
+def _pick_params(params: List[TrendParameter], trend_id: str) -> List[TrendParameter]:
+    """Rows stored under the exact trend_id, or the short-id rows when there are none."""
+    exact = [p for p in params if p.trendid == trend_id]
+    return exact or [p for p in params if p.trendid != trend_id]
+
+
+def _build_trend_dict(t: SQLTemplate, plots: List[TrendPlot], params: List[TrendParameter]) -> Dict[str, Any]:
+    """Assemble the trend detail dict from already-loaded template, plot and parameter rows."""
     # Construct plot config
     plot_config = {}
     series_map = {}
@@ -123,42 +263,191 @@ def _template_to_dict(t: SQLTemplate, db: Session) -> Dict[str, Any]:
 def substitute_parameters(sql: str, params: Dict[str, Any]) -> str:
     """
     Substitute :param_name placeholders in SQL with values.
-    Uses safe string replacement for simple params.
-    """
-    result = sql
-    for key, val in params.items():
-        placeholder = f":{key}"
-        if placeholder in result:
-            if val is None:
-                s = "NULL"
-            elif isinstance(val, (int, float)):
-                s = str(val)
-            else:
-                s = str(val).replace("'", "''")
-                s = f"'{s}'"
-            result = result.replace(placeholder, s)
-    return result
+    Uses safe string replacement for simple params. Only whole placeholders outside
+    strings/comments are replaced (:blendid never touches :blendid2).
+    """
+    parts = []
+    last = 0
+    for start, end, key in analyze_template(sql).spans:
+        if key not in params:
+            continue
+        val = params[key]
+        if val is None:
+            s = "NULL"
+        elif isinstance(val, (int, float)):
+            s = str(val)
+        else:
+            s = str(val).replace("'", "''")
+            s = f"'{s}'"
+        parts.append(sql[last:start])
+        parts.append(s)
+        last = end
+    parts.append(sql[last:])
+    return "".join(parts)
+
+
+def build_statement(sql: str, params: Dict[str, Any], parameterized: bool = False):
+    """
+    Statement + bind values for a template. parameterized=False renders values into the SQL text (legacy);
+    parameterized=True uses the cached compiled statement with driver-bound values, so the
+    statement text is identical for every blendid. List values bind as IN (...).
+    """
+    if not parameterized:
+        # Values are already in the text: escape every colon left so text() binds nothing ('12:30', ':x')
+        return text(substitute_parameters(sql, params).replace(":", "\\:")), {}
+    expanding = frozenset(k for k, v in params.items() if isinstance(v, (list, tuple)))
+    stmt, names = compile_template(sql, expanding)
+    missing = [n for n in names if n not in params]
+    if missing:
+        raise ValueError("Missing value for parameter(s): " + ", ".join(f":{n}" for n in missing))
+    return stmt, {n: params[n] for n in names}
+
+
+def _timed_sql(db, sql: str, timeout_ms: Optional[int]) -> str:
+    """sql carrying the MAX_EXECUTION_TIME hint when timeout_ms is set and db is MySQL (else unchanged)."""
+    if timeout_ms and db.get_bind().dialect.name == "mysql":
+        return with_execution_time_hint(sql, timeout_ms)
+    return sql
+
+
+def _mysql_errno(e: Exception) -> Optional[int]:
+    orig = getattr(e, "orig", None)
+    args = getattr(orig, "args", None) if orig is not None else None
+    return args[0] if args and isinstance(args[0], int) else None
+
+
+def _is_timeout_error(e: Exception) -> bool:
+    return _mysql_errno(e) == MYSQL_QUERY_TIMEOUT_ERRNO
+
+
+def _run_statement(db: Session, sql: str, params: Dict[str, Any], parameterized: bool = False, **execution_options):
+    """Execute a template on a sync session (see build_statement)."""
+    stmt, bind = build_statement(sql, params, parameterized)
+    return db.execute(stmt, bind, execution_options=execution_options)
+
+
+def _column_to_list(col: pd.Series) -> List[Any]:
+    """Convert a column to native Python values with NaN/NaT -> None, without a per-cell loop."""
+    if not col.hasnans:
+        return col.tolist()
+    return col.astype(object).where(col.notna(), None).tolist()
+
+
+def _frame_to_payload(df: pd.DataFrame, fmt: str = "rows") -> Dict[str, Any]:
+    """
+    Serialize a result DataFrame.
+    fmt="rows": {"rows": [{col: val}], "columns": [...]} (default, used by the UI)
+    fmt="columnar": {"columns": [...], "data": {col: [...]}}
+    """
+    cols = list(df.columns)
+    values = [_column_to_list(df.iloc[:, i]) for i in range(len(cols))]
+    if fmt == "columnar":
+        return {"columns": cols, "data": dict(zip(cols, values)), "row_count": len(df), "error": None}
+    rows = [dict(zip(cols, row)) for row in zip(*values)]
+    return {"rows": rows, "columns": cols, "error": None}
 
 
-def execute_query(db: Session, sql: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+def resolve_plot_columns(db: Session, template_id: Optional[str]) -> Dict[str, Any]:
     """
-    Execute SQL and return results as list of dicts.
+    Columns to downsample by, from the first saved plot of the trend (bts_cfg_trend_plots).
+    Returns {"x_col", "series_col", "y_cols"}; missing values fall back to cycleno/series/value in execute_query.
+    """
+    plots = list_plots_for_trend(db, template_id) if template_id else []
+    return _plot_columns_from_config(plots[0]) if plots else {}
+
+
+def _plot_columns_from_config(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    y_cols = [y.get("col") if isinstance(y, dict) else y for y in cfg.get("y_cols") or []]
+    if not y_cols and cfg.get("y_col"):
+        y_cols = [cfg["y_col"]]
+    series_col = cfg.get("series_col") if cfg.get("series_mode", "single") == "single" else None
+    return {"x_col": cfg.get("x_col"), "series_col": series_col, "y_cols": [c for c in y_cols if c]}
+
+
+def _downsample(df: pd.DataFrame, plot_columns: Optional[Dict[str, Any]], max_points: int, algorithm: str):
+    """Apply downsample_frame using plot_columns (case-insensitive), defaulting to cycleno / series / numeric columns."""
+    plot_columns = plot_columns or {}
+    lookup = {str(c).lower(): c for c in df.columns}
+
+    def resolve(name):
+        return lookup.get(str(name).lower()) if name else None
+
+    x_col = resolve(plot_columns.get("x_col")) or resolve("cycleno")
+    series_col = resolve(plot_columns.get("series_col")) if plot_columns else resolve("series")
+    y_cols = [c for c in (resolve(y) for y in plot_columns.get("y_cols") or []) if c]
+    if not y_cols:
+        y_cols = [resolve("value")] if resolve("value") else [
+            c for c in df.select_dtypes("number").columns if c not in (x_col, series_col)
+        ]
+    return downsample_frame(df, x_col, y_cols, series_col, max_points=max_points, algorithm=algorithm)
+
+
+def execute_query(
+    db: Session,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    fmt: str = "rows",
+    max_points: Optional[int] = None,
+    downsample: str = "lttb",
+    plot_columns: Optional[Dict[str, Any]] = None,
+    parameterized: bool = False,
+    timeout_ms: Optional[int] = None,
+    query_handle: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Execute SQL and return results as list of dicts (or columns when fmt="columnar").
     Validates output has cycleno, value, series (or uses first 3 cols as fallback).
+    With max_points, each series is downsampled (LTTB / min-max) and the payload reports
+    "downsample": {"original_points", "returned_points", ...}.
+    With timeout_ms (MySQL only), the SELECT carries a MAX_EXECUTION_TIME optimizer hint; a timeout
+    returns an error payload with "timeout": True.
+    With query_handle, the query is listed in query_registry while it runs and can be cancelled
+    (KILL QUERY); a cancelled query returns an error payload with "cancelled": True.
     """
     params = params or {}
-    rendered = substitute_parameters(sql, params)
     try:
-        result = db.execute(text(rendered))
-        rows = result.fetchall()
+        with query_registry.track(query_handle, db, sql):
+            result = _run_statement(db, _timed_sql(db, sql, timeout_ms), params, parameterized)
+            rows = result.fetchall()
         columns = list(result.keys())
-        df = pd.DataFrame(rows, columns=columns)
     except Exception as e:
         logger.exception("Query execution failed")
-        return {"error": str(e), "rows": [], "columns": []}
+        return _error_payload(e, fmt, timeout_ms)
+    return _result_to_payload(columns, rows, fmt, max_points, downsample, plot_columns)
+
+
+def _error_payload(e: Exception, fmt: str, timeout_ms: Optional[int] = None) -> Dict[str, Any]:
+    payload = {"error": str(e), "rows": [], "columns": []}
+    if fmt == "columnar":
+        payload = {"error": str(e), "columns": [], "data": {}, "row_count": 0}
+    if _is_timeout_error(e):
+        metrics.incr("queries_timed_out")
+        payload["error"] = f"Query exceeded the {timeout_ms} ms execution time limit and was stopped by MySQL"
+        payload["timeout"] = True
+    elif query_registry.is_cancel_error(e):
+        payload["error"] = "Query was cancelled"
+        payload["cancelled"] = True
+    return payload
+
 
-    if df.empty:
-        return {"rows": [], "columns": list(df.columns), "error": None}
+def _result_to_payload(
+    columns: List[str],
+    rows: List[Any],
+    fmt: str = "rows",
+    max_points: Optional[int] = None,
+    downsample: str = "lttb",
+    plot_columns: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Sort by cycleno, optionally downsample, and serialize fetched rows (shared by the sync and async paths).
+    fmt="arrow" returns {"arrow": <IPC stream bytes>, "error": None} instead of a JSON-ready dict.
+    """
+    cycleno_col = next((c for c in columns if str(c).lower() == "cycleno"), None)
+    if fmt == "arrow" and not (max_points and len(rows) > max_points):
+        # No DataFrame: driver rows go column-wise into Arrow, sorted there
+        return {"arrow": arrow_format.encode_rows(columns, rows, cycleno_col, batch_rows=STREAM_CHUNK_ROWS), "error": None}
 
+    df = pd.DataFrame(rows, columns=columns)
     cols = list(df.columns)
     # Flexible: allow any columns for multi-plot canvas; no strict cycleno/value/series requirement
     missing = REQUIRED_COLUMNS - set(c.lower() for c in cols)
@@ -167,51 +456,472 @@ def execute_query(db: Session, sql: str, params: Optional[Dict[str, Any]] = None
         pass
 
     # Sort by cycleno if present
-    if "cycleno" in [c.lower() for c in cols]:
-        cycleno_col = next(c for c in cols if c.lower() == "cycleno")
+    if not df.empty and cycleno_col is not None:
         df = df.sort_values(cycleno_col)
 
-    rows = df.to_dict(orient="records")
-    for r in rows:
-        for k, v in list(r.items()):
-            if pd.isna(v):
-                r[k] = None
-            elif hasattr(v, "item"):
-                r[k] = v.item() if hasattr(v, "item") else float(v)
+    stats = None
+    if max_points and len(df) > max_points:
+        df, stats = _downsample(df, plot_columns, max_points, downsample)
+        stats.update({"algorithm": downsample, "max_points": max_points})
 
-    return {"rows": rows, "columns": cols, "error": None}
+    if fmt == "arrow":
+        values = [_column_to_list(df.iloc[:, i]) for i in range(len(cols))]
+        body = arrow_format.encode_columns(cols, values, metadata={"downsample": stats}, batch_rows=STREAM_CHUNK_ROWS)
+        return {"arrow": body, "error": None}
+    payload = _frame_to_payload(df, fmt)
+    if stats:
+        payload["downsample"] = stats
+    return payload
 
 
-def _sync_parameters(db: Session, trend_id: str, sql: str):
-    """Extract placeholders like :ParamName and sync with bts_Trend_Parameters."""
-    # Find all :Word placeholders
-    placeholders = re.findall(r":([a-zA-Z0-9_]+)", sql)
-    # Remove duplicates
-    unique_params = sorted(list(set(placeholders)))
-    
-    # Get existing params for this trend
-    existing = db.query(TrendParameter).filter(TrendParameter.trendid == trend_id).all()
-    existing_names = {p.parameter.lower() for p in existing}
-    
-    # Add missing ones
-    for name in unique_params:
-        if name.lower() not in existing_names:
-            logger.info(f"Adding auto-extracted parameter '{name}' for trend '{trend_id}'")
-            new_p = TrendParameter(
-                trendid=trend_id,
-                parameter=name,
-                type="string", # Default
-                required="Y",  # Default if in SQL
-                multi="N",
-                default=None
+def _result_cache_key(sql, params, fmt, template_id, max_points, downsample) -> str:
+    return result_cache.make_key(
+        substitute_parameters(sql, params), params, fmt, max_points, downsample, template_id if max_points else None
+    )
+
+
+def execute_query_cached(
+    db: Session,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    fmt: str = "rows",
+    template_id: Optional[str] = None,
+    use_cache: bool = True,
+    max_points: Optional[int] = None,
+    downsample: str = "lttb",
+    parameterized: bool = False,
+    timeout_ms: Optional[int] = None,
+    query_handle: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    execute_query behind the result cache. Successful results are cached as response bytes (JSON, or
+    Arrow IPC for fmt="arrow"). Unless use_cache is off, identical concurrent requests (same rendered SQL
+    and output options, sync or async path) share one execution and its bytes (app.singleflight);
+    those report cache "coalesced". Each keeps its own query_handle: cancelling one detaches it, and
+    the shared query is killed only when every request waiting for it was cancelled.
+    Returns {"body": bytes, "cache": "hit" | "miss" | "bypass" | "coalesced", "error": None}
+    or {"error": msg, "timeout": bool, "cancelled": bool}.
+    """
+    params = params or {}
+    key = _result_cache_key(sql, params, fmt, template_id, max_points, downsample) if use_cache else None
+    if not use_cache or not result_cache.enabled:
+        result_cache.record_bypass()
+        cache_state = "bypass"
+    else:
+        body = result_cache.get(key)
+        if body is not None:
+            return {"body": body, "cache": "hit", "error": None}
+        cache_state = "miss"
+
+    def run() -> Dict[str, Any]:
+        plot_columns = resolve_plot_columns(db, template_id) if max_points else None
+        result = execute_query(
+            db,
+            sql,
+            params,
+            fmt=fmt,
+            max_points=max_points,
+            downsample=downsample,
+            plot_columns=plot_columns,
+            parameterized=parameterized,
+            timeout_ms=timeout_ms,
+            query_handle=query_handle,
+        )
+        return _cached_body(result, key, cache_state, template_id)
+
+    if key is None:
+        return run()
+    flight, shared = singleflight.do(key, run, query_handle)
+    return _coalesced(flight, shared, run, query_handle)
+
+
+def _cached_body(result: Dict[str, Any], key: Optional[str], cache_state: str, template_id: Optional[str]) -> Dict[str, Any]:
+    """execute_query_cached's return value for an execute_query result; stores the bytes under key."""
+    if result.get("error"):
+        return {"error": result["error"], "timeout": result.get("timeout", False), "cancelled": result.get("cancelled", False)}
+    body = result_body(result)
+    if key:
+        result_cache.put(key, body, template_id)
+    return {"body": body, "cache": cache_state, "error": None}
+
+
+def _coalesced(flight: Dict[str, Any], shared: bool, run: Callable[[], Any], query_handle: Optional[str] = None) -> Any:
+    """
+    A caller's view of a shared execution. A caller whose handle was cancelled while the query kept
+    running for others gets a cancelled error. If the leader's query was killed, a follower returns
+    run() instead (its own execution; a coroutine on the async path).
+    """
+    if query_registry.detached(query_handle):
+        return {"error": "Query was cancelled", "timeout": False, "cancelled": True}
+    if not shared:
+        return flight
+    if flight.get("cancelled"):
+        return run()
+    if flight.get("error"):
+        return flight
+    return {**flight, "cache": "coalesced"}
+
+
+def result_body(result: Dict[str, Any]) -> bytes:
+    """Response bytes for a successful execute_query result (Arrow IPC stream or JSON)."""
+    if "arrow" in result:
+        return result["arrow"]
+    return json.dumps(result, default=_json_default).encode("utf-8")
+
+
+SINCE_PARAM = "_since_cycle"  # bind name of the pushed-down cycleno floor
+
+
+def incremental_sql(sql: str, since: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Wrap a single-SELECT template so only cycles after the lowest last-seen cycle come back:
+    SELECT * FROM (<template>) AS _since WHERE cycleno > :_since_cycle. MySQL pushes the condition
+    into the derived table. since maps series value -> last cycleno the client has (key "" when the
+    result has no series). Returns (sql, extra params); the template must have a cycleno output column.
+    """
+    analysis = analyze_template(sql)
+    if not analysis.single_select:
+        raise ValueError("Incremental fetch needs a single SELECT statement")
+    cycle_col = next((c for c in analysis.columns if c.lower() == "cycleno"), None)
+    if cycle_col is None and not any(c == "*" or c.endswith(".*") for c in analysis.columns):
+        raise ValueError("Incremental fetch needs a cycleno column in the result")
+    cycle_col = cycle_col or "cycleno"
+    floor = min(since.values())
+    wrapped = f"SELECT * FROM (\n{strip_statement(sql)}\n) AS _since WHERE `{cycle_col}` > :{SINCE_PARAM}"
+    return wrapped, {SINCE_PARAM: floor}
+
+
+def slice_incremental(payload: Dict[str, Any], since: Dict[str, Any], series_col: Optional[str]) -> Dict[str, Any]:
+    """
+    Drop rows at or below each series' own last cycle (the SQL floor is the lowest one) and report
+    "incremental": {"series_col", "rows", "last_cycle": {series: max cycleno returned}}.
+    Series the client has not seen yet come back whole above the floor.
+    """
+    columns = payload.get("columns") or []
+    lookup = {str(c).lower(): c for c in columns}
+    cycle_col = lookup.get("cycleno")
+    series_col = lookup.get(str(series_col).lower()) if series_col else lookup.get("series")
+    if payload.get("data") is not None:  # columnar
+        data = payload["data"]
+        n = payload.get("row_count", 0)
+        rows = [{c: data[c][i] for c in columns} for i in range(n)]
+    else:
+        rows = payload.get("rows") or []
+
+    def key(row):
+        return str(row[series_col]) if series_col else ""
+
+    floor = min(since.values())
+    kept = [r for r in rows if cycle_col and r[cycle_col] is not None and r[cycle_col] > since.get(key(r), floor)]
+    last: Dict[str, Any] = {}
+    for r in kept:
+        last[key(r)] = max(last.get(key(r), r[cycle_col]), r[cycle_col])
+    if payload.get("data") is not None:
+        payload["data"] = {c: [r[c] for r in kept] for c in columns}
+        payload["row_count"] = len(kept)
+    else:
+        payload["rows"] = kept
+    payload["incremental"] = {"series_col": series_col, "rows": len(kept), "last_cycle": last}
+    return payload
+
+
+def execute_incremental(
+    db: Session,
+    sql: str,
+    params: Optional[Dict[str, Any]],
+    since: Dict[str, Any],
+    series_col: Optional[str] = None,
+    fmt: str = "rows",
+    template_id: Optional[str] = None,
+    parameterized: bool = False,
+    timeout_ms: Optional[int] = None,
+    query_handle: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Only the rows newer than the client's last cycle per series (see incremental_sql / slice_incremental),
+    as JSON bytes in the execute_query_cached shape. Not cached and not downsampled: the result is the
+    tail the client appends to what it already has. series_col defaults to the trend's first plot, then "series".
+    """
+    wrapped, extra = incremental_sql(sql, since)
+    series_col = series_col or resolve_plot_columns(db, template_id).get("series_col")
+    result_cache.record_bypass()
+    result = execute_query(
+        db, wrapped, {**(params or {}), **extra}, fmt=fmt, parameterized=parameterized,
+        timeout_ms=timeout_ms, query_handle=query_handle,
+    )
+    return incremental_body(result, since, series_col)
+
+
+def incremental_body(result: Dict[str, Any], since: Dict[str, Any], series_col: Optional[str]) -> Dict[str, Any]:
+    if result.get("error"):
+        return {"error": result["error"], "timeout": result.get("timeout", False), "cancelled": result.get("cancelled", False)}
+    return {"body": result_body(slice_incremental(result, since, series_col)), "cache": "bypass", "error": None}
+
+
+def batch_key(params: Dict[str, Any]) -> str:
+    """Stable label for a parameter set, e.g. 'blendid=20200617-005&tankno=TK-3052'."""
+    return "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+
+def execute_batch(
+    session_factory: Callable[[], Session],
+    sql: str,
+    items: List[Dict[str, Any]],
+    fmt: str = "rows",
+    parameterized: bool = True,
+    mode: str = "parallel",
+    max_workers: int = 4,
+    timeout_ms: Optional[int] = None,
+    query_handle: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Run one template for many parameter sets. items: [{"key": optional label, "params": {...}}].
+    mode="parallel": each set on its own session, at most max_workers at once (bounded by the pool).
+    mode="union": fold all sets into one UNION ALL round-trip; falls back to parallel only if MySQL rejects
+    the folded SQL. Any other failure (cancel, timeout, ...) is returned as every item's error.
+    Returns {"results": {key: payload + elapsed_ms}, "mode": mode used, "elapsed_ms": total}.
+    Items are registered as "<query_handle>.<n>" (union: query_handle), so cancelling query_handle stops them all.
+    """
+    started = time.perf_counter()
+    keyed = [(item.get("key") or batch_key(item.get("params") or {}), item.get("params") or {}) for item in items]
+    response = {"mode": mode}
+    results = None
+    if mode == "union":
+        if not is_single_select(sql):
+            response["fallback_reason"] = "Template is not a single SELECT statement"
+        else:
+            db = session_factory()
+            try:
+                with query_registry.track(query_handle, db, sql):
+                    results = _execute_batch_union(db, sql, keyed, fmt, parameterized, timeout_ms)
+            except Exception as e:
+                if _mysql_errno(e) not in UNION_REJECTED_ERRNOS:
+                    logger.exception("Batch UNION ALL failed")
+                    payload = _error_payload(e, fmt, timeout_ms)
+                    elapsed = round((time.perf_counter() - started) * 1000, 1)
+                    results = {key: {"params": params, **payload, "elapsed_ms": elapsed} for key, params in keyed}
+                else:
+                    logger.warning("Batch UNION ALL rejected, running in parallel instead: %s", e)
+                    response["fallback_reason"] = str(e)
+            finally:
+                db.close()
+        if results is None:
+            response["mode"] = "parallel"
+    if results is None:
+        results = _execute_batch_parallel(session_factory, sql, keyed, fmt, parameterized, max_workers, timeout_ms, query_handle)
+    response["results"] = results
+    response["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return response
+
+
+def _execute_batch_parallel(
+    session_factory, sql, keyed, fmt, parameterized, max_workers, timeout_ms=None, query_handle=None
+) -> Dict[str, Any]:
+    def run(indexed):
+        i, params = indexed
+        t0 = time.perf_counter()
+        db = session_factory()
+        try:
+            payload = execute_query(
+                db,
+                sql,
+                params,
+                fmt=fmt,
+                parameterized=parameterized,
+                timeout_ms=timeout_ms,
+                query_handle=f"{query_handle}.{i}" if query_handle else None,
             )
-            db.add(new_p)
-            # Add to set so we don't add twice in same loop if re-scan somehow finds it
-            existing_names.add(name.lower())
-    
-    # Optional: Delete ones that are NO LONGER in the SQL?
-    # For now, let's just keep them to be safe, or only add.
-    # User might have manually added some that aren't in SQL yet.
+        finally:
+            db.close()
+        payload["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        return payload
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(keyed)))) as pool:
+        payloads = list(pool.map(run, enumerate(params for _, params in keyed)))
+    return {key: {"params": params, **payload} for (key, params), payload in zip(keyed, payloads)}
+
+
+def _execute_batch_union(db: Session, sql: str, keyed, fmt: str, parameterized: bool, timeout_ms: Optional[int] = None) -> Dict[str, Any]:
+    """One statement: SELECT i AS __batch_idx, b.* FROM (<template with set i>) b UNION ALL ..., split by index."""
+    body = strip_statement(sql)
+    parts, bound = [], {}
+    for i, (_, params) in enumerate(keyed):
+        suffix = f"_b{i}"
+        parts.append(f"SELECT {i} AS {BATCH_INDEX_COL}, _b{i}.* FROM (\n{rename_placeholders(body, suffix)}\n) AS _b{i}")
+        bound.update({f"{k}{suffix}": v for k, v in params.items()})
+    t0 = time.perf_counter()
+    result = _run_statement(db, _timed_sql(db, "\nUNION ALL\n".join(parts), timeout_ms), bound, parameterized)
+    df = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+    elapsed = round((time.perf_counter() - t0) * 1000, 1)
+
+    groups = df.groupby(BATCH_INDEX_COL, sort=False).indices
+    data = df.drop(columns=[BATCH_INDEX_COL])
+    cycleno_col = next((c for c in data.columns if str(c).lower() == "cycleno"), None)
+    out = {}
+    for i, (key, params) in enumerate(keyed):
+        part = data.iloc[groups[i]] if i in groups else data.iloc[0:0]
+        if cycleno_col is not None and not part.empty:
+            part = part.sort_values(cycleno_col)
+        out[key] = {"params": params, **_frame_to_payload(part, fmt), "elapsed_ms": elapsed}
+    return out
+
+
+def _json_default(v: Any) -> Any:
+    """json.dumps fallback for DB driver types (Decimal, datetime, bytes)."""
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, (bytes, bytearray)):
+        return v.decode("utf-8", errors="replace")
+    return str(v)
+
+
+def stream_query(
+    db: Session,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = STREAM_CHUNK_ROWS,
+    parameterized: bool = False,
+    query_handle: Optional[str] = None,
+) -> Iterator[Any]:
+    """
+    Execute SQL on an unbuffered server-side cursor (pymysql SSCursor via stream_results).
+    First yields the column list, then batches of at most chunk_size row tuples as MySQL sends them.
+    Rows are NOT re-sorted (that would need the full result) - put ORDER BY in the SQL.
+    """
+    with query_registry.track(query_handle, db, sql):
+        result = _run_statement(db, sql, params or {}, parameterized, stream_results=True, yield_per=chunk_size)
+        try:
+            yield list(result.keys())
+            for batch in result.partitions(chunk_size):
+                yield batch
+        finally:
+            result.close()
+
+
+def stream_query_ndjson(
+    db: Session,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = STREAM_CHUNK_ROWS,
+    parameterized: bool = False,
+    query_handle: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Stream query results as NDJSON: {"columns": [...]}, then one JSON array per row,
+    then {"done": true, "row_count": n}. Errors after the first line are reported as {"error": "..."}.
+    Errors before the first line (bad SQL, connection) are raised to the caller.
+    """
+    batches = stream_query(db, sql, params, chunk_size, parameterized, query_handle)
+    columns = next(batches)
+    yield json.dumps({"columns": columns}) + "\n"
+    count = 0
+    try:
+        for batch in batches:
+            count += len(batch)
+            yield "".join(json.dumps(list(r), default=_json_default) + "\n" for r in batch)
+    except Exception as e:
+        logger.exception("Streaming query failed after %d rows", count)
+        yield json.dumps({"error": str(e), "row_count": count}) + "\n"
+        return
+    finally:
+        batches.close()
+    yield json.dumps({"done": True, "row_count": count}) + "\n"
+
+
+def export_query(
+    db: Session,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    fmt: str = "csv",
+    parameterized: bool = False,
+    query_handle: Optional[str] = None,
+) -> Iterator[bytes]:
+    """
+    Run sql on the server-side cursor and return an iterator of the result encoded as fmt (csv, parquet, xlsx).
+    The query starts here, so SQL/connection errors and an unknown or unavailable format raise before
+    any bytes are produced. Only one cursor batch is held in memory at a time.
+    """
+    check_format(fmt)
+    batches = stream_query(db, sql, params, STREAM_CHUNK_ROWS, parameterized, query_handle)
+    columns = next(batches)
+    metrics.incr("exports")
+
+    def body():
+        count = 0
+
+        def counted():
+            nonlocal count
+            for batch in batches:
+                count += len(batch)
+                yield batch
+
+        try:
+            yield from write_export(fmt, columns, counted())
+            logger.info("Exported %d rows as %s", count, fmt)
+        except Exception:
+            logger.exception("Export failed after %d rows", count)
+            raise
+        finally:
+            batches.close()
+
+    return body()
+
+
+def _sync_parameters(
+    db: Session,
+    trend_id: str,
+    sql: str,
+    declared: Optional[List[Dict[str, Any]]] = None,
+    prune: bool = False,
+) -> None:
+    """
+    Bring bts_Trend_Parameters for trend_id in line with the template as one set-based diff:
+    one read of the existing rows, one bulk INSERT (ON DUPLICATE KEY UPDATE on MySQL) for declared
+    parameters and :placeholders not stored yet (matched case-insensitively), and with prune one bulk
+    DELETE of parameters the SQL no longer uses (blendid and declared ones are kept).
+    """
+    existing = db.query(TrendParameter.id, TrendParameter.parameter).filter(TrendParameter.trendid == trend_id).all()
+    existing_names = {name.lower() for _, name in existing}
+
+    wanted: Dict[str, Dict[str, Any]] = {}
+    for p in declared or []:
+        name = (p.get("parameter") or "").strip()
+        if name and name.lower() not in wanted:
+            wanted[name.lower()] = {
+                "parameter": name,
+                "type": p.get("type") or "string",
+                "required": p.get("required", "Y"),
+                "multi": p.get("multi", "N"),
+                "default": p.get("default"),
+            }
+    for name in analyze_template(sql).placeholders:
+        wanted.setdefault(name.lower(), {"parameter": name, "type": "string", "required": "Y", "multi": "N", "default": None})
+
+    new_rows = [{"trendid": trend_id, **p} for key, p in wanted.items() if key not in existing_names]
+    if new_rows:
+        logger.info("Adding parameters %s for trend '%s'", [r["parameter"] for r in new_rows], trend_id)
+        db.execute(_upsert_parameters_stmt(db), new_rows)
+
+    if prune:
+        keep = set(wanted) | {"blendid"}
+        stale = [pid for pid, name in existing if name.lower() not in keep]
+        if stale:
+            logger.info("Removing %d parameter(s) no longer in the SQL for trend '%s'", len(stale), trend_id)
+            db.query(TrendParameter).filter(TrendParameter.id.in_(stale)).delete(synchronize_session=False)
+    trend_cache.invalidate()
+
+
+def _upsert_parameters_stmt(db: Session):
+    """Bulk INSERT for bts_Trend_Parameters; on MySQL a concurrent duplicate (trendid, parameter) is a no-op update."""
+    if db.get_bind().dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(TrendParameter)
+        return stmt.on_duplicate_key_update(parameter=stmt.inserted.parameter)
+    return insert(TrendParameter)
+
 
 def create_template(
     db: Session,
@@ -235,46 +945,29 @@ def create_template(
         refid=refid,
     )
     db.add(t)
-    # Add BlendID as default (non-removable) + user-provided parameters
-    blendid_exists = False
+    # BlendID first as default (non-removable), then user-provided parameters, then any :param from the SQL
+    declared = [{"parameter": "blendid", "type": "string", "required": "Y", "default": None}]
     for p in parameters or []:
         pdict = p if isinstance(p, dict) else (p.model_dump() if hasattr(p, "model_dump") else dict(p))
-        param_name = (pdict.get("parameter") or "").strip()
-        if not param_name:
-            continue
-        if param_name.lower() == "blendid":
-            blendid_exists = True
-        _add_trend_parameter(db, trend_code, param_name, pdict)
-    if not blendid_exists:
-        _add_trend_parameter(db, trend_code, "blendid", {"type": "string", "required": "Y", "default": None})
-    # Sync any :param from SQL not already in params
-    _sync_parameters(db, trend_code, sql_template)
+        if (pdict.get("parameter") or "").strip().lower() == "blendid":
+            declared[0] = pdict
+        else:
+            declared.append(pdict)
+    _sync_parameters(db, trend_code, sql_template, declared)
     db.commit()
+    invalidate_trend(tid)
     db.refresh(t)
     return _template_to_dict(t, db)
 
 
-def _add_trend_parameter(db: Session, trend_id: str, param_name: str, p: Dict[str, Any]) -> None:
-    """Add or ensure a trend parameter exists."""
-    existing = db.query(TrendParameter).filter(
-        TrendParameter.trendid == trend_id,
-        TrendParameter.parameter == param_name,
-    ).first()
-    if existing:
-        return
-    new_p = TrendParameter(
-        trendid=trend_id,
-        parameter=param_name,
-        type=p.get("type") or "string",
-        required=p.get("required", "Y"),
-        multi=p.get("multi", "N"),
-        default=p.get("default"),
-    )
-    db.add(new_p)
-
-
-def update_template(db: Session, template_id: str, sql_template: str, trend_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
-    """Update existing SQL template."""
+def update_template(
+    db: Session,
+    template_id: str,
+    sql_template: str,
+    trend_name: Optional[str] = None,
+    prune_parameters: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """Update existing SQL template. prune_parameters drops stored parameters the new SQL no longer uses."""
     t = db.query(SQLTemplate).filter(SQLTemplate.template_id == template_id).first()
     if not t:
         return None
@@ -282,53 +975,135 @@ def update_template(db: Session, template_id: str, sql_template: str, trend_name
     if trend_name is not None:
         t.trend_name = trend_name
     
-    _sync_parameters(db, t.trend_id, sql_template)
+    _sync_parameters(db, t.trend_id, sql_template, prune=prune_parameters)
     
     db.commit()
+    invalidate_trend(template_id)
     db.refresh(t)
     return _template_to_dict(t, db)
 
 
-_trend_params_cache: Optional[tuple] = None  # (timestamp, list)
+DROPDOWN_COLUMNS = ("quality", "streams", "tank_no", "ai_mixing_model", "trend_parms")
+_dropdown_lock = threading.Lock()
+
+
+def warm_caches(db: Session) -> Dict[str, float]:
+    """Load the trend catalog, dropdown domains and schema into the caches. Returns seconds spent per step."""
+    timings = {}
+    for name, load in (("trends", get_trend_catalog), ("dropdowns", get_dropdown_options), ("schema", get_schema_cached)):
+        t0 = time.perf_counter()
+        try:
+            load(db)
+        except Exception as e:
+            logger.warning("Warm-up of %s failed: %s", name, e)
+            db.rollback()
+        timings[name] = round(time.perf_counter() - t0, 3)
+    return timings
 
 
 def get_trend_params_list(db: Session) -> List[str]:
+    """Fetch allowed trend parameter names from bts_DropDownList.trend_parms (shared dropdown cache)."""
+    return get_dropdown_options(db)["domains"]["trend_parms"]
+
+
+def get_dropdown_options(db: Session, refresh: bool = False) -> Dict[str, Any]:
     """
-    Fetch allowed trend parameter names from bts_DropDownList.trend_parms.
-    Results cached for 5 minutes.
+    Distinct values of every DROPDOWN_COLUMNS domain, cached for DROPDOWN_CACHE_TTL.
+    Only one request loads at a time; others wait and reuse its result.
+    Returns {"domains": {column: [values]}, "body", "etag"}.
     """
-    import time
-    global _trend_params_cache
-    now = time.time()
-    if _trend_params_cache and (now - _trend_params_cache[0]) < 300:
-        return _trend_params_cache[1]
+    if not refresh:
+        cached = dropdown_cache.get("domains")
+        if cached is not None:
+            return cached
+    with _dropdown_lock:
+        cached = None if refresh else dropdown_cache.get("domains")
+        if cached is not None:
+            return cached
+        domains = _load_dropdown_domains(db)
+        body = json.dumps(domains).encode("utf-8")
+        entry = {"domains": domains, "body": body, "etag": etag_for(body)}
+        dropdown_cache.put("domains", entry)
+        return entry
+
 
+def _load_dropdown_domains(db: Session) -> Dict[str, List[str]]:
+    """One scan of bts_DropDownList; falls back to per-column DISTINCT if a column is missing."""
+    cols = ", ".join(f"`{c}`" for c in DROPDOWN_COLUMNS)
     try:
-        result = db.execute(
-            text("SELECT DISTINCT trend_parms FROM bts_DropDownList WHERE trend_parms IS NOT NULL AND trend_parms != '' ORDER BY trend_parms")
-        ).fetchall()
-        params = [str(r[0]).strip() for r in result if r[0]]
-        _trend_params_cache = (now, params)
-        return params
+        rows = db.execute(text(f"SELECT {cols} FROM bts_DropDownList")).fetchall()
     except Exception as e:
-        logger.warning("Could not fetch trend_parms from bts_DropDownList: %s", e)
-        _trend_params_cache = (now, [])
-        return []
+        logger.warning("Single-scan dropdown load failed, querying columns one by one: %s", e)
+        db.rollback()
+        return {c: _distinct_dropdown_values(db, c) for c in DROPDOWN_COLUMNS}
+    values = {c: set() for c in DROPDOWN_COLUMNS}
+    for row in rows:
+        for col, v in zip(DROPDOWN_COLUMNS, row):
+            if v is not None and str(v).strip():
+                values[col].add(str(v).strip())
+    return {c: sorted(v) for c, v in values.items()}
 
 
-def get_schema(db: Session) -> Dict[str, List[str]]:
-    """Get table names and columns for query builder autocomplete."""
-    result = {}
+def _distinct_dropdown_values(db: Session, col: str) -> List[str]:
     try:
-        rows = db.execute(text("SHOW TABLES")).fetchall()
-        tables = [list(r)[0] for r in rows]
-        for table in tables:
-            cols = db.execute(text(f"SHOW COLUMNS FROM `{table}`")).fetchall()
-            result[table] = [c[0] for c in cols]
+        rows = db.execute(
+            text(f"SELECT DISTINCT `{col}` FROM bts_DropDownList WHERE `{col}` IS NOT NULL AND `{col}` != '' ORDER BY `{col}`")
+        ).fetchall()
+        return [str(r[0]).strip() for r in rows if r[0] and str(r[0]).strip()]
     except Exception as e:
-        logger.exception("Schema fetch failed")
-        return {"error": str(e)}
-    return result
+        logger.warning("Could not fetch %s from bts_DropDownList: %s", col, e)
+        db.rollback()
+        return []
+
+
+# One round trip for every table: columns with type/key info and the indexes each column belongs to
+SCHEMA_SQL = text("""
+SELECT c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE, c.IS_NULLABLE, c.COLUMN_KEY, c.COLUMN_DEFAULT, c.EXTRA,
+       GROUP_CONCAT(DISTINCT s.INDEX_NAME ORDER BY s.INDEX_NAME SEPARATOR ',') AS index_names
+FROM information_schema.COLUMNS c
+LEFT JOIN information_schema.STATISTICS s
+  ON s.TABLE_SCHEMA = c.TABLE_SCHEMA AND s.TABLE_NAME = c.TABLE_NAME AND s.COLUMN_NAME = c.COLUMN_NAME
+WHERE c.TABLE_SCHEMA = DATABASE()
+GROUP BY c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE, c.IS_NULLABLE, c.COLUMN_KEY, c.COLUMN_DEFAULT, c.EXTRA,
+         c.ORDINAL_POSITION
+ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+""")
+
+
+def get_schema(db: Session) -> Dict[str, Any]:
+    """
+    Get tables, columns, types, keys and indexes for the query builder in a single information_schema query.
+    Returns {"tables": {table: [column names]}, "details": {table: {"columns": [...], "indexes": {name: [cols]}}}}.
+    """
+    tables: Dict[str, List[str]] = {}
+    details: Dict[str, Dict[str, Any]] = {}
+    for table, name, col_type, nullable, key, default, extra, index_names in db.execute(SCHEMA_SQL).fetchall():
+        tables.setdefault(table, []).append(name)
+        info = details.setdefault(table, {"columns": [], "indexes": {}})
+        info["columns"].append({
+            "name": name,
+            "type": col_type,
+            "nullable": nullable == "YES",
+            "key": key or None,
+            "default": default,
+            "extra": extra or None,
+        })
+        for index in (index_names or "").split(","):
+            if index:
+                info["indexes"].setdefault(index, []).append(name)
+    return {"tables": tables, "details": details}
+
+
+def get_schema_cached(db: Session, refresh: bool = False) -> Dict[str, Any]:
+    """Serialized get_schema() with its ETag, cached for SCHEMA_CACHE_TTL. Returns {"body", "etag", "cache"}."""
+    if not refresh:
+        cached = schema_cache.get("schema")
+        if cached is not None:
+            return {**cached, "cache": "hit"}
+    body = json.dumps(get_schema(db), default=_json_default).encode("utf-8")
+    entry = {"body": body, "etag": etag_for(body)}
+    schema_cache.put("schema", entry)
+    return {**entry, "cache": "refresh" if refresh else "miss"}
 
 def delete_template(db: Session, template_id: str) -> bool:
     """Delete SQL template and associated data. Removes all rows with this template_id."""
@@ -342,6 +1117,7 @@ def delete_template(db: Session, template_id: str) -> bool:
     # Delete all template rows (handles duplicates)
     db.query(SQLTemplate).filter(SQLTemplate.template_id == template_id).delete()
     db.commit()
+    invalidate_trend(template_id)
     return True
 
 
@@ -353,6 +1129,10 @@ def list_plots_for_trend(db: Session, template_id: str) -> List[Dict[str, Any]]:
     if not t:
         return []
     plots = db.query(TrendPlot).filter(TrendPlot.trend_id == t.trend_id).order_by(TrendPlot.plot_order, TrendPlot.id).all()
+    return _plot_list(plots)
+
+
+def _plot_list(plots: List[TrendPlot]) -> List[Dict[str, Any]]:
     result = []
     for p in plots:
         cfg = _plot_to_dict(p)
@@ -386,6 +1166,18 @@ def _plot_to_dict(p: TrendPlot) -> Dict[str, Any]:
     }
 
 
+def _apply_plot_config(p: TrendPlot, config: Dict[str, Any]) -> None:
+    """Store config as config_json and mirror the legacy columns."""
+    config_copy = {k: v for k, v in config.items() if k != "id"}
+    p.config_json = json.dumps(config_copy)
+    p.title = config.get("title")
+    p.plot_type = config.get("type", "line")
+    p.x_col = config.get("x_col")
+    p.y_col = config.get("y_col") or (config.get("y_cols", [{}])[0].get("col") if config.get("y_cols") else None)
+    p.x_label = config.get("x_label")
+    p.y_label = config.get("y_label")
+
+
 def create_plot(db: Session, template_id: str, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Save a new plot config for a trend."""
     t = db.query(SQLTemplate).filter(SQLTemplate.template_id == template_id).first()
@@ -394,24 +1186,49 @@ def create_plot(db: Session, template_id: str, config: Dict[str, Any]) -> Option
     max_row = db.query(TrendPlot).filter(TrendPlot.trend_id == t.trend_id).order_by(TrendPlot.plot_order.desc()).first()
     next_order = (max_row.plot_order + 1) if max_row and max_row.plot_order is not None else 0
 
-    config_copy = {k: v for k, v in config.items() if k != "id"}
-    p = TrendPlot(
-        trend_id=t.trend_id,
-        config_json=json.dumps(config_copy),
-        plot_order=next_order,
-        title=config.get("title"),
-        plot_type=config.get("type", "line"),
-        x_col=config.get("x_col"),
-        y_col=config.get("y_col") or (config.get("y_cols", [{}])[0].get("col") if config.get("y_cols") else None),
-        x_label=config.get("x_label"),
-        y_label=config.get("y_label"),
-    )
+    p = TrendPlot(trend_id=t.trend_id, plot_order=next_order)
+    _apply_plot_config(p, config)
     db.add(p)
     db.commit()
+    invalidate_trend(template_id)
     db.refresh(p)
     return _plot_to_dict(p)
 
 
+def save_plot_layout(
+    db: Session, template_id: str, configs: List[Dict[str, Any]], replace: bool = True
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Save a whole plot canvas in one transaction: configs with an id update that plot, others insert;
+    plot_order follows list order. With replace, saved plots missing from configs are deleted.
+    Returns the saved plots in order, or None if the trend does not exist.
+    """
+    t = db.query(SQLTemplate).filter(SQLTemplate.template_id == template_id).first()
+    if not t:
+        return None
+    existing = {p.id: p for p in db.query(TrendPlot).filter(TrendPlot.trend_id == t.trend_id).all()}
+    unknown = [c["id"] for c in configs if c.get("id") is not None and c["id"] not in existing]
+    if unknown:
+        raise ValueError(f"Plot id(s) not found for this trend: {unknown}")
+
+    layout = []
+    for order, config in enumerate(configs):
+        p = existing.get(config.get("id")) or TrendPlot(trend_id=t.trend_id)
+        _apply_plot_config(p, config)
+        p.plot_order = order
+        layout.append(p)
+    db.add_all([p for p in layout if p.id is None])
+    kept = {p.id for p in layout}
+    removed = [pid for pid in existing if pid not in kept] if replace else []
+    if removed:
+        db.query(TrendPlot).filter(TrendPlot.id.in_(removed)).delete(synchronize_session=False)
+    db.flush()
+    saved = _plot_list(layout)  # before commit, which would expire every row
+    db.commit()
+    invalidate_trend(template_id)
+    return saved
+
+
 def update_plot(db: Session, template_id: str, plot_id: int, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Update an existing saved plot."""
     t = db.query(SQLTemplate).filter(SQLTemplate.template_id == template_id).first()
@@ -420,15 +1237,9 @@ def update_plot(db: Session, template_id: str, plot_id: int, config: Dict[str, A
     p = db.query(TrendPlot).filter(TrendPlot.id == plot_id, TrendPlot.trend_id == t.trend_id).first()
     if not p:
         return None
-    config_copy = {k: v for k, v in config.items() if k != "id"}
-    p.config_json = json.dumps(config_copy)
-    p.title = config.get("title")
-    p.plot_type = config.get("type", "line")
-    p.x_col = config.get("x_col")
-    p.y_col = config.get("y_col") or (config.get("y_cols", [{}])[0].get("col") if config.get("y_cols") else None)
-    p.x_label = config.get("x_label")
-    p.y_label = config.get("y_label")
+    _apply_plot_config(p, config)
     db.commit()
+    invalidate_trend(template_id)
     db.refresh(p)
     return _plot_to_dict(p)
 
@@ -443,4 +1254,5 @@ def delete_plot(db: Session, template_id: str, plot_id: int) -> bool:
         return False
     db.delete(p)
     db.commit()
+    invalidate_trend(template_id)
     return True
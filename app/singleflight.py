@@ -0,0 +1,92 @@
+"""
+Single-flight request coalescing: concurrent callers with the same key share one execution.
+The first caller (the leader) runs the work; callers arriving while it is in flight wait for its result
+instead of running their own. Flights are shared between the sync (thread) and async (event loop) paths,
+since both wait on the same concurrent.futures.Future. Followers are counted in the
+"executions_deduplicated" metric. Nothing is kept once the leader finishes; caching is the result cache's job.
+Callers pass their query handle as tag: followers wait under query_registry.follow(tag, leader's tag), so
+cancelling a follower (or the leader) only detaches it, and the shared query is killed with its last waiter.
+If the leader is cancelled anyway (its query killed), its followers start a new flight among themselves.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app import metrics, query_registry
+
+_flights: Dict[str, Future] = {}
+_tags: Dict[str, Optional[str]] = {}  # key -> the leader's tag
+_lock = threading.Lock()
+
+
+class _LeaderCancelled(Exception):
+    """Set on a flight whose leader was cancelled before finishing."""
+
+
+def _join(key: str, tag: Optional[str]) -> Tuple[Future, bool, Optional[str]]:
+    """(future, leader, leader's tag): the in-flight future for key, or a new one that the caller must complete."""
+    with _lock:
+        fut = _flights.get(key)
+        if fut is not None:
+            metrics.incr("executions_deduplicated")
+            return fut, False, _tags.get(key)
+        fut = _flights[key] = Future()
+        _tags[key] = tag
+        fut.set_running_or_notify_cancel()  # a follower being cancelled must not cancel the flight
+        return fut, True, tag
+
+
+def _settle(key: str, fut: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+    """Retire the flight, then wake its followers (so a caller re-joining starts a new flight)."""
+    with _lock:
+        if _flights.get(key) is fut:
+            del _flights[key]
+            _tags.pop(key, None)
+    if error is not None:
+        fut.set_exception(error)
+    else:
+        fut.set_result(result)
+
+
+def do(key: str, func: Callable[[], Any], tag: Optional[str] = None) -> Tuple[Any, bool]:
+    """Run func() once for all concurrent callers with key. Returns (result, shared); exceptions are shared too."""
+    fut, leader, leader_tag = _join(key, tag)
+    if not leader:
+        try:
+            with query_registry.follow(tag, leader_tag):
+                return fut.result(), True
+        except _LeaderCancelled:
+            return do(key, func, tag)
+    try:
+        _settle(key, fut, func())
+    except Exception as e:
+        _settle(key, fut, error=e)
+    except BaseException:
+        _settle(key, fut, error=_LeaderCancelled())
+        raise
+    return fut.result(), False
+
+
+async def ado(key: str, func: Callable[[], Awaitable[Any]], tag: Optional[str] = None) -> Tuple[Any, bool]:
+    """Async counterpart of do(): await func() once for all concurrent callers (sync or async) with key."""
+    fut, leader, leader_tag = _join(key, tag)
+    if not leader:
+        try:
+            with query_registry.follow(tag, leader_tag):
+                return await asyncio.wrap_future(fut), True
+        except _LeaderCancelled:
+            return await ado(key, func, tag)
+    try:
+        _settle(key, fut, await func())
+    except Exception as e:
+        _settle(key, fut, error=e)
+    except BaseException:
+        _settle(key, fut, error=_LeaderCancelled())
+        raise
+    return fut.result(), False
+
+
+def in_flight() -> int:
+    with _lock:
+        return len(_flights)
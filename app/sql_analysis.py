@@ -0,0 +1,361 @@
+"""
+SQL template text handling: one tokenizer pass per template (cached by template hash) yields the
+:placeholders, referenced tables, output columns and statement shape; plus bound-statement compilation.
+The tokenizer skips quoted strings, quoted identifiers and comments, so '12:30' literals and
+:: casts are never mistaken for parameters, and :blendid never matches inside :blendid2.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.sql.elements import TextClause
+
+ANALYSIS_CACHE_SIZE = 512
+
+# Keywords that end a FROM list at the current nesting level
+_FROM_LIST_END = {
+    "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "UNION", "EXCEPT", "INTERSECT", "ON", "USING",
+    "WINDOW", "SELECT", "SET", "VALUES", "FOR", "LOCK", "PARTITION",
+}
+_TABLE_KEYWORDS = {"FROM", "JOIN", "INTO", "UPDATE", "STRAIGHT_JOIN"}
+_SELECT_MODIFIERS = {
+    "ALL", "DISTINCT", "DISTINCTROW", "HIGH_PRIORITY", "STRAIGHT_JOIN", "SQL_SMALL_RESULT",
+    "SQL_BIG_RESULT", "SQL_BUFFER_RESULT", "SQL_NO_CACHE", "SQL_CALC_FOUND_ROWS",
+}
+_NOT_ALIASES = {"END", "NULL", "TRUE", "FALSE", "AND", "OR", "NOT", "IS", "IN", "LIKE", "BETWEEN", "ELSE", "THEN"}
+
+
+class TemplateAnalysis(NamedTuple):
+    """Everything derived from a template's SQL text (immutable; shared by every caller)."""
+
+    hash: str
+    statement: Optional[str]  # first keyword, lower-case ("select", "with", "update", ...)
+    single_select: bool
+    placeholders: Tuple[str, ...]  # unique, in order of first appearance
+    spans: Tuple[Tuple[int, int, str], ...]  # (start, end, name) of every placeholder occurrence
+    tables: Tuple[str, ...]  # FROM / JOIN targets as written (schema.table kept), CTE names excluded
+    columns: Tuple[str, ...]  # top-level SELECT list: alias, column name, or expression text
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "hash": self.hash,
+            "statement": self.statement,
+            "single_select": self.single_select,
+            "placeholders": list(self.placeholders),
+            "tables": list(self.tables),
+            "columns": list(self.columns),
+        }
+
+
+_analyses: "OrderedDict[str, TemplateAnalysis]" = OrderedDict()
+_analyses_lock = threading.Lock()
+
+
+def template_hash(sql: str) -> str:
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+
+def analyze_template(sql: str) -> TemplateAnalysis:
+    """Analysis of sql, computed once per distinct template text (LRU keyed by template hash)."""
+    key = template_hash(sql)
+    with _analyses_lock:
+        hit = _analyses.get(key)
+        if hit is not None:
+            _analyses.move_to_end(key)
+            return hit
+    analysis = _analyze(sql, key)
+    with _analyses_lock:
+        _analyses[key] = analysis
+        while len(_analyses) > ANALYSIS_CACHE_SIZE:
+            _analyses.popitem(last=False)
+    return analysis
+
+
+def _tokens(sql: str) -> Iterator[Tuple[str, str, int, int]]:
+    """
+    Yield (kind, value, start, end) with kind in word / ident / string / number / param / op.
+    Whitespace and comments are dropped; ident values are unquoted, string values keep their quotes.
+    """
+    i, n = 0, len(sql)
+    while i < n:
+        c = sql[i]
+        if c.isspace():
+            i += 1
+        elif c in ("'", '"'):
+            j = _skip_quoted(sql, i)
+            yield "string", sql[i:j], i, j
+            i = j
+        elif c == "`":
+            j = _skip_quoted(sql, i)
+            yield "ident", sql[i + 1:j - 1].replace("``", "`"), i, j
+            i = j
+        elif c == "#" or (c == "-" and sql.startswith("--", i) and (i + 2 >= n or sql[i + 2] in " \t\r\n")):
+            end = sql.find("\n", i)
+            i = n if end < 0 else end
+        elif c == "/" and sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+        elif c == ":":
+            if i + 1 < n and sql[i + 1] == ":":  # :: cast
+                yield "op", "::", i, i + 2
+                i += 2
+                continue
+            j = i + 1
+            if not (i > 0 and (sql[i - 1].isalnum() or sql[i - 1] == "_")):
+                while j < n and (sql[j].isalnum() or sql[j] == "_"):
+                    j += 1
+            if j > i + 1:
+                yield "param", sql[i + 1:j], i, j
+            else:
+                yield "op", ":", i, i + 1
+            i = j
+        elif c.isdigit():
+            j = i + 1
+            while j < n and (sql[j].isalnum() or sql[j] in "._"):
+                j += 1
+            yield "number", sql[i:j], i, j
+            i = j
+        elif c.isalpha() or c in "_$@":
+            j = i + 1
+            while j < n and (sql[j].isalnum() or sql[j] in "_$@"):
+                j += 1
+            yield "word", sql[i:j], i, j
+            i = j
+        else:
+            yield "op", c, i, i + 1
+            i += 1
+
+
+def _analyze(sql: str, key: str) -> TemplateAnalysis:
+    toks = list(_tokens(sql))
+    spans = tuple((s, e, v) for kind, v, s, e in toks if kind == "param")
+    first = next((v for kind, v, _, _ in toks if kind == "word"), None)
+    statement = first.lower() if first else None
+    body = toks
+    while body and body[-1][:2] == ("op", ";"):
+        body = body[:-1]
+    single = statement in ("select", "with") and not any(t[:2] == ("op", ";") for t in body)
+    return TemplateAnalysis(
+        hash=key,
+        statement=statement,
+        single_select=single,
+        placeholders=tuple(dict.fromkeys(name for _, _, name in spans)),
+        spans=spans,
+        tables=_tables(body),
+        columns=_output_columns(sql, body),
+    )
+
+
+def _is_name(tok) -> bool:
+    return tok[0] in ("word", "ident")
+
+
+def _tables(toks) -> Tuple[str, ...]:
+    """FROM / JOIN / INTO / UPDATE targets at any nesting level, minus names defined by WITH."""
+    ctes = {
+        toks[i][1].lower()
+        for i in range(len(toks) - 2)
+        if _is_name(toks[i]) and toks[i + 1][0] == "word" and toks[i + 1][1].upper() == "AS" and toks[i + 2][1] == "("
+    }
+    tables: Dict[str, None] = {}
+    depth = 0
+    from_lists = set()  # nesting levels with an open FROM list (comma-separated tables)
+    expect = False
+    i = 0
+    while i < len(toks):
+        kind, val = toks[i][0], toks[i][1]
+        if kind == "op":
+            if val == "(":
+                depth += 1
+                expect = False  # derived table / subquery
+            elif val == ")":
+                from_lists.discard(depth)
+                depth -= 1
+            elif val == "," and depth in from_lists:
+                expect = True
+            i += 1
+            continue
+        upper = val.upper() if kind == "word" else None
+        if upper in _TABLE_KEYWORDS:
+            # ON DUPLICATE KEY UPDATE / FOR UPDATE are not table references
+            expect = not (upper == "UPDATE" and i > 0 and toks[i - 1][1].upper() in ("KEY", "FOR"))
+            if upper == "FROM":
+                from_lists.add(depth)
+            i += 1
+            continue
+        if upper in _FROM_LIST_END:
+            from_lists.discard(depth)
+        if expect and _is_name(toks[i]) and upper not in ("LATERAL", "ONLY"):
+            parts = [val]
+            while i + 2 < len(toks) and toks[i + 1][:2] == ("op", ".") and _is_name(toks[i + 2]):
+                parts.append(toks[i + 2][1])
+                i += 2
+            name = ".".join(parts)
+            if not (len(parts) == 1 and (name.lower() in ctes or upper == "DUAL")):
+                tables.setdefault(name)
+            expect = False
+        i += 1
+    return tuple(tables)
+
+
+def _output_columns(sql: str, toks) -> Tuple[str, ...]:
+    """Column names of the outermost SELECT list (alias, bare column, or the expression text)."""
+    depth, select_at, select_depth = 0, None, None
+    for i, tok in enumerate(toks):
+        if tok[:2] == ("op", "("):
+            depth += 1
+        elif tok[:2] == ("op", ")"):
+            depth -= 1
+        elif tok[0] == "word" and tok[1].upper() == "SELECT" and (select_depth is None or depth < select_depth):
+            select_at, select_depth = i, depth
+    if select_at is None:
+        return ()
+    items: List[list] = [[]]
+    depth = select_depth
+    for tok in toks[select_at + 1:]:
+        if tok[:2] == ("op", "("):
+            depth += 1
+        elif tok[:2] == ("op", ")"):
+            if depth == select_depth:
+                break
+            depth -= 1
+        elif depth == select_depth:
+            if tok[0] == "word" and tok[1].upper() in ("FROM", "INTO", "UNION", "WHERE", "LIMIT", "ORDER", "GROUP"):
+                break
+            if tok[:2] == ("op", ";"):
+                break
+            if tok[:2] == ("op", ","):
+                items.append([])
+                continue
+        items[-1].append(tok)
+    while items and items[0] and items[0][0][0] == "word" and items[0][0][1].upper() in _SELECT_MODIFIERS:
+        items[0].pop(0)
+    return tuple(_column_name(sql, item) for item in items if item)
+
+
+def _column_name(sql: str, item) -> str:
+    last = item[-1]
+    alias = _unquote(last) if last[0] in ("word", "ident", "string") else None
+    if len(item) >= 2 and alias is not None:
+        prev = item[-2]
+        if prev[0] == "word" and prev[1].upper() == "AS":
+            return alias
+        if (
+            last[1].upper() not in _NOT_ALIASES
+            and (prev[0] in ("word", "ident", "string", "number") or prev[:2] == ("op", ")"))
+            and not (prev[0] == "word" and prev[1].upper() in _NOT_ALIASES | {"CASE", "WHEN", "DISTINCT"})
+        ):
+            return alias
+    if all(t[0] in ("word", "ident") or t[1] in (".", "*") for t in item):
+        return item[-1][1] if item[-1][1] != "*" or len(item) == 1 else "".join(t[1] for t in item)
+    return " ".join(sql[item[0][2]:item[-1][3]].split())
+
+
+def _unquote(tok) -> str:
+    if tok[0] == "string":
+        quote = tok[1][0]
+        return tok[1][1:-1].replace(quote * 2, quote)
+    return tok[1]
+
+
+def placeholder_spans(sql: str) -> List[Tuple[int, int, str]]:
+    """Return (start, end, name) for every :name placeholder outside strings and comments."""
+    return list(analyze_template(sql).spans)
+
+
+def _skip_quoted(sql: str, i: int) -> int:
+    """Index just past the quoted token starting at i (handles doubled quotes and backslash escapes)."""
+    quote, n = sql[i], len(sql)
+    j = i + 1
+    while j < n:
+        if sql[j] == "\\" and quote != "`":
+            j += 2
+            continue
+        if sql[j] == quote:
+            if j + 1 < n and sql[j + 1] == quote:
+                j += 2
+                continue
+            return j + 1
+        j += 1
+    return n
+
+
+def placeholder_names(sql: str) -> List[str]:
+    """Unique placeholder names in order of first appearance."""
+    return list(analyze_template(sql).placeholders)
+
+
+def rename_placeholders(sql: str, suffix: str) -> str:
+    """Append suffix to every placeholder name (:blendid -> :blendid_b0), for combining templates in one statement."""
+    parts = []
+    last = 0
+    for start, end, name in analyze_template(sql).spans:
+        parts.append(sql[last:start])
+        parts.append(f":{name}{suffix}")
+        last = end
+    parts.append(sql[last:])
+    return "".join(parts)
+
+
+def strip_statement(sql: str) -> str:
+    """Trim whitespace and trailing semicolons so the SQL can be nested as a derived table."""
+    return sql.strip().rstrip(";").rstrip()
+
+
+def is_single_select(sql: str) -> bool:
+    """True if sql is one SELECT / WITH statement (no further ';'-separated statements outside strings/comments)."""
+    return analyze_template(sql).single_select
+
+
+@lru_cache(maxsize=256)
+def with_execution_time_hint(sql: str, timeout_ms: int) -> str:
+    """
+    sql with MySQL's /*+ MAX_EXECUTION_TIME(ms) */ optimizer hint after its top-level SELECT keyword,
+    which limits that one statement (no session state to set or reset). MySQL ignores the hint inside a
+    CTE or subquery, so for WITH statements it goes after the first SELECT outside parentheses (past the
+    CTE list). Only single SELECT / WITH statements are hinted; anything else is returned unchanged.
+    """
+    analysis = analyze_template(sql)
+    if not analysis.single_select:
+        return sql
+    end = _top_level_select_end(sql, analysis.statement == "with")
+    if end is None:
+        return sql
+    return f"{sql[:end]} /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */{sql[end:]}"
+
+
+def _top_level_select_end(sql: str, after_ctes: bool) -> Optional[int]:
+    """End offset of the SELECT keyword that starts the main query block (None if there is none)."""
+    depth = 0
+    for kind, v, _, e in _tokens(sql):
+        if kind == "op" and v == "(":
+            depth += 1
+        elif kind == "op" and v == ")":
+            depth -= 1
+        elif kind == "word" and v.upper() == "SELECT" and (depth == 0 or not after_ctes):
+            return e
+    return None
+
+
+@lru_cache(maxsize=256)
+def compile_template(sql: str, expanding: FrozenSet[str] = frozenset()) -> Tuple[TextClause, Tuple[str, ...]]:
+    """
+    Compile a template once into a text() statement with real bind parameters.
+    Cached on the SQL text itself, so each saved template version compiles once per process and
+    SQLAlchemy reuses its compiled form. Names in expanding bind a list as IN (...).
+    Returns (statement, placeholder names).
+    """
+    analysis = analyze_template(sql)
+    parts = []
+    last = 0
+    for start, end, name in analysis.spans:
+        parts.append(sql[last:start].replace(":", "\\:"))
+        parts.append(f":{name}")
+        last = end
+    parts.append(sql[last:].replace(":", "\\:"))
+    names = analysis.placeholders
+    stmt = text("".join(parts)).bindparams(*[bindparam(n, expanding=n in expanding) for n in names])
+    return stmt, names
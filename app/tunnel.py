@@ -0,0 +1,268 @@
+"""
+SSH tunnels to the VPS-bound MySQL, shared by every entry point (run.py, scripts, check tools).
+A TunnelPool runs one or more parallel channels (each its own SSH transport on its own local port).
+A watchdog thread probes every channel, records latency, and reconnects dropped channels on the
+same local port with exponential backoff, so DB clients keep their host/port across reconnects.
+The launcher publishes channel ports in DB_TUNNEL_PORTS (app.database spreads connections over them)
+and writes channel health to a status file that /api/metrics reads from the worker processes.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from app import metrics
+from config.database import get_ssh_config, get_tunnel_config, get_tunnel_ports
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 60
+
+
+def ssh_forwarder(remote_host: str, remote_port: int, local_port: int, keepalive: int):
+    """Default forwarder factory: an SSHTunnelForwarder bound to 127.0.0.1:local_port (0 = any free port)."""
+    from sshtunnel import SSHTunnelForwarder
+
+    ssh = get_ssh_config()
+    return SSHTunnelForwarder(
+        (ssh["host"], ssh["port"]),
+        ssh_username=ssh["username"],
+        ssh_password=ssh["password"],
+        remote_bind_address=(remote_host, remote_port),
+        local_bind_address=("127.0.0.1", local_port),
+        set_keepalive=keepalive,
+    )
+
+
+class TunnelChannel:
+    """One forwarder plus its health: up/down, last probe latency, reconnect and failure counts."""
+
+    def __init__(self, index: int, local_port: int):
+        self.index = index
+        self.local_port = local_port
+        self.forwarder = None
+        self.up = False
+        self.latency_ms: Optional[float] = None
+        self.reconnects = 0
+        self.failures = 0
+        self.backoff = 1
+        self.retry_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "channel": self.index,
+            "local_port": self.local_port,
+            "up": self.up,
+            "latency_ms": self.latency_ms,
+            "reconnects": self.reconnects,
+            "failures": self.failures,
+        }
+
+
+class TunnelPool:
+    """
+    N parallel tunnel channels to remote_host:remote_port, kept alive by a watchdog.
+    forwarder_factory(remote_host, remote_port, local_port, keepalive) builds a forwarder with the
+    sshtunnel interface (start, stop, is_active, local_bind_port, check_tunnels, tunnel_is_up);
+    pass a stub to test without an SSH server.
+    """
+
+    def __init__(
+        self,
+        remote_host: str,
+        remote_port: int,
+        channels: int = 1,
+        base_port: int = 0,
+        check_interval: int = 15,
+        status_file: Optional[str] = None,
+        forwarder_factory: Callable = ssh_forwarder,
+    ):
+        self.remote_host = remote_host
+        self.remote_port = remote_port
+        self.check_interval = check_interval
+        self.status_file = status_file
+        self._factory = forwarder_factory
+        self.channels = [TunnelChannel(i, base_port + i if base_port else 0) for i in range(max(channels, 1))]
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @property
+    def ports(self) -> List[int]:
+        return [c.local_port for c in self.channels]
+
+    def start(self) -> List[int]:
+        """Open every channel (raises if none comes up) and start the watchdog. Returns the local ports."""
+        errors = []
+        for channel in self.channels:
+            try:
+                self._open(channel)
+            except Exception as e:
+                errors.append(e)
+                logger.warning("Tunnel channel %d failed to start: %s", channel.index, e)
+        if len(errors) == len(self.channels):
+            raise errors[0]
+        # Channels that failed to start still need a fixed port before workers are told about it
+        for channel in self.channels:
+            if not channel.local_port:
+                channel.local_port = self._free_port()
+        self._write_status()
+        self._watchdog = threading.Thread(target=self._watch, name="ssh-tunnel-watchdog", daemon=True)
+        self._watchdog.start()
+        return self.ports
+
+    def _open(self, channel: TunnelChannel) -> None:
+        fwd = self._factory(self.remote_host, self.remote_port, channel.local_port, max(self.check_interval, 5))
+        fwd.start()
+        channel.forwarder = fwd
+        channel.local_port = fwd.local_bind_port
+        channel.up = True
+        channel.backoff = 1
+
+    @staticmethod
+    def _free_port() -> int:
+        import socket
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    def probe(self, channel: TunnelChannel) -> bool:
+        """Health probe: open a channel through SSH to the remote port and time it."""
+        fwd = channel.forwarder
+        if fwd is None or not fwd.is_active:
+            return False
+        t0 = time.perf_counter()
+        fwd.check_tunnels()
+        ok = bool(fwd.tunnel_is_up) and all(fwd.tunnel_is_up.values())
+        if ok:
+            channel.latency_ms = round((time.perf_counter() - t0) * 1000, 1)
+        return ok
+
+    def check(self) -> None:
+        """One watchdog pass: probe each channel, reconnect the ones that are down (respecting backoff)."""
+        now = time.monotonic()
+        for channel in self.channels:
+            try:
+                channel.up = self.probe(channel)
+            except Exception:
+                logger.warning("Tunnel channel %d probe failed", channel.index, exc_info=True)
+                channel.up = False
+            if channel.up or now < channel.retry_at:
+                continue
+            logger.warning("Tunnel channel %d down, reconnecting on port %s", channel.index, channel.local_port)
+            self._close(channel)
+            try:
+                self._open(channel)
+                channel.reconnects += 1
+                metrics.incr("tunnel_reconnects")
+                logger.info("Tunnel channel %d re-established (reconnect #%d)", channel.index, channel.reconnects)
+            except Exception as e:
+                channel.failures += 1
+                metrics.incr("tunnel_reconnect_failures")
+                channel.retry_at = now + channel.backoff
+                logger.warning("Tunnel channel %d reconnect failed (%s), retrying in %ss", channel.index, e, channel.backoff)
+                channel.backoff = min(channel.backoff * 2, MAX_BACKOFF_SECONDS)
+        self._write_status()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(min(self.check_interval, self._next_retry_in())):
+            self.check()
+
+    def _next_retry_in(self) -> float:
+        pending = [c.retry_at - time.monotonic() for c in self.channels if not c.up]
+        return max(min(pending), 1) if pending else self.check_interval
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "remote": f"{self.remote_host}:{self.remote_port}",
+            "channels": [c.stats() for c in self.channels],
+            "up": sum(1 for c in self.channels if c.up),
+            "reconnects": sum(c.reconnects for c in self.channels),
+            "updated_at": time.time(),
+        }
+
+    def _write_status(self) -> None:
+        if not self.status_file:
+            return
+        try:
+            tmp = f"{self.status_file}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.stats(), f)
+            os.replace(tmp, self.status_file)
+        except OSError:
+            logger.warning("Could not write tunnel status to %s", self.status_file, exc_info=True)
+
+    @staticmethod
+    def _close(channel: TunnelChannel) -> None:
+        if channel.forwarder is not None:
+            try:
+                channel.forwarder.stop()
+            except Exception:
+                logger.warning("Error closing tunnel channel %d", channel.index, exc_info=True)
+            channel.forwarder = None
+        channel.up = False
+
+    def stop(self) -> None:
+        self._stop.set()
+        for channel in self.channels:
+            self._close(channel)
+        if self.status_file:
+            try:
+                os.remove(self.status_file)
+            except OSError:
+                pass
+
+
+def start_shared_tunnel(channels: Optional[int] = None, publish_status: bool = True) -> TunnelPool:
+    """
+    Start the tunnel pool to DB_HOST:DB_PORT (as seen from the SSH server) and point this process's
+    environment at it (DB_HOST, DB_PORT, DB_TUNNEL_PORTS), so every worker spawned afterwards inherits it.
+    publish_status writes channel health to the status file read by /api/metrics (the server launcher only).
+    """
+    cfg = get_tunnel_config()
+    pool = TunnelPool(
+        os.getenv("DB_HOST", "localhost"),
+        int(os.getenv("DB_PORT", "3306")),
+        channels=channels or cfg["channels"],
+        base_port=cfg["local_port"],
+        check_interval=cfg["check_interval"],
+        status_file=cfg["status_file"] if publish_status else None,
+    )
+    ports = pool.start()
+    os.environ["DB_HOST"] = "127.0.0.1"
+    os.environ["DB_PORT"] = str(ports[0])
+    os.environ["DB_TUNNEL_PORTS"] = ",".join(str(p) for p in ports)
+    return pool
+
+
+@contextmanager
+def db_tunnel(enabled: Optional[bool] = None, channels: int = 1):
+    """
+    For scripts: run the block with a tunnel up (USE_SSH_TUNNEL=true, or enabled=True) and DB_HOST/DB_PORT
+    pointing at it; a no-op otherwise. Yields the TunnelPool or None. Import app.database inside the block.
+    """
+    if enabled is None:
+        enabled = os.getenv("USE_SSH_TUNNEL", "false").lower().strip() == "true"
+    if not enabled:
+        yield None
+        return
+    pool = start_shared_tunnel(channels, publish_status=False)
+    try:
+        yield pool
+    finally:
+        pool.stop()
+
+
+def read_tunnel_status() -> Optional[Dict[str, Any]]:
+    """Latest status written by the launcher's tunnel pool, or None when no tunnel is running."""
+    if not get_tunnel_ports():
+        return None
+    path = get_tunnel_config()["status_file"]
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -1,42 +1,19 @@
 import os
 import sys
 from dotenv import load_dotenv
-from sshtunnel import SSHTunnelForwarder
+from app.tunnel import db_tunnel
 import pymysql
 
 load_dotenv()
 
 def check_schema():
-    use_ssh = os.getenv("USE_SSH_TUNNEL", "false").lower() == "true"
-    ssh_host = os.getenv("SSH_HOST")
-    ssh_port = int(os.getenv("SSH_PORT", 22))
-    ssh_user = os.getenv("SSH_USER")
-    ssh_password = os.getenv("SSH_PASSWORD")
-    
-    db_host = os.getenv("DB_HOST", "localhost")
-    db_port = int(os.getenv("DB_PORT", 3306))
     db_user = os.getenv("DB_USER")
     db_password = os.getenv("DB_PASSWORD")
     
-    server = None
-    
     try:
-        if use_ssh:
-            print(f"Connecting via SSH to {ssh_host}...")
-            server = SSHTunnelForwarder(
-                (ssh_host, ssh_port),
-                ssh_username=ssh_user,
-                ssh_password=ssh_password,
-                remote_bind_address=(db_host, db_port)
-            )
-            server.start()
-            local_port = server.local_bind_port
-            print(f"SSH Tunnel established. Local port: {local_port}")
-            connect_host = "127.0.0.1"
-            connect_port = local_port
-        else:
-            connect_host = db_host
-            connect_port = db_port
+        # Read after the tunnel is up: it points DB_HOST/DB_PORT at the local forward
+        connect_host = os.getenv("DB_HOST", "localhost")
+        connect_port = int(os.getenv("DB_PORT", 3306))
 
         print(f"Connecting to database at {connect_host}:{connect_port}...")
         conn = pymysql.connect(
@@ -69,9 +46,9 @@ def check_schema():
                         
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        if server:
-            server.stop()
 
 if __name__ == "__main__":
-    check_schema()
+    with db_tunnel() as tunnel:
+        if tunnel:
+            print(f"SSH Tunnel established. Local port: {os.environ['DB_PORT']}")
+        check_schema()
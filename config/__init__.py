@@ -1,4 +1,34 @@
 """BlendTwin configuration package."""
-from .database import get_db_url, get_ssh_config, CONNECTION_COLUMNS
+from .database import (
+    get_db_url,
+    get_async_db_url,
+    is_async_db_enabled,
+    get_pool_config,
+    get_query_timeout_ms,
+    get_ssh_config,
+    get_tunnel_config,
+    get_tunnel_ports,
+    CONNECTION_COLUMNS,
+)
+from .server import get_live_config, get_server_config
+from .cache import get_cache_backend_config, get_catalog_ttl, get_result_cache_config, get_schema_cache_ttl, get_trend_cache_ttl, get_dropdown_cache_ttl
 
-__all__ = ["get_db_url", "get_ssh_config", "CONNECTION_COLUMNS"]
+__all__ = [
+    "get_db_url",
+    "get_async_db_url",
+    "is_async_db_enabled",
+    "get_pool_config",
+    "get_query_timeout_ms",
+    "get_ssh_config",
+    "get_tunnel_config",
+    "get_tunnel_ports",
+    "get_server_config",
+    "get_live_config",
+    "CONNECTION_COLUMNS",
+    "get_cache_backend_config",
+    "get_catalog_ttl",
+    "get_result_cache_config",
+    "get_schema_cache_ttl",
+    "get_trend_cache_ttl",
+    "get_dropdown_cache_ttl",
+]
@@ -0,0 +1,62 @@
+"""
+Cache configuration for BlendTwin Trend Query Workbench.
+All values come from environment variables (see .env.example).
+"""
+import os
+import tempfile
+from typing import Dict
+
+
+def _parse_ttl_map(raw: str) -> Dict[str, int]:
+    """Parse 'T001=60,T002=600' into {'T001': 60, 'T002': 600}. Bad entries are ignored."""
+    result = {}
+    for item in raw.split(","):
+        key, sep, val = item.partition("=")
+        if sep and key.strip() and val.strip().isdigit():
+            result[key.strip()] = int(val.strip())
+    return result
+
+
+def get_cache_backend_config() -> dict:
+    """
+    Where caches live: CACHE_BACKEND=memory (per process), sqlite (file shared by all workers on the host)
+    or redis (CACHE_REDIS_URL, any Redis-protocol server). max_bytes bounds the sqlite file's contents.
+    """
+    return {
+        "backend": os.getenv("CACHE_BACKEND", "memory").strip().lower(),
+        "sqlite_path": os.getenv("CACHE_SQLITE_PATH") or os.path.join(tempfile.gettempdir(), "blendtwin_cache.sqlite3"),
+        "redis_url": os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"),
+        "max_bytes": int(os.getenv("CACHE_MAX_MB", os.getenv("RESULT_CACHE_MAX_MB", "64"))) * 1024 * 1024,
+    }
+
+
+def get_result_cache_config() -> dict:
+    """Result cache for /api/execute: byte budget, default TTL (seconds) and per-template TTL overrides."""
+    return {
+        "max_bytes": int(os.getenv("RESULT_CACHE_MAX_MB", "64")) * 1024 * 1024,
+        "default_ttl": int(os.getenv("RESULT_CACHE_TTL", "120")),
+        "template_ttls": _parse_ttl_map(os.getenv("RESULT_CACHE_TEMPLATE_TTLS", "")),
+    }
+
+
+def get_trend_cache_ttl() -> int:
+    """Seconds a trend detail (template + plots + parameters) is cached; write paths invalidate it. 0 disables."""
+    return int(os.getenv("TREND_CACHE_TTL", "300"))
+
+
+def get_dropdown_cache_ttl() -> int:
+    """Seconds the bts_DropDownList domains (quality, streams, tank_no, ai_mixing_model, trend_parms) are cached."""
+    return int(os.getenv("DROPDOWN_CACHE_TTL", "300"))
+
+
+def get_catalog_ttl() -> int:
+    """
+    Seconds a worker trusts its in-memory trend catalog without seeing a catalog_version bump. With
+    CACHE_BACKEND=memory other workers' bumps are invisible, so this bounds how stale it gets. 0 disables.
+    """
+    return int(os.getenv("CATALOG_TTL", "60"))
+
+
+def get_schema_cache_ttl() -> int:
+    """Seconds the query-builder schema (information_schema) is cached; 0 disables."""
+    return int(os.getenv("SCHEMA_CACHE_TTL", "600"))
@@ -3,7 +3,8 @@ Database connection configuration for BlendTwin Trend Query Workbench.
 Loads credentials from environment variables - never hardcode credentials.
 """
 import os
-from typing import Optional
+import tempfile
+from typing import List, Optional
 from urllib.parse import quote_plus
 
 # Optional: use python-dotenv to load .env file
@@ -14,7 +15,7 @@ except ImportError:
     pass  # Run without .env if dotenv not installed
 
 
-def get_db_url(use_ssh: Optional[bool] = None) -> str:
+def get_db_url(use_ssh: Optional[bool] = None, driver: str = "pymysql") -> str:
     """
     Build SQLAlchemy database URL from environment variables.
     
@@ -37,7 +38,33 @@ def get_db_url(use_ssh: Optional[bool] = None) -> str:
     # URL-encode credentials (passwords with @, !, etc. break URL parsing)
     user_enc = quote_plus(user)
     password_enc = quote_plus(password)
-    return f"mysql+pymysql://{user_enc}:{password_enc}@{host}:{port}/{name}?charset={charset}"
+    return f"mysql+{driver}://{user_enc}:{password_enc}@{host}:{port}/{name}?charset={charset}"
+
+
+def is_async_db_enabled() -> bool:
+    """Opt-in async engine (DB_ASYNC_ENABLED=true) serving the /api/async routes."""
+    return os.getenv("DB_ASYNC_ENABLED", "false").lower().strip() == "true"
+
+
+def get_async_db_url(use_ssh: Optional[bool] = None) -> str:
+    """Async SQLAlchemy URL (aiomysql by default, or DB_ASYNC_DRIVER=asyncmy)."""
+    return get_db_url(use_ssh, driver=os.getenv("DB_ASYNC_DRIVER", "aiomysql"))
+
+
+def get_pool_config() -> dict:
+    """SQLAlchemy connection pool settings (shared by the sync and async engines)."""
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),  # seconds to wait for a free connection
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),  # seconds; keep below MySQL wait_timeout
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower().strip() == "true",
+    }
+
+
+def get_query_timeout_ms() -> int:
+    """Default MySQL execution time limit (MAX_EXECUTION_TIME hint) for /api/execute in milliseconds (0 = no limit)."""
+    return int(os.getenv("QUERY_TIMEOUT_MS", "120000"))
 
 
 def get_ssh_config() -> dict:
@@ -50,6 +77,24 @@ def get_ssh_config() -> dict:
     }
 
 
+def get_tunnel_config() -> dict:
+    """
+    SSH tunnel pool (app.tunnel): parallel channels, first local port (0 = pick free ones; channel i uses
+    SSH_LOCAL_PORT + i), health-check interval and the status file the launcher writes for /api/metrics.
+    """
+    return {
+        "channels": int(os.getenv("SSH_TUNNEL_CHANNELS", "1")),
+        "local_port": int(os.getenv("SSH_LOCAL_PORT", "0")),
+        "check_interval": int(os.getenv("SSH_TUNNEL_CHECK_INTERVAL", "15")),  # seconds
+        "status_file": os.getenv("SSH_TUNNEL_STATUS_FILE") or os.path.join(tempfile.gettempdir(), "blendtwin_tunnel.json"),
+    }
+
+
+def get_tunnel_ports() -> List[int]:
+    """Local ports of the tunnel channels published by the launcher (DB_TUNNEL_PORTS), empty without a tunnel."""
+    return [int(p) for p in os.getenv("DB_TUNNEL_PORTS", "").split(",") if p.strip().isdigit()]
+
+
 # Column mapping from OMS_Connections.xlsx
 CONNECTION_COLUMNS = [
     "Connection Name",
@@ -0,0 +1,33 @@
+"""
+Server / launcher configuration for BlendTwin Trend Query Workbench (run.py).
+All values come from environment variables (see .env.example).
+"""
+import os
+
+
+def get_server_config() -> dict:
+    """
+    RUN_MODE=dev: one process with auto-reload. RUN_MODE=prod: WEB_CONCURRENCY worker processes,
+    no reload, graceful shutdown waiting up to GRACEFUL_SHUTDOWN_TIMEOUT seconds for in-flight requests.
+    """
+    return {
+        "mode": os.getenv("RUN_MODE", "dev").strip().lower(),
+        "host": os.getenv("HOST", "0.0.0.0"),
+        "port": int(os.getenv("PORT", "8000")),
+        "workers": int(os.getenv("WEB_CONCURRENCY", str(min(os.cpu_count() or 1, 4)))),
+        "graceful_shutdown_timeout": int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "60")),
+        "warmup": os.getenv("WARMUP_ON_START", "true").lower().strip() == "true",
+    }
+
+
+def get_live_config() -> dict:
+    """
+    Live trend subscriptions (/api/trends/{id}/live): each distinct (template, params) is polled every
+    LIVE_POLL_SECONDS; idle streams get a keep-alive every LIVE_HEARTBEAT_SECONDS; a viewer more than
+    LIVE_QUEUE_SIZE deltas behind is told to resync instead of buffering without bound.
+    """
+    return {
+        "poll_seconds": float(os.getenv("LIVE_POLL_SECONDS", "5")),
+        "heartbeat_seconds": float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15")),
+        "queue_size": int(os.getenv("LIVE_QUEUE_SIZE", "32")),
+    }
@@ -1,6 +1,6 @@
 import os
 import pymysql
-from sshtunnel import SSHTunnelForwarder
+from app.tunnel import db_tunnel
 from config.database import get_ssh_config
 from dotenv import load_dotenv
 
@@ -11,23 +11,15 @@ def inspect_t002():
     db_user = os.getenv("DB_USER")
     db_pass = os.getenv("DB_PASSWORD")
     db_name = os.getenv("DB_NAME")
-    db_host = os.getenv("DB_HOST", "localhost")
-    db_port = int(os.getenv("DB_PORT", "3306"))
 
     try:
         print(f"Connecting to {ssh_config['host']} via SSH...")
-        with SSHTunnelForwarder(
-            (ssh_config['host'], ssh_config['port']),
-            ssh_username=ssh_config['username'],
-            ssh_password=ssh_config['password'],
-            remote_bind_address=('localhost', 3306)
-        ) as tunnel:
-            tunnel.start()
-            print(f"SSH tunnel established at localhost:{tunnel.local_bind_port}")
+        with db_tunnel(enabled=True) as tunnel:
+            print(f"SSH tunnel established at localhost:{tunnel.ports[0]}")
             
             conn = pymysql.connect(
                 host='127.0.0.1',
-                port=tunnel.local_bind_port,
+                port=tunnel.ports[0],
                 user=db_user,
                 password=db_pass,
                 database=db_name,
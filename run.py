@@ -1,4 +1,13 @@
-"""Run BlendTwin Trend Query Workbench. Usage: python run.py"""
+"""
+Run BlendTwin Trend Query Workbench.
+
+    python run.py                      # dev: one process, auto-reload (off when SSH tunnel is used)
+    python run.py --prod --workers 4   # prod: N workers, no reload, graceful shutdown (or RUN_MODE=prod)
+
+The SSH tunnel pool (USE_SSH_TUNNEL=true, SSH_TUNNEL_CHANNELS) lives in this launcher process and is
+shared by all workers.
+"""
+import argparse
 import os
 import sys
 import uvicorn
@@ -6,55 +15,66 @@ from dotenv import load_dotenv
 
 if __name__ == "__main__":
     load_dotenv()
-    
+    from config.cache import get_cache_backend_config
+    from config.server import get_server_config
+
+    cfg = get_server_config()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prod", action="store_true", help="Multi-worker production mode")
+    parser.add_argument("--workers", type=int, default=cfg["workers"], help="Worker processes in prod mode")
+    args = parser.parse_args()
+    prod = args.prod or cfg["mode"] == "prod"
+
     # Check if SSH tunnel is needed
     use_ssh = os.getenv("USE_SSH_TUNNEL", "false").lower().strip() == "true"
-    server = None
-    
+    tunnel = None
+
     if use_ssh:
         try:
-            from sshtunnel import SSHTunnelForwarder
-            
-            ssh_host = os.getenv("SSH_HOST")
-            ssh_port = int(os.getenv("SSH_PORT", 22))
-            ssh_user = os.getenv("SSH_USER")
-            ssh_password = os.getenv("SSH_PASSWORD")
-            
-            # The remote database host/port as seen from the SSH server
-            db_host = os.getenv("DB_HOST", "localhost")
-            db_port = int(os.getenv("DB_PORT", 3306))
-            
-            print(f"Starting SSH tunnel to {ssh_host}@{ssh_port}...")
-            server = SSHTunnelForwarder(
-                (ssh_host, ssh_port),
-                ssh_username=ssh_user,
-                ssh_password=ssh_password,
-                remote_bind_address=(db_host, db_port)
-            )
-            server.start()
-            
-            print(f"SSH tunnel established. Forwarding localhost:{server.local_bind_port} -> {db_host}:{db_port}", flush=True)
-            
-            # Override environment variables for the application (must be set before uvicorn spawns workers)
-            os.environ["DB_HOST"] = "127.0.0.1"
-            os.environ["DB_PORT"] = str(server.local_bind_port)
+            import sshtunnel  # noqa: F401
+            from app.tunnel import start_shared_tunnel
+
+            remote = f"{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', 3306)}"
+            print(f"Starting SSH tunnel to {os.getenv('SSH_HOST')}@{os.getenv('SSH_PORT', 22)}...")
+            # Overrides DB_HOST/DB_PORT in this process's environment (must happen before uvicorn spawns workers)
+            tunnel = start_shared_tunnel()
+            ports = ", ".join(str(p) for p in tunnel.ports)
+            print(f"SSH tunnel established ({len(tunnel.ports)} channel(s)). Forwarding localhost:{ports} -> {remote}", flush=True)
             print(f"DB connection: {os.environ['DB_HOST']}:{os.environ['DB_PORT']}", flush=True)
-            
+
         except ImportError:
             print("Error: 'sshtunnel' library not found. Install it with: pip install sshtunnel")
             sys.exit(1)
         except Exception as e:
             print(f"Error starting SSH tunnel: {e}")
-            if server:
-                server.stop()
+            if tunnel:
+                tunnel.stop()
             sys.exit(1)
 
-    port = int(os.getenv("PORT", "8000"))
     try:
-        # Use reload=False when using SSH tunnel - reloader subprocess may not inherit env vars correctly
-        use_reload = not use_ssh
-        uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=use_reload)
+        if prod:
+            print(f"Production mode: {args.workers} workers on {cfg['host']}:{cfg['port']}", flush=True)
+            if args.workers > 1 and get_cache_backend_config()["backend"] == "memory":
+                print(
+                    "WARNING: CACHE_BACKEND=memory with several workers: each worker caches on its own and does not "
+                    "see the others' invalidations (trend catalog stale for up to CATALOG_TTL seconds, trend details "
+                    "up to TREND_CACHE_TTL). Set CACHE_BACKEND=sqlite or redis for production.",
+                    file=sys.stderr,
+                    flush=True,
+                )
+            uvicorn.run(
+                "app.main:app",
+                host=cfg["host"],
+                port=cfg["port"],
+                workers=args.workers,
+                reload=False,
+                timeout_graceful_shutdown=cfg["graceful_shutdown_timeout"],
+            )
+        else:
+            # Use reload=False when using SSH tunnel - reloader subprocess may not inherit env vars correctly
+            use_reload = not use_ssh
+            uvicorn.run("app.main:app", host=cfg["host"], port=cfg["port"], reload=use_reload)
     finally:
-        if server:
+        if tunnel:
             print("Closing SSH tunnel...")
-            server.stop()
+            tunnel.stop()
@@ -0,0 +1,116 @@
+"""
+Compare the JSON rows payload of /api/execute with the Arrow IPC stream (Accept: application/vnd.apache.arrow.stream):
+bytes on the wire (raw and gzip) and client decode time (json.loads vs pyarrow IPC read).
+
+Against a running server (needs pyarrow on both sides), from project root:
+
+    python scripts/bench_arrow.py --body '{"sql": "SELECT cycleno, value, series FROM ...", "params": {...}}'
+
+Without a server, encoding a synthetic result in-process with the same code paths:
+
+    python scripts/bench_arrow.py --synthetic 200000
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ARROW = "application/vnd.apache.arrow.stream"
+
+
+def _decode_json(body: bytes) -> int:
+    return len(json.loads(body)["rows"])
+
+
+def _decode_arrow(body: bytes) -> int:
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(io.BytesIO(body)).read_all().num_rows
+
+
+def _timed(func, *args, repeat: int = 5) -> tuple:
+    """(median seconds, last return value)"""
+    times, value = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        value = func(*args)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), value
+
+
+def _fetch(url: str, body: bytes, accept: str) -> bytes:
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json", "Accept": accept})
+    with urllib.request.urlopen(req, timeout=300) as res:
+        if not res.headers.get("Content-Type", "").startswith(accept):
+            raise SystemExit(f"Server answered {res.headers.get('Content-Type')} for Accept: {accept} (pyarrow installed?)")
+        return res.read()
+
+
+def from_server(url: str, body: dict, repeat: int) -> dict:
+    data = json.dumps({**body, "no_cache": True}).encode()
+    out = {}
+    for name, accept, decode in (("json", "application/json", _decode_json), ("arrow", ARROW, _decode_arrow)):
+        request_s, payload = _timed(_fetch, url + "/api/execute", data, accept, repeat=repeat)
+        decode_s, rows = _timed(decode, payload, repeat=repeat)
+        out[name] = {"rows": rows, "bytes": payload, "request_s": request_s, "decode_s": decode_s}
+    return out
+
+
+def synthetic(n: int, repeat: int) -> dict:
+    from datetime import datetime, timedelta
+    from decimal import Decimal
+
+    from app.services import _result_to_payload, result_body
+
+    columns = ["cycleno", "series", "value", "tankvol", "TimeStamp"]
+    t0 = datetime(2024, 1, 1)
+    rows = [
+        (i // 4, f"series_{i % 4}", random.random() * 100, Decimal(f"{random.random() * 5000:.2f}"), t0 + timedelta(minutes=5 * (i // 4)))
+        for i in range(n)
+    ]
+    out = {}
+    for name, fmt, decode in (("json", "rows", _decode_json), ("arrow", "arrow", _decode_arrow)):
+        encode_s, payload = _timed(lambda: result_body(_result_to_payload(columns, rows, fmt)), repeat=repeat)
+        decode_s, decoded = _timed(decode, payload, repeat=repeat)
+        out[name] = {"rows": decoded, "bytes": payload, "encode_s": encode_s, "decode_s": decode_s}
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--body", help="JSON body for /api/execute (sql, params, ...)")
+    parser.add_argument("--synthetic", type=int, metavar="ROWS", help="Benchmark in-process on ROWS generated rows")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    if not args.body and not args.synthetic:
+        parser.error("give --body (server) or --synthetic ROWS")
+
+    if args.synthetic:
+        results, timing = synthetic(args.synthetic, args.repeat), "encode_s"
+    else:
+        results, timing = from_server(args.url, json.loads(args.body), args.repeat), "request_s"
+
+    print(f"{'format':<7} {'rows':>9} {'bytes':>12} {'gzip bytes':>12} {timing.replace('_s', ' ms'):>11} {'decode ms':>10}")
+    for name, r in results.items():
+        print(
+            f"{name:<7} {r['rows']:>9} {len(r['bytes']):>12,} {len(gzip.compress(r['bytes'], 6)):>12,} "
+            f"{r[timing] * 1000:>11.1f} {r['decode_s'] * 1000:>10.1f}"
+        )
+    j, a = results["json"], results["arrow"]
+    print(f"arrow/json: {len(a['bytes']) / len(j['bytes']):.2f}x bytes, {a['decode_s'] / j['decode_s']:.2f}x decode time")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
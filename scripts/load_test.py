@@ -0,0 +1,68 @@
+"""
+Compare throughput of the sync routes and the async (/api/async) routes of a running server.
+Start the app with DB_ASYNC_ENABLED=true, then run from project root:
+
+    python scripts/load_test.py --url http://localhost:8000 --requests 400 --concurrency 64
+    python scripts/load_test.py --path /execute --body '{"sql": "SELECT SLEEP(0.2)", "no_cache": true}'
+
+Each path is hit as /api<path> (sync) and /api/async<path> (async) with the same load.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _hit(url: str, body: bytes | None) -> tuple:
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as res:
+            res.read()
+            ok = 200 <= res.status < 300
+    except Exception:
+        ok = False
+    return ok, time.perf_counter() - t0
+
+
+def run(url: str, body: bytes | None, total: int, concurrency: int) -> dict:
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: _hit(url, body), range(total)))
+    wall = time.perf_counter() - t0
+    latencies = sorted(lat for ok, lat in results if ok)
+    errors = sum(1 for ok, _ in results if not ok)
+    return {
+        "req_per_s": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if latencies else None,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/trends", help="Route under /api, e.g. /trends or /execute")
+    parser.add_argument("--body", default=None, help="JSON body (sends POST)")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    body = json.dumps(json.loads(args.body)).encode() if args.body else None
+    print(f"{args.requests} requests, {args.concurrency} concurrent, path {args.path}")
+    print(f"{'mode':<6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+    for mode, prefix in (("sync", "/api"), ("async", "/api/async")):
+        _hit(args.url + prefix + args.path, body)  # warm-up
+        r = run(args.url + prefix + args.path, body, args.requests, args.concurrency)
+        print(f"{mode:<6} {r['req_per_s']:>8} {str(r['p50_ms']):>9} {str(r['p95_ms']):>9} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -0,0 +1,65 @@
+"""
+Add a unique (trendid, parameter) index to bts_Trend_Parameters so duplicate parameter rows cannot come back.
+Existing duplicates are removed first, keeping the lowest id per (trendid, parameter).
+Run: python scripts/migrate_trend_parameters_unique.py
+
+Uses the shared SSH tunnel (app.tunnel) if USE_SSH_TUNNEL=true.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from sqlalchemy import text
+
+from app.tunnel import db_tunnel
+
+INDEX_NAME = "uq_trend_parameter"
+
+
+def migrate() -> int:
+    from app.database import SessionLocal  # after the tunnel is up: reads DB_HOST/DB_PORT on import
+
+    db = SessionLocal()
+    try:
+        result = db.execute(text(f"SHOW INDEX FROM bts_Trend_Parameters WHERE Key_name = '{INDEX_NAME}'"))
+        if result.fetchone() is not None:
+            print(f"{INDEX_NAME} already exists.")
+            return 0
+
+        # Each row once, however many lower-id duplicates it has (the DELETE below removes exactly these)
+        dupes = db.execute(text(
+            "SELECT p.id, p.trendid, p.parameter FROM bts_Trend_Parameters p "
+            "WHERE EXISTS (SELECT 1 FROM bts_Trend_Parameters k "
+            "WHERE k.trendid = p.trendid AND k.parameter = p.parameter AND k.id < p.id) "
+            "ORDER BY p.trendid, p.parameter, p.id"
+        )).fetchall()
+        if dupes:
+            print(f"Deleting {len(dupes)} duplicate parameter row(s):")
+            for row in dupes:
+                print(f"  id={row[0]} trendid={row[1]} parameter={row[2]}")
+            db.execute(text(
+                "DELETE p FROM bts_Trend_Parameters p "
+                "JOIN bts_Trend_Parameters k ON k.trendid = p.trendid AND k.parameter = p.parameter AND k.id < p.id"
+            ))
+
+        print(f"Adding unique index {INDEX_NAME} (trendid, parameter)...")
+        db.execute(text(f"ALTER TABLE bts_Trend_Parameters ADD UNIQUE INDEX {INDEX_NAME} (trendid, parameter)"))
+        db.commit()
+        print("Migration complete.")
+        return 0
+    except Exception as e:
+        print(f"Error: {e}")
+        db.rollback()
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    with db_tunnel():
+        code = migrate()
+    sys.exit(code)
@@ -0,0 +1,75 @@
+"""
+Build / incrementally refresh the materialized multi-model plot data table (bts_mat_PlotData).
+Loads the cycles past each (blendid, tankno, stream)'s watermark (highest cycleno stored for it) and
+re-upserts the last --window cycles below it, so late lagged / hybrid / stream-quality rows are filled in.
+Without --blendid, only blends with CSTR rows from the last --lookback-days days are checked.
+
+Run:
+    python scripts/refresh_plotdata.py                        # load new cycles for recently active blends
+    python scripts/refresh_plotdata.py --lookback-days 0      # ... for every blend (scans all history)
+    python scripts/refresh_plotdata.py --blendid 20200617-005  # only these blends (even if not behind)
+    python scripts/refresh_plotdata.py --full                  # rebuild (all blends, or those given)
+    python scripts/refresh_plotdata.py --pending               # list tanks/streams behind the source, change nothing
+
+Schedule it (cron / task scheduler) after the model tables are loaded.
+Uses the shared SSH tunnel (app.tunnel) if USE_SSH_TUNNEL=true.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.tunnel import db_tunnel
+
+
+def main(args) -> int:
+    # After the tunnel is up: app.database reads DB_HOST/DB_PORT on import
+    from app.database import SessionLocal
+    from app import plotdata
+
+    lookback_days = plotdata.LOOKBACK_DAYS if args.lookback_days is None else args.lookback_days
+    db = SessionLocal()
+    try:
+        if args.pending:
+            plotdata.ensure_table(db)
+            pending = plotdata.pending_blends(db, args.blendid, lookback_days)
+            for p in pending:
+                since = "not loaded" if p["watermark"] is None else f"watermark {p['watermark']}"
+                print(f"  {p['blendid']} {p['tankno']} {p['stream']}: {since}, source up to cycle {p['max_cycle']}")
+            print(f"{len(pending)} tank/stream(s) pending.")
+            return 0
+
+        stats = plotdata.refresh(
+            db,
+            blendids=args.blendid,
+            full=args.full,
+            window=plotdata.REFRESH_WINDOW if args.window is None else args.window,
+            lookback_days=lookback_days,
+        )
+        print(f"Refreshed {stats['blends']} blend(s), {stats['rows']} row(s) in {stats['seconds']}s.")
+        return 0
+    except Exception as e:
+        print(f"Error: {e}")
+        db.rollback()
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blendid", action="append", help="Refresh this blend, pending or not (repeatable)")
+    parser.add_argument("--full", action="store_true", help="Reload from cycle 0 instead of the watermark")
+    parser.add_argument("--pending", action="store_true", help="Only list tanks/streams behind the source tables")
+    parser.add_argument("--window", type=int, default=None, metavar="CYCLES",
+                        help="Cycles below each watermark to re-upsert for late model rows (default: plotdata.REFRESH_WINDOW)")
+    parser.add_argument("--lookback-days", type=int, default=None, metavar="DAYS",
+                        help="Only check blends with CSTR rows this recent, 0 = all (default: plotdata.LOOKBACK_DAYS)")
+    args = parser.parse_args()
+    with db_tunnel():
+        code = main(args)
+    sys.exit(code)
@@ -7,7 +7,9 @@ if (typeof Chart !== 'undefined' && typeof ChartDataLabels !== 'undefined') {
 
 let editor = null;
 let currentTrend = null;
+let sqlAnalysis = null; // { sql, placeholders } from /api/trends/{id}/analysis for the loaded trend
 let dbSchema = null;
+let activeQueryHandle = null;
 
 // --- DOM Elements ---
 const trendSelect = document.getElementById('trend-select');
@@ -15,6 +17,12 @@ const trendInfo = document.getElementById('trend-info');
 const paramsContainer = document.getElementById('params-container');
 const sqlEditorEl = document.getElementById('sql-editor');
 const btnExecute = document.getElementById('btn-execute');
+const btnCancelQuery = document.getElementById('btn-cancel-query');
+const btnFetchNew = document.getElementById('btn-fetch-new');
+const liveToggle = document.getElementById('live-toggle');
+const maxPointsSelect = document.getElementById('max-points-select');
+const exportFormatSelect = document.getElementById('export-format');
+const btnExport = document.getElementById('btn-export');
 const btnSave = document.getElementById('btn-save');
 const btnDelete = document.getElementById('btn-delete');
 const btnNew = document.getElementById('btn-new');
@@ -27,6 +35,7 @@ const plotEmpty = document.getElementById('plot-empty');
 const plotsCanvas = document.getElementById('plots-canvas');
 const btnAddPlot = document.getElementById('btn-add-plot');
 const btnLoadSaved = document.getElementById('btn-load-saved');
+const btnSaveLayout = document.getElementById('btn-save-layout');
 
 // Modals
 const modalNew = document.getElementById('modal-new');
@@ -49,9 +58,13 @@ let joins = []; // { leftTable, leftCol, rightTable, rightCol }
 let activeTableForColumns = null; // which table's columns are shown (for switching)
 
 // Query results cache for multi-plot
-let lastQueryResult = null; // { columns, rows }
+let lastQueryResult = null; // { columns, rows, arrays? } - arrays: typed columns of an Arrow result
+let lastQueryRequest = null; // { sql, params, template_id } that produced lastQueryResult (for "Fetch new cycles")
 let plotConfigs = []; // { id, title, type, x_col, y_col, series_col, pie_label_col, pie_value_col, x_label, y_label }
+let savedPlotsLoaded = false; // saved plots are on the canvas, so "Save All" may delete the ones removed
 let chartInstances = []; // Chart.js instances
+let liveSource = null; // EventSource on /api/trends/{id}/live while "Live" is on
+let liveRetry = null;
 
 // --- Init CodeMirror ---
 editor = CodeMirror.fromTextArea(sqlEditorEl, {
@@ -86,14 +99,71 @@ async function api(path, options = {}) {
     ...options,
   });
   const data = await res.json().catch(() => ({}));
-  if (!res.ok) {
-    const d = data?.detail;
-    const msg = typeof d === 'string' ? d : (Array.isArray(d) ? d.map((e) => e?.msg || JSON.stringify(e)).join('; ') : JSON.stringify(data || res.statusText));
-    throw new Error(msg);
+  if (!res.ok) throw new Error(errorMessage(data, res));
+  return data;
+}
+
+function errorMessage(data, res) {
+  const d = data?.detail;
+  return typeof d === 'string' ? d : (Array.isArray(d) ? d.map((e) => e?.msg || JSON.stringify(e)).join('; ') : JSON.stringify(data || res.statusText));
+}
+
+const ARROW_STREAM_TYPE = 'application/vnd.apache.arrow.stream';
+
+/**
+ * POST /execute. Asks for an Arrow IPC stream when the Arrow library loaded (JSON otherwise) and
+ * returns { columns, rows, arrays?, downsample? } either way.
+ */
+async function fetchQueryResult(body) {
+  const accept = typeof Arrow !== 'undefined' ? `${ARROW_STREAM_TYPE}, application/json;q=0.9` : 'application/json';
+  const res = await fetch(`${API}/execute`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: accept },
+    body: JSON.stringify(body),
+  });
+  if (res.ok && (res.headers.get('Content-Type') || '').startsWith(ARROW_STREAM_TYPE)) {
+    return decodeArrowResult(await res.arrayBuffer());
   }
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok) throw new Error(errorMessage(data, res));
   return data;
 }
 
+/**
+ * Decode an Arrow IPC result. Numeric columns stay typed arrays (Int32Array / Float64Array, NULL as NaN)
+ * in `arrays` for the charts; `rows` holds the same values as row objects for the grid.
+ */
+function decodeArrowResult(buffer) {
+  const table = Arrow.tableFromIPC(new Uint8Array(buffer));
+  const fields = table.schema.fields;
+  const columns = fields.map((f) => f.name);
+  const arrays = {};
+  fields.forEach((f, i) => {
+    const vec = table.getChildAt(i);
+    const numeric = Arrow.DataType.isInt(f.type) || Arrow.DataType.isFloat(f.type);
+    if (!numeric) {
+      arrays[f.name] = Array.from(vec);
+    } else if (vec.nullCount === 0) {
+      arrays[f.name] = vec.toArray();
+    } else {
+      const values = new Float64Array(vec.length);
+      for (let r = 0; r < vec.length; r++) values[r] = vec.isValid(r) ? vec.get(r) : NaN;
+      arrays[f.name] = values;
+    }
+  });
+  const rows = new Array(table.numRows);
+  for (let r = 0; r < rows.length; r++) {
+    const row = {};
+    for (const c of columns) {
+      const v = arrays[c][r];
+      row[c] = typeof v === 'number' && Number.isNaN(v) ? null : v;
+    }
+    rows[r] = row;
+  }
+  const ds = table.schema.metadata.get('downsample');
+  return { columns, rows, arrays, downsample: ds ? JSON.parse(ds) : undefined, error: null };
+}
+
 // --- Load Trends ---
 async function loadTrends() {
   try {
@@ -118,8 +188,12 @@ async function loadTrends() {
 
 /** Clear all page data: results, plots, params, errors. Call when switching or deleting trends. */
 function refreshPageData() {
+  stopLive();
   lastQueryResult = null;
+  lastQueryRequest = null;
+  btnFetchNew.disabled = true;
   plotConfigs = [];
+  savedPlotsLoaded = false;
   chartInstances.forEach((c) => { if (c) c.destroy(); });
   chartInstances = [];
   dataGrid.innerHTML = '';
@@ -141,9 +215,14 @@ function refreshPageData() {
 
 // --- Load Single Trend ---
 async function loadTrend(templateId) {
+  cancelActiveQuery();
   refreshPageData();
-  const trend = await api(`/trends/by-id/${templateId}`);
+  const [trend, analysis] = await Promise.all([
+    api(`/trends/by-id/${templateId}`),
+    api(`/trends/${templateId}/analysis`).catch(() => null),
+  ]);
   currentTrend = trend;
+  sqlAnalysis = analysis ? { sql: trend.sql_template || '', placeholders: analysis.placeholders } : null;
   editor.setValue(trend.sql_template || '');
 
   const dropdownOptions = await loadDropdownOptions();
@@ -152,6 +231,7 @@ async function loadTrend(templateId) {
   trendInfo.textContent = trend.trend_name ? `${trend.trend_name} (${trend.trend_code})` : trend.trend_code;
   btnSave.disabled = false;
   btnDelete.disabled = false;
+  btnExport.disabled = false;
   btnSettings.classList.remove('hidden');
   btnLoadSaved.disabled = false;
   btnAddPlot.disabled = true;
@@ -176,10 +256,59 @@ function paramDisplayName(p) {
   return PARAM_LABELS[lower] || name;
 }
 
-/** Extract :param placeholders from SQL. Returns unique param names. */
+/**
+ * Extract :param placeholders from SQL. Returns unique param names.
+ * Uses the server analysis of the loaded trend while its SQL is unchanged; otherwise scans the
+ * editor text with the same rules (quoted strings/identifiers, comments and :: casts are skipped).
+ */
 function extractParamsFromSql(sql) {
-  const matches = sql.match(/:[a-zA-Z0-9_]+/g) || [];
-  return [...new Set(matches.map((m) => m.slice(1)))];
+  if (sqlAnalysis && sqlAnalysis.sql === sql) return sqlAnalysis.placeholders;
+  const names = [];
+  const n = sql.length;
+  let i = 0;
+  while (i < n) {
+    const c = sql[i];
+    if (c === "'" || c === '"' || c === '`') {
+      i = skipQuoted(sql, i);
+    } else if (c === '#' || (c === '-' && sql.startsWith('--', i) && (i + 2 >= n || ' \t\r\n'.includes(sql[i + 2])))) {
+      const end = sql.indexOf('\n', i);
+      i = end < 0 ? n : end;
+    } else if (c === '/' && sql.startsWith('/*', i)) {
+      const end = sql.indexOf('*/', i + 2);
+      i = end < 0 ? n : end + 2;
+    } else if (c === ':') {
+      if (sql[i + 1] === ':') {
+        i += 2;
+        continue;
+      }
+      let j = i + 1;
+      if (!(i > 0 && /\w/.test(sql[i - 1]))) {
+        while (j < n && /\w/.test(sql[j])) j++;
+      }
+      if (j > i + 1) names.push(sql.slice(i + 1, j));
+      i = j;
+    } else {
+      i++;
+    }
+  }
+  return [...new Set(names)];
+}
+
+/** Index just past the quoted token starting at i (doubled quotes and backslash escapes). */
+function skipQuoted(sql, i) {
+  const quote = sql[i];
+  let j = i + 1;
+  while (j < sql.length) {
+    if (sql[j] === '\\' && quote !== '`') {
+      j += 2;
+    } else if (sql[j] === quote) {
+      if (sql[j + 1] !== quote) return j + 1;
+      j += 2;
+    } else {
+      j++;
+    }
+  }
+  return sql.length;
 }
 
 /** Parameter display order: BlendId, RefID, Tank No, Stream, Quality, Streamin, Model, Tank vol, Cycle no, then others. */
@@ -290,6 +419,14 @@ function getParams() {
   return params;
 }
 
+// --- Export ---
+/** Download the saved trend's result (streamed by the server) with the current parameter values. */
+function exportTrend() {
+  if (!currentTrend) return;
+  const query = new URLSearchParams({ ...getParams(), format: exportFormatSelect.value });
+  window.location.href = `${API}/trends/${encodeURIComponent(currentTrend.template_id)}/export?${query}`;
+}
+
 // --- Execute ---
 async function execute() {
   const sql = editor.getValue();
@@ -311,21 +448,34 @@ async function execute() {
   resultsEmpty.classList.add('hidden');
   dataGridContainer.classList.add('hidden');
 
+  cancelActiveQuery();
+  stopLive();
+  const handle = crypto.randomUUID ? crypto.randomUUID() : `q${Date.now()}${Math.random().toString(16).slice(2)}`;
+  activeQueryHandle = handle;
+  btnCancelQuery.classList.remove('hidden');
+
+  const request = { sql, params, template_id: currentTrend?.template_id ?? null };
   try {
-    const result = await api('/execute', {
-      method: 'POST',
-      body: JSON.stringify({ sql, params }),
+    const result = await fetchQueryResult({
+      ...request,
+      parameterized: true,
+      max_points: maxPointsSelect?.value ? Number(maxPointsSelect.value) : null,
+      query_handle: handle,
     });
+    if (activeQueryHandle !== handle) return; // superseded or cancelled
 
     if (result.error) {
       showError(result.error);
       lastQueryResult = null;
+      btnFetchNew.disabled = true;
       btnAddPlot.disabled = true;
       plotEmpty.textContent = 'Execute a query to see results';
       return;
     }
 
-    lastQueryResult = { columns: result.columns, rows: result.rows };
+    lastQueryResult = { columns: result.columns, rows: result.rows, arrays: result.arrays };
+    lastQueryRequest = request;
+    btnFetchNew.disabled = !result.columns.some((c) => c.toLowerCase() === 'cycleno');
     chartInstances.forEach(c => { if (c) c.destroy(); });
     chartInstances = [];
 
@@ -336,14 +486,179 @@ async function execute() {
     dataGridContainer.classList.remove('hidden');
     plotEmpty.classList.remove('hidden');
     plotEmpty.textContent = 'Data loaded. Click "+ Add Plot" to create visualizations.';
+    if (liveToggle.checked) startLive();
+    if (result.downsample) {
+      const ds = result.downsample;
+      showToast('info', `Downsampled to ${ds.returned_points.toLocaleString()} of ${ds.original_points.toLocaleString()} points (${ds.algorithm}).`);
+    }
   } catch (e) {
+    if (activeQueryHandle !== handle) return;
     showError(e.message);
     lastQueryResult = null;
+    btnFetchNew.disabled = true;
     btnAddPlot.disabled = true;
     plotEmpty.textContent = 'Execute a query to see results';
+  } finally {
+    if (activeQueryHandle === handle) {
+      activeQueryHandle = null;
+      btnCancelQuery.classList.add('hidden');
+    }
   }
 }
 
+// Kill the running query on the server (KILL QUERY) instead of letting it finish unseen.
+function cancelActiveQuery() {
+  const handle = activeQueryHandle;
+  if (!handle) return;
+  activeQueryHandle = null;
+  btnCancelQuery.classList.add('hidden');
+  fetch(`${API}/execute/${encodeURIComponent(handle)}`, { method: 'DELETE', keepalive: true }).catch(() => {});
+}
+
+// --- Fetch new cycles ---
+/**
+ * Ask the server only for rows past the last cycleno on screen (per series) and append them to the
+ * table and to the existing Chart.js datasets, without re-running the whole query or redrawing.
+ * Falls back to a full execute if the incremental request fails.
+ */
+async function fetchNewCycles() {
+  if (!lastQueryResult || !lastQueryRequest || activeQueryHandle) return;
+  const { columns } = lastQueryResult;
+  const cycleCol = columns.find((c) => c.toLowerCase() === 'cycleno');
+  if (!cycleCol) return;
+  const seriesCol = incrementalSeriesCol(columns);
+  const since = lastCycles(cycleCol, seriesCol);
+
+  const handle = crypto.randomUUID ? crypto.randomUUID() : `q${Date.now()}${Math.random().toString(16).slice(2)}`;
+  const request = lastQueryRequest;
+  activeQueryHandle = handle;
+  btnFetchNew.disabled = true;
+  try {
+    const result = await fetchQueryResult({
+      ...request,
+      parameterized: true,
+      since_cycle: since,
+      series_col: seriesCol,
+      query_handle: handle,
+    });
+    if (activeQueryHandle !== handle || lastQueryRequest !== request) return;
+    const newRows = result.rows || [];
+    if (!newRows.length) {
+      showToast('info', 'No new cycles.');
+      return;
+    }
+    appendQueryRows(newRows);
+    showToast('success', `Added ${newRows.length.toLocaleString()} new row(s).`);
+  } catch (e) {
+    if (activeQueryHandle !== handle) return;
+    console.warn('Incremental fetch failed, re-running the query:', e);
+    activeQueryHandle = null;
+    await execute();
+  } finally {
+    if (activeQueryHandle === handle) activeQueryHandle = null;
+    btnFetchNew.disabled = !lastQueryResult || !lastQueryRequest;
+  }
+}
+
+/** Series column the per-series last cycle is tracked by: the first single-series plot's, else "series". */
+function incrementalSeriesCol(columns) {
+  const cfg = plotConfigs.find((p) => p.series_col && (p.series_mode || 'single') === 'single');
+  if (cfg && columns.includes(cfg.series_col)) return cfg.series_col;
+  return columns.find((c) => c.toLowerCase() === 'series') || null;
+}
+
+/** Highest cycleno on screen per series value (key "" without a series column), as sent in since_cycle. */
+function lastCycles(cycleCol, seriesCol) {
+  const since = {};
+  lastQueryResult.rows.forEach((r) => {
+    const key = seriesCol ? String(r[seriesCol] ?? '') : '';
+    const c = Number(r[cycleCol]);
+    if (!Number.isNaN(c) && !(since[key] >= c)) since[key] = c;
+  });
+  if (!Object.keys(since).length) since[''] = -1;
+  return since;
+}
+
+// --- Live updates ---
+/**
+ * Subscribe to server-pushed deltas of the saved trend (Server-Sent Events). All viewers of the same
+ * trend + parameters share one server-side poller; rows already on screen are skipped, so catch-up
+ * deltas after a reconnect never duplicate points.
+ */
+function startLive() {
+  stopLive();
+  if (!lastQueryResult || !lastQueryRequest?.template_id || !currentTrend) return;
+  const { columns } = lastQueryResult;
+  const cycleCol = columns.find((c) => c.toLowerCase() === 'cycleno');
+  if (!cycleCol) {
+    showToast('info', 'Live updates need a cycleno column in the result.');
+    liveToggle.checked = false;
+    return;
+  }
+  if (lastQueryRequest.sql.trim() !== (currentTrend.sql_template || '').trim()) {
+    showToast('info', 'Live updates follow the saved trend SQL - save your edits first.');
+    liveToggle.checked = false;
+    return;
+  }
+  const seriesCol = incrementalSeriesCol(columns);
+  const qs = new URLSearchParams(lastQueryRequest.params);
+  qs.set('since', JSON.stringify(lastCycles(cycleCol, seriesCol)));
+  if (seriesCol) qs.set('series_col', seriesCol);
+  const request = lastQueryRequest;
+  liveSource = new EventSource(`${API}/trends/${encodeURIComponent(request.template_id)}/live?${qs}`);
+  liveSource.addEventListener('delta', (ev) => {
+    if (lastQueryRequest !== request) return;
+    const since = lastCycles(cycleCol, seriesCol);
+    const rows = (JSON.parse(ev.data).rows || []).filter((r) => {
+      const last = since[seriesCol ? String(r[seriesCol] ?? '') : ''];
+      return last === undefined || Number(r[cycleCol]) > last;
+    });
+    if (rows.length) appendQueryRows(rows);
+  });
+  liveSource.addEventListener('resync', () => fetchNewCycles());
+  liveSource.onerror = () => {
+    // Reconnect with the current watermark rather than the URL the browser would retry
+    stopLive();
+    if (liveToggle.checked) liveRetry = setTimeout(startLive, 5000);
+  };
+}
+
+function stopLive() {
+  clearTimeout(liveRetry);
+  liveRetry = null;
+  if (liveSource) liveSource.close();
+  liveSource = null;
+}
+
+function appendQueryRows(newRows) {
+  const { columns } = lastQueryResult;
+  lastQueryResult.rows.push(...newRows);
+  lastQueryResult.arrays = undefined; // typed columns no longer cover every row
+  appendTableRows(columns, newRows);
+  const added = { columns, rows: newRows };
+  plotConfigs.forEach((cfg, idx) => {
+    const chart = chartInstances[idx];
+    if (!chart) return;
+    if (cfg.type === 'pie') {
+      const { labels, data } = pieTotals(cfg, columns, lastQueryResult.rows);
+      chart.data.labels = labels;
+      chart.data.datasets[0].data = data;
+      chart.data.datasets[0].backgroundColor = labels.map((_, i) => getColor(i));
+    } else {
+      plotDatasets(cfg, added).forEach((d) => {
+        const existing = chart.data.datasets.find((e) => e.label === d.label);
+        if (existing) {
+          existing.data.push(...d.data);
+          return;
+        }
+        const color = getColor(chart.data.datasets.length);
+        chart.data.datasets.push({ ...d, borderColor: color, backgroundColor: color + (cfg.type === 'bar' ? '80' : '40') });
+      });
+    }
+    chart.update('none');
+  });
+}
+
 function showError(msg) {
   resultsError.textContent = msg;
   resultsError.classList.remove('hidden');
@@ -368,6 +683,21 @@ function renderTable(columns, rows) {
   dataGrid.innerHTML = html;
 }
 
+function appendTableRows(columns, rows) {
+  const tbody = dataGrid.tBodies[0];
+  if (!tbody) return;
+  let html = '';
+  rows.forEach((row) => {
+    html += '<tr>';
+    columns.forEach((col) => {
+      const val = row[col];
+      html += `<td>${val != null ? escapeHtml(String(val)) : ''}</td>`;
+    });
+    html += '</tr>';
+  });
+  tbody.insertAdjacentHTML('beforeend', html);
+}
+
 function escapeHtml(s) {
   const div = document.createElement('div');
   div.textContent = s;
@@ -382,6 +712,7 @@ function renderPlotsCanvas() {
   chartInstances.forEach((c) => { if (c && typeof c.destroy === 'function') c.destroy(); });
   chartInstances = [];
   plotsCanvas.innerHTML = '';
+  if (btnSaveLayout) btnSaveLayout.disabled = !currentTrend || plotConfigs.length === 0;
   if (plotConfigs.length === 0) {
     if (plotEmpty) plotEmpty.classList.remove('hidden');
     return;
@@ -461,33 +792,42 @@ async function savePlotToDb(idx) {
   }
 }
 
+// Save every plot on the canvas (insert/update/reorder, and delete removed ones) in one request
+async function saveLayoutToDb() {
+  if (!currentTrend) {
+    showToast('error', 'Select a trend first to save plots.');
+    return;
+  }
+  try {
+    const { plots } = await api(`/trends/${currentTrend.template_id}/plots`, {
+      method: 'PUT',
+      body: JSON.stringify({ plots: plotConfigs, replace: savedPlotsLoaded }),
+    });
+    plotConfigs = plotConfigs.map((cfg, i) => ({ ...cfg, id: plots[i].id }));
+    savedPlotsLoaded = true;
+    renderPlotsCanvas();
+    showToast('success', `Saved ${plots.length} plot(s) to database.`);
+  } catch (e) {
+    showToast('error', 'Save failed: ' + e.message);
+  }
+}
+
 function renderSinglePlot(ctx, cfg) {
   const { columns = [], rows = [] } = lastQueryResult || {};
   if (!columns.length || !rows.length) return null;
 
   const xCol = cfg.x_col || columns[0];
   const yCol = cfg.y_col || columns[1];
-  const seriesCol = cfg.series_col;
-  const seriesMode = cfg.series_mode || 'single';
   const yCols = cfg.y_cols || []; // [{ col, label, color }] or legacy string[]
-  const customSeries = cfg.series || [];
 
   if (cfg.type === 'pie') {
-    const labelCol = cfg.pie_label_col || columns[0];
-    const valueCol = cfg.pie_value_col || columns[1];
-    const labelMap = {};
-    rows.forEach((r) => {
-      const lbl = String(r[labelCol] ?? '');
-      const val = Number(r[valueCol]) || 0;
-      labelMap[lbl] = (labelMap[lbl] || 0) + val;
-    });
+    const { labels, data } = pieTotals(cfg, columns, rows);
     const datasets = [{
-      data: Object.values(labelMap),
-      backgroundColor: Object.keys(labelMap).map((_, i) => getColor(i)),
+      data,
+      backgroundColor: labels.map((_, i) => getColor(i)),
       borderColor: '#fff',
       borderWidth: 1,
     }];
-    const labels = Object.keys(labelMap);
     const showPercent = cfg.pie_show_percent_labels !== false;
     const plugins = {
       title: { display: true, text: cfg.title || 'Pie Chart' },
@@ -516,36 +856,7 @@ function renderSinglePlot(ctx, cfg) {
   }
 
   if (cfg.type === 'bar') {
-    let datasets;
-    if (seriesMode === 'custom' && customSeries.length > 0) {
-      datasets = customSeries.map((s, i) => {
-        const color = s.color || getColor(i);
-        return {
-          label: s.label,
-          data: rows.map((r) => ({ x: String(r[s.x_col]), y: Number(r[s.y_col]) || 0 })),
-          backgroundColor: color + '80',
-        };
-      });
-    } else if (seriesMode === 'multi_col' && yCols.length > 0) {
-      datasets = yCols.map((item, i) => {
-        const col = typeof item === 'string' ? item : item.col;
-        const label = typeof item === 'string' ? item : (item.label || item.col);
-        const color = typeof item === 'object' && item.color ? item.color : getColor(i);
-        return {
-          label,
-          data: rows.map((r) => ({ x: String(r[xCol]), y: Number(r[col]) || 0 })),
-          backgroundColor: color + '80',
-        };
-      });
-    } else if (seriesCol) {
-      datasets = buildSeriesDatasets(rows, xCol, yCol, seriesCol);
-    } else {
-      datasets = [{
-        label: yCol,
-        data: rows.map((r) => ({ x: String(r[xCol]), y: Number(r[yCol]) || 0 })),
-        backgroundColor: getColor(0) + '80',
-      }];
-    }
+    const datasets = plotDatasets(cfg, lastQueryResult);
     return new Chart(ctx, {
       type: 'bar',
       data: { datasets },
@@ -572,13 +883,114 @@ function renderSinglePlot(ctx, cfg) {
   }
 
   // line (default)
-  let datasets;
   const y1Cols = yCols.filter((item) => (typeof item === 'object' && item?.axis === 'y2') ? false : true);
   const y2Cols = yCols.filter((item) => typeof item === 'object' && item?.axis === 'y2');
   const hasY2 = y2Cols.length > 0;
   const y1Label = cfg.y_label || (y1Cols[0] ? (typeof y1Cols[0] === 'string' ? y1Cols[0] : y1Cols[0].col) : yCol);
   const y2Label = cfg.y2_label || (y2Cols[0] ? (typeof y2Cols[0] === 'string' ? y2Cols[0] : y2Cols[0].col) : 'Y2');
 
+  const datasets = plotDatasets(cfg, lastQueryResult);
+
+  const hasY1 = y1Cols.length > 0;
+  const scales = {
+    x: {
+      title: { display: true, text: cfg.x_label || xCol },
+      type: 'linear',
+    },
+    y: {
+      position: 'left',
+      title: { display: true, text: y1Label },
+      type: 'linear',
+      display: hasY1,
+    },
+  };
+  if (hasY2) {
+    scales.y2 = {
+      position: 'right',
+      title: { display: true, text: y2Label },
+      type: 'linear',
+      grid: { drawOnChartArea: !hasY1 },
+    };
+  }
+
+  return new Chart(ctx, {
+    type: 'line',
+    data: { datasets },
+    options: {
+      responsive: true,
+      maintainAspectRatio: true,
+      interaction: { mode: 'index', intersect: false },
+      plugins: {
+        title: { display: true, text: cfg.title || 'Line Chart' },
+        legend: { position: 'top' },
+        datalabels: { display: false },
+      },
+      scales,
+    },
+  });
+}
+
+/** Pie slices: pie_value_col summed per pie_label_col value. */
+function pieTotals(cfg, columns, rows) {
+  const labelCol = cfg.pie_label_col || columns[0];
+  const valueCol = cfg.pie_value_col || columns[1];
+  const labelMap = {};
+  rows.forEach((r) => {
+    const lbl = String(r[labelCol] ?? '');
+    const val = Number(r[valueCol]) || 0;
+    labelMap[lbl] = (labelMap[lbl] || 0) + val;
+  });
+  return { labels: Object.keys(labelMap), data: Object.values(labelMap) };
+}
+
+/**
+ * Chart.js datasets of a line/bar plot for source = { columns, rows, arrays? }.
+ * Used for the full result and, when appending new cycles, for just the new rows.
+ */
+function plotDatasets(cfg, source) {
+  const columns = source.columns || lastQueryResult?.columns || [];
+  const rows = source.rows || [];
+  const xCol = cfg.x_col || columns[0];
+  const yCol = cfg.y_col || columns[1];
+  const seriesCol = cfg.series_col;
+  const seriesMode = cfg.series_mode || 'single';
+  const yCols = cfg.y_cols || []; // [{ col, label, color }] or legacy string[]
+  const customSeries = cfg.series || [];
+
+  let datasets;
+  if (cfg.type === 'bar') {
+    if (seriesMode === 'custom' && customSeries.length > 0) {
+      datasets = customSeries.map((s, i) => {
+        const color = s.color || getColor(i);
+        return {
+          label: s.label,
+          data: rows.map((r) => ({ x: String(r[s.x_col]), y: Number(r[s.y_col]) || 0 })),
+          backgroundColor: color + '80',
+        };
+      });
+    } else if (seriesMode === 'multi_col' && yCols.length > 0) {
+      datasets = yCols.map((item, i) => {
+        const col = typeof item === 'string' ? item : item.col;
+        const label = typeof item === 'string' ? item : (item.label || item.col);
+        const color = typeof item === 'object' && item.color ? item.color : getColor(i);
+        return {
+          label,
+          data: rows.map((r) => ({ x: String(r[xCol]), y: Number(r[col]) || 0 })),
+          backgroundColor: color + '80',
+        };
+      });
+    } else if (seriesCol) {
+      datasets = buildSeriesDatasets(rows, xCol, yCol, seriesCol);
+    } else {
+      datasets = [{
+        label: yCol,
+        data: rows.map((r) => ({ x: String(r[xCol]), y: Number(r[yCol]) || 0 })),
+        backgroundColor: getColor(0) + '80',
+      }];
+    }
+    return datasets;
+  }
+
   if (seriesMode === 'custom' && customSeries.length > 0) {
     datasets = customSeries.map((s, i) => {
       const color = s.color || getColor(i);
@@ -604,10 +1016,7 @@ function renderSinglePlot(ctx, cfg) {
       const axis = (typeof item === 'object' && item.axis === 'y2') ? 'y2' : 'y';
       return {
         label,
-        data: rows.map((r) => ({
-          x: isNaN(Number(r[xCol])) ? r[xCol] : Number(r[xCol]),
-          y: Number(r[col]) || 0,
-        })),
+        data: pointsFromColumns(source, xCol, col),
         borderColor: color,
         backgroundColor: color + '40',
         fill: false,
@@ -621,7 +1030,7 @@ function renderSinglePlot(ctx, cfg) {
   } else {
     datasets = [{
       label: yCol,
-      data: rows.map((r) => ({ x: Number(r[xCol]) || 0, y: Number(r[yCol]) || 0 })),
+      data: pointsFromColumns(source, xCol, yCol),
       borderColor: getColor(0),
       backgroundColor: getColor(0) + '40',
       fill: false,
@@ -630,43 +1039,27 @@ function renderSinglePlot(ctx, cfg) {
     }];
   }
 
-  const hasY1 = y1Cols.length > 0;
-  const scales = {
-    x: {
-      title: { display: true, text: cfg.x_label || xCol },
-      type: 'linear',
-    },
-    y: {
-      position: 'left',
-      title: { display: true, text: y1Label },
-      type: 'linear',
-      display: hasY1,
-    },
-  };
-  if (hasY2) {
-    scales.y2 = {
-      position: 'right',
-      title: { display: true, text: y2Label },
-      type: 'linear',
-      grid: { drawOnChartArea: !hasY1 },
-    };
-  }
+  return datasets;
+}
 
-  return new Chart(ctx, {
-    type: 'line',
-    data: { datasets },
-    options: {
-      responsive: true,
-      maintainAspectRatio: true,
-      interaction: { mode: 'index', intersect: false },
-      plugins: {
-        title: { display: true, text: cfg.title || 'Line Chart' },
-        legend: { position: 'top' },
-        datalabels: { display: false },
-      },
-      scales,
-    },
-  });
+/** Column as numbers: the decoded typed array of an Arrow result, else parsed from the row objects. */
+function numericColumn(source, col) {
+  const { rows = [], arrays } = source || {};
+  const values = arrays?.[col];
+  if (ArrayBuffer.isView(values)) return values;
+  return Float64Array.from(rows, (r) => Number(r[col]));
+}
+
+/** Line points for x/y columns, read straight from the typed columns (non-numeric x keeps its raw value). */
+function pointsFromColumns(source, xCol, yCol) {
+  const { rows = [] } = source || {};
+  const xs = numericColumn(source, xCol);
+  const ys = numericColumn(source, yCol);
+  const points = new Array(ys.length);
+  for (let i = 0; i < ys.length; i++) {
+    points[i] = { x: Number.isNaN(xs[i]) ? rows[i][xCol] : xs[i], y: ys[i] || 0 };
+  }
+  return points;
 }
 
 function buildSeriesDatasets(rows, xCol, yCol, seriesCol) {
@@ -724,6 +1117,7 @@ async function deleteTrend() {
     editor.setValue('');
     btnSave.disabled = true;
     btnDelete.disabled = true;
+    btnExport.disabled = true;
     btnSettings.classList.add('hidden');
     btnLoadSaved.disabled = true;
     btnAddPlot.disabled = true;
@@ -883,7 +1277,7 @@ document.querySelectorAll('.tab-btn').forEach(btn => {
 async function showBuilderModal() {
   modalBuilder.classList.remove('hidden');
   if (!dbSchema) {
-    dbSchema = await api('/schema');
+    dbSchema = (await api('/schema')).tables || {};
   }
   renderBuilderTables();
   renderBuilderTableTabs();
@@ -1132,6 +1526,7 @@ trendSelect.addEventListener('change', async () => {
     editor.setValue('');
     btnSave.disabled = true;
     btnDelete.disabled = true;
+    btnExport.disabled = true;
     btnSettings.classList.add('hidden');
     btnLoadSaved.disabled = true;
     btnAddPlot.disabled = true;
@@ -1143,6 +1538,14 @@ trendSelect.addEventListener('change', async () => {
 });
 
 btnExecute.onclick = execute;
+btnFetchNew.onclick = fetchNewCycles;
+liveToggle.onchange = () => (liveToggle.checked ? startLive() : stopLive());
+btnExport.onclick = exportTrend;
+btnCancelQuery.onclick = () => {
+  cancelActiveQuery();
+  showError('Query cancelled');
+};
+window.addEventListener('beforeunload', cancelActiveQuery);
 btnSave.onclick = save;
 btnDelete.onclick = deleteTrend;
 btnNew.onclick = showNewModal;
@@ -1359,6 +1762,7 @@ async function loadSavedPlots() {
         plotConfigs.push(cfg);
       }
     });
+    savedPlotsLoaded = true;
     renderPlotsCanvas();
     showToast('success', lastQueryResult?.columns?.length
       ? `Loaded ${plots.length} saved plot(s).`
@@ -1369,6 +1773,7 @@ async function loadSavedPlots() {
 }
 
 btnLoadSaved?.addEventListener('click', loadSavedPlots);
+btnSaveLayout?.addEventListener('click', saveLayoutToDb);
 document.getElementById('btn-cancel-plot')?.addEventListener('click', () => {
   editPlotIdx = null;
   if (btnSavePlot) btnSavePlot.textContent = 'Add Plot';
@@ -0,0 +1,27 @@
+from app.sql_analysis import with_execution_time_hint
+
+HINT = "/*+ MAX_EXECUTION_TIME(1000) */"
+
+
+def test_hint_follows_select():
+    assert with_execution_time_hint("SELECT a FROM t WHERE b = :b", 1000) == f"SELECT {HINT} a FROM t WHERE b = :b"
+
+
+def test_hint_goes_on_main_query_block_of_with_statement():
+    sql = "WITH c AS (SELECT * FROM t WHERE x = (SELECT 1)), d AS (SELECT 2) SELECT * FROM c JOIN d"
+    hinted = with_execution_time_hint(sql, 1000)
+    assert hinted == (
+        "WITH c AS (SELECT * FROM t WHERE x = (SELECT 1)), d AS (SELECT 2) "
+        f"SELECT {HINT} * FROM c JOIN d"
+    )
+    assert hinted.count(HINT) == 1
+
+
+def test_recursive_cte_and_comments():
+    sql = "-- (\nWITH RECURSIVE r (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM r WHERE n < 3)\nSELECT n FROM r"
+    assert with_execution_time_hint(sql, 1000).endswith(f"\nSELECT {HINT} n FROM r")
+
+
+def test_non_select_statements_are_unchanged():
+    assert with_execution_time_hint("UPDATE t SET a = 1", 1000) == "UPDATE t SET a = 1"
+    assert with_execution_time_hint("SELECT 1; SELECT 2", 1000) == "SELECT 1; SELECT 2"